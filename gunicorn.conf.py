@@ -1,4 +1,47 @@
 bind = "0.0.0.0:8000"
 workers = 4
 accesslog = "-"
-uwsgi_allow_ips = "*"
\ No newline at end of file
+uwsgi_allow_ips = "*"
+
+# Load Django once in the master so workers share its memory, including
+# the card pool, instead of each building their own copy.
+preload_app = True
+
+
+def when_ready(server):
+    # Runs in the master after the app is loaded, before any worker forks.
+    # Warm up here once, so workers share the card pool's bitmaps and
+    # samplers, then close the database connections so no worker inherits
+    # an open SQLite handle.
+    import gc
+    from django.conf import settings
+    from django.db import connections
+    from matchup import mtgjson
+    from matchup.cardpool import build_in_background, get_card_pool
+    from matchup.warmup import warm_up
+    # A missing or half-downloaded AllPrintings must not stop gunicorn from
+    # booting: the site still serves, and the matchup page reports the error.
+    try:
+        warm_up()
+    except Exception:
+        server.log.exception("Warm-up failed")
+    # AllPrintings lives on the volume, which image builds and release
+    # machines don't mount, so the snapshot is written here. Until it is,
+    # workers draw matchups from the database and look for it again.
+    if settings.CARD_POOL and get_card_pool() is None:
+        build_in_background()
+    connections.close_all()
+    mtgjson.close()
+    # Keep the collector from touching (and so copying) the master's
+    # objects in every worker.
+    gc.freeze()
+
+
+def post_worker_init(worker):
+    # The pool and imports came from the master; open this worker's own
+    # connections before it takes traffic.
+    from matchup.warmup import warm_up
+    try:
+        warm_up()
+    except Exception:
+        worker.log.exception("Warm-up failed")
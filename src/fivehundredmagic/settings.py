@@ -49,6 +49,7 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
+    'matchup.ratelimit.RateLimitMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -81,30 +82,137 @@ WSGI_APPLICATION = 'fivehundredmagic.wsgi.application'
 # https://docs.djangoproject.com/en/6.0/ref/settings/#databases
 
 if RUNNING_ON_FLY:
-    DATABASES = {
-        'default': {
-            'ENGINE': 'django.db.backends.sqlite3',
-            'NAME': Path('/') / 'data' / 'db.sqlite3',
-        },
-        'mtgjson': {
-            'ENGINE': 'django.db.backends.sqlite3',
-            'NAME': Path('/') / 'data' / 'AllPrintings.sqlite',
-        },
-    }
+    DATA_DIR = Path('/') / 'data'
 else:
-    DATABASES = {
-        'default': {
-            'ENGINE': 'django.db.backends.sqlite3',
-            'NAME': REPO_DIR / 'data' / 'db.sqlite3',
-        },
-        'mtgjson': {
-            'ENGINE': 'django.db.backends.sqlite3',
-            'NAME': REPO_DIR / 'data' / 'AllPrintings.sqlite',
+    DATA_DIR = REPO_DIR / 'data'
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': DATA_DIR / 'db.sqlite3',
+        # Take the write lock when a transaction starts, not on its first
+        # write, so read-modify-write blocks serialize instead of failing.
+        'OPTIONS': {
+            'transaction_mode': 'IMMEDIATE',
         },
-    }
+    },
+    'mtgjson': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': DATA_DIR / 'AllPrintings.sqlite',
+    },
+}
 
 DATABASE_ROUTERS = ['matchup.db_router.MtgjsonRouter']
 
+# Statements slower than this many milliseconds are logged, along with
+# their EXPLAIN QUERY PLAN output, to SLOW_QUERY_LOG. None disables it.
+# The log is rotated to SLOW_QUERY_LOG + '.1' at SLOW_QUERY_LOG_MAX_BYTES.
+SLOW_QUERY_THRESHOLD_MS = 100
+SLOW_QUERY_LOG = DATA_DIR / 'slow_queries.jsonl'
+SLOW_QUERY_LOG_MAX_BYTES = 10 * 1024 * 1024
+
+# Per-IP token buckets, as {method: (tokens per second, burst)}. Bucket
+# state lives in its own SQLite file so every gunicorn worker shares it.
+# Setting RATE_LIMIT_DB to None disables rate limiting. Paths starting with
+# a RATE_LIMIT_EXEMPT prefix are never limited.
+RATE_LIMITS = {
+    'GET': (1.0, 30),
+    'POST': (1.0, 30),
+}
+RATE_LIMIT_EXEMPT = ('/images/',)
+RATE_LIMIT_DB = DATA_DIR / 'ratelimit.sqlite3' if RUNNING_ON_FLY else None
+
+# Matchup selection. 'uniform' draws random printings. 'active' pairs an
+# informative card (few games, or ranked near MATCHUP_BOUNDARY_RANK) with
+# one rated within MATCHUP_RATING_DELTA of it, and still draws uniformly
+# MATCHUP_EXPLORATION of the time. The rating index behind it is rebuilt
+# every MATCHUP_INDEX_TTL seconds.
+MATCHUP_STRATEGY = 'uniform'
+MATCHUP_EXPLORATION = 0.3
+MATCHUP_RATING_DELTA = 100
+MATCHUP_BOUNDARY_RANK = 500
+MATCHUP_BOUNDARY_WIDTH = 100
+MATCHUP_INDEX_TTL = 60
+
+# Rating engine used by the vote path: 'elo', 'elo-provisional' or
+# 'glicko2' (see matchup/rating_engines.py).
+RATING_ENGINE = 'elo'
+
+# Trending rankings sum hourly CardHourlyStat buckets over these windows
+# (in hours). `compact_trending` folds buckets older than
+# TRENDING_HOURLY_DAYS whole days into daily ones and deletes those older
+# than TRENDING_RETENTION_DAYS.
+TRENDING_WINDOWS = {'24h': 24, '7d': 7 * 24, '30d': 30 * 24}
+TRENDING_CACHE_SECONDS = 300
+TRENDING_HOURLY_DAYS = 2
+TRENDING_RETENTION_DAYS = 35
+
+# `snapshot_ratings` stores the full ranking for `compare_snapshots`. It
+# keeps every snapshot for RATING_SNAPSHOT_HOURLY_DAYS whole days, then
+# the first of each day, and deletes those older than
+# RATING_SNAPSHOT_RETENTION_DAYS.
+RATING_SNAPSHOT_HOURLY_DAYS = 7
+RATING_SNAPSHOT_RETENTION_DAYS = 365
+
+# `archive_votes` moves votes older than VOTE_ARCHIVE_DAYS out of
+# db.sqlite3 into monthly SQLite files here. Replays read both.
+VOTE_ARCHIVE_DIR = DATA_DIR / 'archive'
+VOTE_ARCHIVE_DAYS = 90
+
+# With VOTE_LOG on, every vote is also appended to VOTE_LOG_DIR/<node>.jsonl
+# (node: VOTE_LOG_NODE, else the host name) so that several machines can
+# take votes and `merge_vote_logs` can apply them to one central database.
+VOTE_LOG = False
+VOTE_LOG_DIR = DATA_DIR / 'votelog'
+VOTE_LOG_NODE = environ.get('FLY_MACHINE_ID', '')
+
+# Keep the eligible card pool in memory (see matchup/cardpool.py) so uniform
+# matchups don't scan mtgjson. It is mapped from the CARD_POOL_PATH
+# snapshot written by `build_card_pool`. If that is missing or stale,
+# gunicorn starts a build in the background and matchups come from the
+# database until it is done.
+CARD_POOL = RUNNING_ON_FLY
+CARD_POOL_PATH = DATA_DIR / 'cardpool.bin'
+
+# Uniform matchups from the card pool draw card names ('name') rather than
+# printings ('printing'), since ratings are per name. Each name is weighted
+# by its number of printings to the power MATCHUP_NAME_WEIGHT_EXPONENT:
+# 0 draws every name equally often, 1 as often as drawing printings would.
+MATCHUP_SAMPLE_BY = 'name'
+MATCHUP_NAME_WEIGHT_EXPONENT = 0
+
+# Relative weights of card categories in uniform matchups from the card
+# pool, on top of the printing-count weight above. A card's category is
+# 'basic' for basic lands, 'token' for tokens, and otherwise its rarity;
+# categories not listed weigh 1.
+MATCHUP_CATEGORY_WEIGHTS = {
+    'basic': 0.1,
+    'token': 0.1,
+    'common': 1,
+    'uncommon': 1,
+    'rare': 1,
+    'mythic': 1,
+    'special': 1,
+}
+
+# Redraw a matchup (up to MATCHUP_REPEAT_ATTEMPTS times) if this worker
+# issued the same pair of names in the last MATCHUP_REPEAT_SECONDS,
+# remembering at most MATCHUP_REPEAT_PAIRS pairs, or if it shows one of
+# the last MATCHUP_RECENT_CARDS cards the visitor saw (kept in a cookie;
+# 0 turns the cookie off).
+MATCHUP_REPEAT_ATTEMPTS = 5
+MATCHUP_REPEAT_SECONDS = 6 * 60 * 60
+MATCHUP_REPEAT_PAIRS = 100_000
+MATCHUP_RECENT_CARDS = 8
+
+# Serve card images from our own size-bounded LRU cache instead of linking
+# to Scryfall. Misses are fetched from CARD_IMAGE_UPSTREAM, formatted with
+# the scryfall id as {id} (file:// URLs work too).
+CARD_IMAGE_PROXY = False
+CARD_IMAGE_UPSTREAM = 'https://cards.scryfall.io/normal/front/{id[0]}/{id[1]}/{id}.jpg'
+CARD_IMAGE_CACHE_DIR = DATA_DIR / 'images'
+CARD_IMAGE_CACHE_BYTES = 500 * 1024 * 1024
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
@@ -1,5 +1,11 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
 
 
 class MatchupConfig(AppConfig):
     name = 'matchup'
+
+    def ready(self):
+        from . import slow_queries
+
+        connection_created.connect(slow_queries.install, dispatch_uid='matchup.slow_queries')
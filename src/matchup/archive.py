@@ -0,0 +1,314 @@
+"""Monthly SQLite archives of old votes.
+
+`matchup_vote` only ever grows, in the same db.sqlite3 that takes live
+writes, so backups, VACUUM and the page cache all get slower over time.
+`archive_votes` moves votes older than a cutoff into one SQLite file per
+month under `settings.VOTE_ARCHIVE_DIR`. The aggregates (`CardRating`,
+`PairStat`, `CardHourlyStat`) stay where they are.
+
+Archives always hold a prefix of the vote ids: everything up to the newest
+archived vote, so that `replay.vote_chunks` can stream the archives and
+then the live table and still see every vote once, in id order.
+
+`manifest.json` records each file's row count, id range and SHA-256, and
+is rewritten atomically after the files it describes are complete.
+Votes are deleted from the live table only after that.
+"""
+
+import hashlib
+import heapq
+import itertools
+import json
+import os
+import sqlite3
+import tempfile
+from collections.abc import Iterator
+from pathlib import Path
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max, Min
+
+from .models import Vote
+
+MANIFEST = "manifest.json"
+CHUNK_SIZE = 5000
+
+_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS "votes" (
+        "id" INTEGER PRIMARY KEY,
+        "card_1_uuid" TEXT NOT NULL,
+        "card_2_uuid" TEXT NOT NULL,
+        "chosen_uuid" TEXT NOT NULL,
+        "ip_address" TEXT NOT NULL,
+        "created_at" TEXT NOT NULL,
+        "matchup_token" TEXT
+    )
+"""
+# For `archived_tokens`. Files archived before it existed are scanned.
+_TOKEN_INDEX = 'CREATE INDEX IF NOT EXISTS "votes_matchup_token" ON "votes" ("matchup_token")'
+
+
+def archive_dir() -> Path:
+    return Path(settings.VOTE_ARCHIVE_DIR)
+
+
+def read_manifest(directory: Path | None = None) -> dict[str, dict]:
+    """Map archive file names to their rows, first_id, last_id and sha256."""
+    path = (directory or archive_dir()) / MANIFEST
+    try:
+        return json.loads(path.read_text())
+    except FileNotFoundError:
+        return {}
+
+
+def _write_manifest(directory: Path, manifest: dict[str, dict]) -> None:
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, directory / MANIFEST)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def file_name(created_at) -> str:
+    return f"votes-{created_at:%Y-%m}.sqlite3"
+
+
+def sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while block := f.read(1 << 20):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def last_archived_id(manifest: dict[str, dict] | None = None) -> int:
+    """Id of the newest archived vote; every vote up to it is archived."""
+    if manifest is None:
+        manifest = read_manifest()
+    return max((entry["last_id"] for entry in manifest.values()), default=0)
+
+
+# ((manifest path, mtime, size), count) of the last manifest counted.
+_count_cache: tuple[tuple, int] | None = None
+
+
+def archived_count(manifest: dict[str, dict] | None = None) -> int:
+    """Votes in the archives. Without `manifest`, the count is cached until
+    manifest.json changes, since the leaderboard asks on every request."""
+    global _count_cache
+    if manifest is not None:
+        return sum(entry["rows"] for entry in manifest.values())
+    path = archive_dir() / MANIFEST
+    try:
+        st = path.stat()
+    except FileNotFoundError:
+        return 0
+    key = (str(path), st.st_mtime_ns, st.st_size)
+    cached = _count_cache
+    if cached is None or cached[0] != key:
+        cached = _count_cache = (key, archived_count(read_manifest(path.parent)))
+    return cached[1]
+
+
+def archive_votes(cutoff) -> dict[str, int]:
+    """Move votes cast before `cutoff` into the monthly archives.
+
+    Archives must hold a prefix of the ids, but ids don't follow
+    `created_at` exactly: `votelog.merge` inserts votes with their
+    original times and new ids. So this stops before the first vote cast
+    at or after `cutoff`, and a late-merged old vote waits for the newer
+    votes below it to age out.
+
+    Returns the number of votes archived per file. Safe to rerun after an
+    interruption: rows are inserted idempotently, and the live table is
+    trimmed up to whatever the manifest says is archived.
+    """
+    directory = archive_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    manifest = read_manifest(directory)
+    after_id = last_archived_id(manifest)
+    live = Vote.objects.filter(pk__gt=after_id)
+    upto_id = live.filter(created_at__lt=cutoff).aggregate(last=Max("pk"))["last"]
+    first_new = live.filter(created_at__gte=cutoff).aggregate(first=Min("pk"))["first"]
+    if upto_id is not None and first_new is not None:
+        upto_id = min(upto_id, first_new - 1)
+
+    moved = {}
+    if upto_id is not None and upto_id > after_id:
+        files = {}
+        try:
+            for chunk in _live_chunks(after_id, upto_id):
+                for row in chunk:
+                    name = file_name(row[5])
+                    db = files.get(name)
+                    if db is None:
+                        db = files[name] = sqlite3.connect(directory / name)
+                        db.execute(_SCHEMA)
+                        db.execute(_TOKEN_INDEX)
+                    token = row[6]
+                    db.execute(
+                        'INSERT OR IGNORE INTO "votes" VALUES (?, ?, ?, ?, ?, ?, ?)',
+                        (*row[:5], row[5].isoformat(), str(token) if token else None),
+                    )
+                    moved[name] = moved.get(name, 0) + 1
+            for db in files.values():
+                db.commit()
+        finally:
+            for db in files.values():
+                db.close()
+
+        for name in files:
+            rows, first_id, last_id = _file_summary(directory / name)
+            manifest[name] = {
+                "rows": rows,
+                "first_id": first_id,
+                "last_id": last_id,
+                "sha256": sha256(directory / name),
+            }
+        _write_manifest(directory, manifest)
+
+    _trim_live(last_archived_id(manifest))
+    return moved
+
+
+def _live_chunks(after_id: int, upto_id: int) -> Iterator[list[tuple]]:
+    """Live votes in (after_id, upto_id] with every column, a query per
+    chunk like `replay.vote_chunks`: an open cursor would hold SQLite's
+    shared lock, and block votes, for the whole run."""
+    while after_id < upto_id:
+        chunk = list(
+            Vote.objects.filter(pk__gt=after_id, pk__lte=upto_id)
+            .order_by("pk")
+            .values_list(
+                "pk", "card_1_uuid", "card_2_uuid", "chosen_uuid", "ip_address", "created_at",
+                "matchup_token",
+            )[:CHUNK_SIZE]
+        )
+        if not chunk:
+            return
+        yield chunk
+        after_id = chunk[-1][0]
+
+
+def _trim_live(upto_id: int) -> None:
+    """Delete archived votes from the live table, in short transactions."""
+    while True:
+        with transaction.atomic():
+            ids = list(
+                Vote.objects.filter(pk__lte=upto_id)
+                .order_by("pk")
+                .values_list("pk", flat=True)[:CHUNK_SIZE]
+            )
+            if not ids:
+                return
+            Vote.objects.filter(pk__gte=ids[0], pk__lte=ids[-1]).delete()
+
+
+def verify() -> list[str]:
+    """Check every archive against the manifest; return a list of problems."""
+    directory = archive_dir()
+    problems = []
+    for name, entry in sorted(read_manifest(directory).items()):
+        path = directory / name
+        if not path.exists():
+            problems.append(f"{name}: missing")
+            continue
+        if sha256(path) != entry["sha256"]:
+            problems.append(f"{name}: checksum mismatch")
+            continue
+        db = _open_read_only(path)
+        try:
+            (status,) = db.execute("PRAGMA integrity_check").fetchone()
+        finally:
+            db.close()
+        rows, first_id, last_id = _file_summary(path)
+        if status != "ok":
+            problems.append(f"{name}: {status}")
+        elif (rows, first_id, last_id) != (entry["rows"], entry["first_id"], entry["last_id"]):
+            problems.append(f"{name}: holds {rows} votes ({first_id}-{last_id}), manifest differs")
+    return problems
+
+
+def _open_read_only(path: Path) -> sqlite3.Connection:
+    return sqlite3.connect(f"{path.resolve().as_uri()}?mode=ro", uri=True)
+
+
+def _file_summary(path: Path) -> tuple[int, int, int]:
+    """(row count, first id, last id) of one archive file."""
+    db = _open_read_only(path)
+    try:
+        return db.execute('SELECT COUNT(*), MIN("id"), MAX("id") FROM "votes"').fetchone()
+    finally:
+        db.close()
+
+
+def _file_votes(path: Path, after_id: int, upto_id: int, columns: str) -> Iterator[tuple]:
+    db = _open_read_only(path)
+    try:
+        yield from db.execute(
+            f'SELECT {columns} FROM "votes" WHERE "id" > ? AND "id" <= ? ORDER BY "id"',
+            (after_id, upto_id),
+        )
+    finally:
+        db.close()
+
+
+def archived_votes(
+    after_id: int,
+    upto_id: int,
+    manifest: dict[str, dict] | None = None,
+    timestamps: bool = False,
+) -> Iterator[tuple]:
+    """Yield archived (id, card_1_uuid, card_2_uuid, chosen_uuid) in
+    (after_id, upto_id], plus created_at as a string if `timestamps`.
+
+    Files are merged by id, so votes near a month boundary come out in
+    order even if their timestamps and ids disagree.
+    """
+    if manifest is None:
+        manifest = read_manifest()
+    columns = '"id", "card_1_uuid", "card_2_uuid", "chosen_uuid"'
+    if timestamps:
+        columns += ', "created_at"'
+    directory = archive_dir()
+    streams = [
+        _file_votes(directory / name, after_id, upto_id, columns)
+        for name, entry in sorted(manifest.items())
+        if entry["last_id"] > after_id and entry["first_id"] <= upto_id
+    ]
+    return heapq.merge(*streams)
+
+
+def archived_tokens(tokens: set[str], manifest: dict[str, dict] | None = None) -> set[str]:
+    """The matchup tokens among `tokens` (as strings) of archived votes."""
+    if manifest is None:
+        manifest = read_manifest()
+    found = set()
+    if not tokens:
+        return found
+    directory = archive_dir()
+    placeholders = ", ".join("?" * len(tokens))
+    for name in sorted(manifest):
+        db = _open_read_only(directory / name)
+        try:
+            found.update(token for (token,) in db.execute(
+                f'SELECT "matchup_token" FROM "votes" WHERE "matchup_token" IN ({placeholders})',
+                list(tokens),
+            ))
+        finally:
+            db.close()
+    return found
+
+
+def vote_chunks(
+    after_id: int, upto_id: int, chunk_size: int, manifest: dict[str, dict] | None = None
+) -> Iterator[list[tuple[int, str, str, str]]]:
+    """Archived votes in (after_id, upto_id], chunked like `replay.vote_chunks`."""
+    for chunk in itertools.batched(archived_votes(after_id, upto_id, manifest), chunk_size):
+        yield list(chunk)
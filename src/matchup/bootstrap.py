@@ -0,0 +1,176 @@
+"""Bootstrap confidence intervals for card ranks.
+
+One rating per card can't say whether ranks 480 and 520 are really
+different. `bootstrap` refits a Bradley-Terry model to resampled copies of
+the `PairStat` head-to-head records and reports, per card, the spread of
+ranks it gets across the refits.
+
+Resampling is a Poisson bootstrap: every vote is counted Poisson(1) times,
+so a pair's win count w becomes a Poisson(w) draw. That is equivalent to
+resampling the vote log, but needs only the aggregates. Refits are
+independent, so they run across a process pool. Each worker receives the
+records once, and each refit starts from the full-data fit, so it
+converges in a few iterations.
+"""
+
+import math
+import random
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+
+from .models import PairStat
+
+
+@dataclass
+class Pairs:
+    """Head-to-head records as parallel arrays over interned names."""
+
+    names: list[str]
+    a: array
+    b: array
+    wins_a: array
+    wins_b: array
+
+
+def load_pairs() -> Pairs:
+    names = []
+    ids = {}
+    pairs = Pairs(names, array("I"), array("I"), array("I"), array("I"))
+    for name_a, name_b, wins_a, wins_b in PairStat.objects.values_list(
+        "name_a", "name_b", "wins_a", "wins_b"
+    ).iterator():
+        for name in (name_a, name_b):
+            if name not in ids:
+                ids[name] = len(names)
+                names.append(name)
+        pairs.a.append(ids[name_a])
+        pairs.b.append(ids[name_b])
+        pairs.wins_a.append(wins_a)
+        pairs.wins_b.append(wins_b)
+    return pairs
+
+
+def fit(
+    pairs: Pairs,
+    wins_a=None,
+    wins_b=None,
+    start=None,
+    iterations: int = 200,
+    tolerance: float = 1e-4,
+) -> array:
+    """Bradley-Terry strengths by Hunter's MM algorithm.
+
+    Fits `wins_a`/`wins_b` (default: the recorded wins). Every card also
+    gets one virtual win and one virtual loss against a card of strength 1.
+    That keeps the strengths of unbeaten and winless cards finite, and it
+    fixes the scale. Stops when no strength changes by more than
+    `tolerance`, relatively.
+    """
+    wins_a = pairs.wins_a if wins_a is None else wins_a
+    wins_b = pairs.wins_b if wins_b is None else wins_b
+    n = len(pairs.names)
+    wins = [1.0] * n
+    # Pairs a resample left without games don't enter the fit.
+    played = []
+    for i, j, w_a, w_b in zip(pairs.a, pairs.b, wins_a, wins_b):
+        if w_a or w_b:
+            wins[i] += w_a
+            wins[j] += w_b
+            played.append((i, j, w_a + w_b))
+
+    p = list(start) if start is not None else [1.0] * n
+    for _ in range(iterations):
+        denominators = [2.0 / (x + 1.0) for x in p]
+        for i, j, g in played:
+            t = g / (p[i] + p[j])
+            denominators[i] += t
+            denominators[j] += t
+        new = [w / d for w, d in zip(wins, denominators)]
+        change = max((abs(x - y) / y for x, y in zip(new, p)), default=0.0)
+        p = new
+        if change < tolerance:
+            break
+    return array("d", p)
+
+
+def ranks(strengths) -> array:
+    """1-based rank of every card, strongest first."""
+    order = sorted(range(len(strengths)), key=strengths.__getitem__, reverse=True)
+    result = array("I", bytes(4 * len(order)))
+    for rank, i in enumerate(order, 1):
+        result[i] = rank
+    return result
+
+
+_EXP_NEG = [math.exp(-k) for k in range(30)]
+
+
+def poisson(lam: int, rng: random.Random) -> int:
+    """A Poisson(`lam`) draw: exact below 30, normal approximation above."""
+    if lam < 30:
+        limit = _EXP_NEG[lam]
+        k = 0
+        product = rng.random()
+        while product > limit:
+            k += 1
+            product *= rng.random()
+        return k
+    return max(0, round(rng.gauss(lam, math.sqrt(lam))))
+
+
+# Set in each worker process by `_init_worker`.
+_state = None
+
+
+def _init_worker(state) -> None:
+    global _state
+    _state = state
+
+
+def _replicate(seed: str) -> array:
+    """Ranks from one refit of resampled records."""
+    pairs, start, iterations, tolerance = _state
+    rng = random.Random(seed)
+    wins_a = [poisson(w, rng) for w in pairs.wins_a]
+    wins_b = [poisson(w, rng) for w in pairs.wins_b]
+    return ranks(fit(pairs, wins_a, wins_b, start, iterations, tolerance))
+
+
+def bootstrap(
+    pairs: Pairs,
+    samples: int,
+    workers: int | None = None,
+    seed: int = 0,
+    iterations: int = 200,
+    tolerance: float = 1e-4,
+) -> tuple[array, list[array]]:
+    """Fit all records, then `samples` resamples across `workers` processes.
+
+    Returns (full-data strengths, ranks from each resample).
+    """
+    strengths = fit(pairs, iterations=iterations, tolerance=tolerance)
+    state = (pairs, strengths, iterations, tolerance)
+    seeds = [f"bootstrap-{seed}-{k}" for k in range(samples)]
+    if workers == 1:
+        _init_worker(state)
+        return strengths, [_replicate(s) for s in seeds]
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_worker, initargs=(state,)
+    ) as pool:
+        return strengths, list(pool.map(_replicate, seeds))
+
+
+def intervals(replicates: list[array], confidence: float) -> list[tuple[int, int]]:
+    """(low, high) rank bounds holding the middle `confidence` of each card's ranks."""
+    if not replicates:
+        return []
+    count = len(replicates)
+    tail = (1.0 - confidence) / 2
+    low = math.floor(tail * (count - 1))
+    high = math.ceil((1.0 - tail) * (count - 1))
+    result = []
+    for card_ranks in zip(*replicates):
+        card_ranks = sorted(card_ranks)
+        result.append((card_ranks[low], card_ranks[high]))
+    return result
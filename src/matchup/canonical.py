@@ -0,0 +1,99 @@
+"""Choosing the preferred printing of each card name.
+
+Used by `build_canonical_printings` for leaderboard images, and by the
+card pool for the image a name-level matchup shows.
+"""
+
+# Set types whose printings are oddities rather than a card's usual look.
+UNUSUAL_SET_TYPES = {"promo", "funny", "memorabilia", "token", "box", "alchemy"}
+
+# Prefer the modern frames; anything else (1993, 1997, future) ranks last.
+FRAME_RANK = {"2015": 2, "2003": 1}
+
+# Frame effects that mark a card's mechanics on its usual printing, unlike
+# treatments such as showcase, extendedart or etched.
+PLAIN_FRAME_EFFECTS = {
+    "legendary", "enchantment", "miracle", "nyxtouched", "devoid", "tombstone",
+    "colorshifted", "lesson", "spree", "sunmoondfc", "compasslanddfc", "originpwdfc",
+    "mooneldrazidfc", "waxingandwaningmoondfc", "fandfc", "upsidedowndfc", "convertdfc",
+}
+
+
+def is_plain_treatment(frame_effects, border_color, is_full_art) -> bool:
+    """Whether a printing has the usual black border and art box, without
+    showcase, extended-art, etched or similar treatments."""
+    effects = set(filter(None, (frame_effects or "").split(",")))
+    return (
+        (border_color or "black") == "black"
+        and not is_full_art
+        and effects <= PLAIN_FRAME_EFFECTS
+    )
+
+
+def printing_preference(
+    language, is_promo, frame_version, set_type, release_date, uuid, plain_treatment=True
+):
+    """Sort key for a printing; the greatest is the canonical one.
+
+    In order: English, not a promo, from a regular set, in a modern frame,
+    without a special treatment (see `is_plain_treatment`), most recently
+    released. The uuid breaks ties so rebuilds are stable.
+    """
+    return (
+        language == "English",
+        not is_promo,
+        set_type not in UNUSUAL_SET_TYPES,
+        FRAME_RANK.get(frame_version, 0),
+        plain_treatment,
+        release_date or "",
+        uuid,
+    )
+
+
+def scryfall_ids() -> dict[str, str]:
+    """Map the uuid of every printing that has a scryfall image to its id."""
+    from .models import CardIdentifiers
+
+    return dict(
+        CardIdentifiers.objects.using("mtgjson")
+        .exclude(scryfallId__isnull=True)
+        .exclude(scryfallId="")
+        .values_list("uuid", "scryfallId")
+        .iterator()
+    )
+
+
+def best_printings(scryfall_ids: dict[str, str]) -> dict[str, str]:
+    """Map each card name to the uuid of its preferred eligible printing,
+    among those in `scryfall_ids`."""
+    from .models import Card, CardSet
+
+    sets = {
+        code: (set_type, release_date)
+        for code, set_type, release_date in CardSet.objects.using("mtgjson").values_list(
+            "code", "type", "releaseDate"
+        )
+    }
+
+    best = {}
+    printings = (
+        Card.objects.using("mtgjson")
+        .eligible()
+        .values_list(
+            "uuid", "name", "setCode", "language", "isPromo", "frameVersion",
+            "frameEffects", "borderColor", "isFullArt",
+        )
+        .iterator()
+    )
+    for (uuid, name, set_code, language, is_promo, frame_version,
+         frame_effects, border_color, is_full_art) in printings:
+        if uuid not in scryfall_ids:
+            continue
+        set_type, release_date = sets.get(set_code, (None, None))
+        key = printing_preference(
+            language, is_promo, frame_version, set_type, release_date, uuid,
+            is_plain_treatment(frame_effects, border_color, is_full_art),
+        )
+        if name not in best or key > best[name][0]:
+            best[name] = (key, uuid)
+    return {name: uuid for name, (_, uuid) in best.items()}
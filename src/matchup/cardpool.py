@@ -0,0 +1,559 @@
+"""Packed, memory-mapped snapshot of the eligible card pool.
+
+Picking a uniform matchup with `order_by('?')` scans the whole mtgjson
+`cards` table, which is most of a cold request on a machine that has just
+scaled up from zero. `CardPool` instead holds every eligible printing that
+has a scryfall image as a few string columns, each packed as an array of
+offsets plus one UTF-8 blob. Picking a card is then an index into the
+arrays, with no database access at all. Themed matchups (one rarity, set,
+layout, supertype or frame) filter the pool with per-value bitmaps; see
+`CardPool.select`.
+
+The pool also groups printings by card name. Ratings are per name, so
+uniform matchups draw names and show each name's representative printing,
+the one `build_canonical_printings` would pick. Drawing printings instead
+would favour cards with dozens of reprints. Draws are weighted by card
+category (basic lands, tokens, rarities) through an `AliasSampler`.
+
+The `build_card_pool` command writes the pool to `settings.CARD_POOL_PATH`.
+Loading it is an `mmap`, so startup cost doesn't grow with the pool. The
+file records a fingerprint of AllPrintings.sqlite (size, mtime and MTGJSON
+version). A missing snapshot, or one built from a different AllPrintings,
+is ignored: matchups come from the database until a fresh one is written.
+Under gunicorn the master starts that build in a separate process (see
+`build_in_background`), and processes without a pool look for the
+snapshot again every `SNAPSHOT_RECHECK_SECONDS`.
+
+Under gunicorn's `preload_app`, the pool is loaded once in the master
+(see gunicorn.conf.py) and inherited by every worker. A mapped snapshot
+shares the page cache, and a pool built at startup lives in anonymous
+shared memory. Either way there are no per-card Python objects, so worker
+memory stays flat as the pool grows.
+
+File layout (native byte order, sections 8-byte aligned):
+
+    header      MAGIC, fingerprint (32 bytes), card count, column count,
+                name count
+    directory   per column: (offsets position, blob position, blob length),
+                then (representatives position, printings position)
+    columns     per column: uint32 offsets[count + 1], then the blob
+    names       uint32 representative[names], uint32 printings[names],
+                in name order
+"""
+
+import bisect
+import hashlib
+import logging
+import mmap
+import os
+import random
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from array import array
+from collections.abc import Iterable
+from pathlib import Path
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+
+from .canonical import best_printings, scryfall_ids
+
+logger = logging.getLogger(__name__)
+
+# Bump the trailing version byte whenever the layout or COLUMNS change.
+MAGIC = b"MTGPOOL\x04"
+COLUMNS = (
+    "uuid", "name", "scryfall_id", "supertypes", "rarity", "set_code", "layout", "frame_version",
+)
+
+# How often a process without a pool looks for a fresh snapshot.
+SNAPSHOT_RECHECK_SECONDS = 30
+
+# Query parameters for themed matchups, and the column each one filters.
+# Supertypes are comma-separated, so a card can match several values.
+FILTERS = {
+    "rarity": "rarity",
+    "set": "set_code",
+    "layout": "layout",
+    "supertype": "supertypes",
+    "frame": "frame_version",
+}
+_MULTI_VALUED = {"supertypes"}
+_MAX_CACHED_SELECTIONS = 256
+
+_HEADER = struct.Struct("<8s32sIII")
+_DIRECTORY_ENTRY = struct.Struct("<QQQ")
+_NAMES_ENTRY = struct.Struct("<QQ")
+
+
+def _align(n: int) -> int:
+    return (n + 7) & ~7
+
+
+class CardPool:
+    """Read-only view of a packed card pool in any buffer (bytes or mmap)."""
+
+    def __init__(self, buffer):
+        self._buffer = buffer
+        view = memoryview(buffer)
+        magic, self.fingerprint, self._count, ncols, names = _HEADER.unpack_from(view, 0)
+        if magic != MAGIC or ncols != len(COLUMNS):
+            raise ValueError("Not a card pool, or one from an older version")
+
+        self._offsets = {}
+        self._blobs = {}
+        self._bitmaps = {}
+        self._prepared = {}
+        self._selections = {}
+        self._samplers = {}
+        for k, column in enumerate(COLUMNS):
+            offsets_pos, blob_pos, blob_len = _DIRECTORY_ENTRY.unpack_from(
+                view, _HEADER.size + k * _DIRECTORY_ENTRY.size
+            )
+            self._offsets[column] = view[offsets_pos:offsets_pos + 4 * (self._count + 1)].cast("I")
+            self._blobs[column] = view[blob_pos:blob_pos + blob_len]
+        representatives_pos, printings_pos = _NAMES_ENTRY.unpack_from(
+            view, _HEADER.size + len(COLUMNS) * _DIRECTORY_ENTRY.size
+        )
+        self._representatives = view[representatives_pos:representatives_pos + 4 * names].cast("I")
+        self._printings = view[printings_pos:printings_pos + 4 * names].cast("I")
+
+    def __len__(self) -> int:
+        return self._count
+
+    def get(self, column: str, i: int) -> str:
+        offsets = self._offsets[column]
+        return str(self._blobs[column][offsets[i]:offsets[i + 1]], "utf-8")
+
+    def uuid(self, i: int) -> str:
+        return self.get("uuid", i)
+
+    def name(self, i: int) -> str:
+        return self.get("name", i)
+
+    def find(self, uuid: str) -> int | None:
+        """Index of the printing with `uuid`, by binary search (rows are sorted by uuid)."""
+        i = bisect.bisect_left(range(self._count), uuid, key=self.uuid)
+        if i < self._count and self.uuid(i) == uuid:
+            return i
+        return None
+
+    def is_basic_land(self, i: int) -> bool:
+        return "Basic" in self.get("supertypes", i)
+
+    @property
+    def name_count(self) -> int:
+        """Number of distinct card names."""
+        return len(self._representatives)
+
+    def representative(self, name_id: int) -> int:
+        """Index of the printing shown for the `name_id`-th name."""
+        return self._representatives[name_id]
+
+    def printings(self, name_id: int) -> int:
+        """Number of printings of the `name_id`-th name in the pool."""
+        return self._printings[name_id]
+
+    def category(self, i: int) -> str:
+        """'basic' for basic lands, 'token' for tokens, or else the rarity of card `i`."""
+        if self.is_basic_land(i):
+            return "basic"
+        if "token" in self.get("layout", i):
+            return "token"
+        return self.get("rarity", i)
+
+    def sampler(
+        self, by: str, exponent: float, category_weights: dict[str, float]
+    ) -> "AliasSampler":
+        """An `AliasSampler` that draws card indices.
+
+        With `by` "name" it draws card names, weighted by their number of
+        printings to the power `exponent`, and returns their representative
+        printings. With "printing" it draws printings. Either way each draw
+        is also weighted by `category_weights[category]` (default 1).
+
+        Built once per set of arguments, and rebuilt along with the pool.
+        """
+        key = (by, exponent, tuple(sorted(category_weights.items())))
+        sampler = self._samplers.get(key)
+        if sampler is None:
+            if by == "name":
+                weights = (
+                    category_weights.get(self.category(i), 1.0) * n ** exponent
+                    for i, n in zip(self._representatives, self._printings)
+                )
+                sampler = AliasSampler(weights, self._representatives)
+            else:
+                sampler = AliasSampler(
+                    category_weights.get(self.category(i), 1.0) for i in range(self._count)
+                )
+            self._samplers[key] = sampler
+        return sampler
+
+    def bitmaps(self, column: str) -> dict[str, int]:
+        """Map each value of `column` to a bitmap (an int) of the cards that have it.
+
+        Built in one pass over the column the first time it is filtered on.
+        """
+        bitmaps = self._bitmaps.get(column)
+        if bitmaps is None:
+            marks = {}
+            size = (self._count + 7) // 8
+            multi = column in _MULTI_VALUED
+            for i in range(self._count):
+                value = self.get(column, i)
+                for v in value.split(",") if multi else (value,):
+                    if v:
+                        if v not in marks:
+                            marks[v] = bytearray(size)
+                        marks[v][i >> 3] |= 1 << (i & 7)
+            bitmaps = self._bitmaps[column] = {
+                v: int.from_bytes(b, "little") for v, b in marks.items()
+            }
+        return bitmaps
+
+    def prepare(self) -> None:
+        """Build the bitmaps of every `FILTERS` column and a selection for
+        every single-value theme.
+
+        Call this before forking, as `warmup.warm_up` does in the gunicorn
+        master, so that workers share them rather than each building their
+        own. Other themes are built and cached per process by `select`.
+        """
+        for param, column in FILTERS.items():
+            for value, bitmap in self.bitmaps(column).items():
+                key = ((param, (value,)),)
+                if key not in self._prepared:
+                    self._prepared[key] = Selection(bitmap, self._count)
+
+    def select(self, filters: dict[str, Iterable[str]]) -> "Selection":
+        """Cards matching every filter, where each filter maps a `FILTERS`
+        parameter to the values it accepts.
+
+        Resolved by OR-ing value bitmaps and AND-ing across filters; the
+        result is cached, so repeated themes cost one dict lookup.
+        """
+        key = tuple(sorted((param, tuple(sorted(values))) for param, values in filters.items()))
+        selection = self._prepared.get(key)
+        if selection is None:
+            selection = self._selections.get(key)
+        if selection is None:
+            bitmap = (1 << self._count) - 1
+            for param, values in key:
+                bitmaps = self.bitmaps(FILTERS[param])
+                accepted = 0
+                for value in values:
+                    accepted |= bitmaps.get(value, 0)
+                bitmap &= accepted
+            if len(self._selections) >= _MAX_CACHED_SELECTIONS:
+                self._selections.clear()
+            selection = self._selections[key] = Selection(bitmap, self._count)
+        return selection
+
+    def card_info(self, i: int) -> dict:
+        """The template dict for card `i`, as built by `views._card_info`."""
+        from .models import card_image_url
+        return {
+            "uuid": self.uuid(i),
+            "name": self.name(i),
+            "image_url": card_image_url(self.get("scryfall_id", i)),
+        }
+
+    @staticmethod
+    def pack(
+        rows: Iterable[tuple[str, ...]],
+        fingerprint: bytes,
+        preferred: dict[str, str] | None = None,
+    ) -> bytes:
+        """Encode rows of `COLUMNS` values into the packed layout.
+
+        `preferred` maps card names to the uuid of the printing to show for
+        them; other names show their first printing.
+        """
+        preferred = preferred or {}
+        offsets = [array("I", [0]) for _ in COLUMNS]
+        blobs = [bytearray() for _ in COLUMNS]
+        names = {}  # name -> [representative, printings]
+        count = 0
+        for row in rows:
+            if len(row) != len(COLUMNS):
+                raise ValueError(f"Expected {len(COLUMNS)} values per row, got {len(row)}")
+            for value, column_offsets, blob in zip(row, offsets, blobs):
+                blob += (value or "").encode()
+                column_offsets.append(len(blob))
+            uuid, name = row[0], row[1]
+            if name not in names:
+                names[name] = [count, 0]
+            group = names[name]
+            group[1] += 1
+            if preferred.get(name) == uuid:
+                group[0] = count
+            count += 1
+
+        ordered = [names[name] for name in sorted(names)]
+        representatives = array("I", (representative for representative, _ in ordered))
+        printings = array("I", (n for _, n in ordered))
+
+        out = bytearray(_align(
+            _HEADER.size + len(COLUMNS) * _DIRECTORY_ENTRY.size + _NAMES_ENTRY.size
+        ))
+        _HEADER.pack_into(out, 0, MAGIC, fingerprint, count, len(COLUMNS), len(names))
+        for k, (column_offsets, blob) in enumerate(zip(offsets, blobs)):
+            offsets_pos = len(out)
+            out += column_offsets.tobytes()
+            blob_pos = len(out)
+            out += blob
+            out += bytes(_align(len(out)) - len(out))
+            _DIRECTORY_ENTRY.pack_into(
+                out, _HEADER.size + k * _DIRECTORY_ENTRY.size, offsets_pos, blob_pos, len(blob)
+            )
+        representatives_pos = len(out)
+        out += representatives.tobytes()
+        printings_pos = len(out)
+        out += printings.tobytes()
+        out += bytes(_align(len(out)) - len(out))
+        _NAMES_ENTRY.pack_into(
+            out, _HEADER.size + len(COLUMNS) * _DIRECTORY_ENTRY.size,
+            representatives_pos, printings_pos,
+        )
+        return bytes(out)
+
+    @classmethod
+    def open(cls, path: Path) -> "CardPool":
+        """Memory-map a pool file."""
+        with open(path, "rb") as f:
+            return cls(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+    @classmethod
+    def shared(cls, data: bytes) -> "CardPool":
+        """Copy a packed pool into anonymous shared memory.
+
+        Pages of a shared mapping are never copied on write, so processes
+        forked after this all read the same physical memory.
+        """
+        buffer = mmap.mmap(-1, len(data))
+        buffer.write(data)
+        return cls(buffer)
+
+
+_POPCOUNT = bytes(bin(i).count("1") for i in range(256))
+
+
+class Selection:
+    """A subset of the pool, given as a bitmap, with uniform sampling.
+
+    Counts of set bits per block of `BLOCK_BYTES` are kept as a running
+    total, so finding the k-th member is a binary search over blocks plus a
+    scan of one block, however few cards the bitmap selects.
+    """
+
+    BLOCK_BYTES = 128
+
+    def __init__(self, bitmap: int, size: int):
+        self._bytes = bitmap.to_bytes((size + 7) // 8, "little")
+        self._cumulative = []
+        total = 0
+        for start in range(0, len(self._bytes), self.BLOCK_BYTES):
+            block = self._bytes[start:start + self.BLOCK_BYTES]
+            total += int.from_bytes(block, "little").bit_count()
+            self._cumulative.append(total)
+
+    def __len__(self) -> int:
+        return self._cumulative[-1] if self._cumulative else 0
+
+    def nth(self, k: int) -> int:
+        """Pool index of the `k`-th selected card (0-based)."""
+        block = bisect.bisect_right(self._cumulative, k)
+        if block:
+            k -= self._cumulative[block - 1]
+        data = self._bytes
+        for byte_index in range(block * self.BLOCK_BYTES, len(data)):
+            byte = data[byte_index]
+            count = _POPCOUNT[byte]
+            if k < count:
+                for bit in range(8):
+                    if byte >> bit & 1:
+                        if not k:
+                            return byte_index * 8 + bit
+                        k -= 1
+            k -= count
+        raise IndexError(k)
+
+    def sample(self, k: int, rng=random) -> list[int]:
+        """Pool indices of `k` distinct random selected cards."""
+        return [self.nth(r) for r in rng.sample(range(len(self)), k)]
+
+
+class AliasSampler:
+    """O(1) draws from a fixed discrete distribution, by Vose's alias method.
+
+    Index i is drawn with probability weights[i] / sum(weights): pick a
+    column uniformly, then keep it with probability `prob` or take its
+    `alias`. Building the table is O(n). Draws return `values[i]` if
+    `values` is given, or else i.
+    """
+
+    def __init__(self, weights: Iterable[float], values=None):
+        scaled = [float(w) for w in weights]
+        n = len(scaled)
+        total = sum(scaled)
+        self._n = n
+        self._values = values
+        self._drawable = sum(1 for w in scaled if w > 0)
+        self._prob = array("d", bytes(8 * n))
+        self._alias = array("I", range(n))
+        if not self._drawable:
+            return
+
+        scaled = [w * n / total for w in scaled]
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        while small and large:
+            s, l = small.pop(), large.pop()
+            self._prob[s] = scaled[s]
+            self._alias[s] = l
+            scaled[l] += scaled[s] - 1.0
+            (small if scaled[l] < 1.0 else large).append(l)
+        # Whatever is left is 1 up to rounding error.
+        for i in large + small:
+            self._prob[i] = 1.0
+
+    def __len__(self) -> int:
+        """Number of values with a nonzero weight."""
+        return self._drawable
+
+    def draw(self, rng=random) -> int:
+        column = int(rng.random() * self._n)
+        i = column if rng.random() < self._prob[column] else self._alias[column]
+        return i if self._values is None else self._values[i]
+
+    def sample(self, k: int, rng=random) -> list[int]:
+        """`k` distinct draws."""
+        if k > len(self):
+            raise ValueError("Sample larger than population")
+        picks = []
+        while len(picks) < k:
+            value = self.draw(rng)
+            if value not in picks:
+                picks.append(value)
+        return picks
+
+
+def mtgjson_fingerprint() -> bytes:
+    """Identify the current AllPrintings.sqlite without reading all of it."""
+    path = settings.DATABASES["mtgjson"]["NAME"]
+    try:
+        st = os.stat(path)
+        file_id = f"{st.st_size}:{st.st_mtime_ns}"
+    except (OSError, TypeError):
+        file_id = str(path)  # e.g. an in-memory test database
+    try:
+        with connections["mtgjson"].cursor() as cursor:
+            cursor.execute('SELECT "date", "version" FROM "meta"')
+            meta = repr(cursor.fetchall())
+    except DatabaseError:
+        meta = ""
+    key = f"{MAGIC!r}|{sys.byteorder}|{file_id}|{meta}"
+    return hashlib.sha256(key.encode()).digest()
+
+
+def pool_rows(scryfall_ids: dict[str, str]) -> list[tuple[str, ...]]:
+    """Eligible printings with a scryfall image, as `COLUMNS` tuples."""
+    from .models import Card
+
+    cards = (
+        Card.objects.using("mtgjson")
+        .eligible()
+        .values_list(
+            "uuid", "name", "supertypes", "rarity", "setCode", "layout", "frameVersion"
+        )
+        .iterator()
+    )
+    # Sorted here rather than relying on the database's collation, since
+    # CardPool.find depends on the order.
+    return sorted(
+        (uuid, name, scryfall_ids[uuid], *rest)
+        for uuid, name, *rest in cards
+        if uuid in scryfall_ids
+    )
+
+
+def build_card_pool() -> bytes:
+    ids = scryfall_ids()
+    return CardPool.pack(pool_rows(ids), mtgjson_fingerprint(), best_printings(ids))
+
+
+def write_card_pool(path: Path) -> CardPool:
+    """Build the pool and write it to `path` atomically."""
+    data = build_card_pool()
+    path = Path(path)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    return CardPool(data)
+
+
+def load_card_pool() -> CardPool | None:
+    """Map the snapshot if it matches AllPrintings, or return None.
+
+    Without a `settings.CARD_POOL_PATH`, build the pool in memory instead.
+    """
+    path = settings.CARD_POOL_PATH
+    if not path:
+        return CardPool.shared(build_card_pool())
+    if not os.path.exists(path):
+        logger.warning("No card pool at %s", path)
+        return None
+    try:
+        pool = CardPool.open(path)
+    except ValueError:
+        logger.warning("Ignoring card pool %s from an older version", path)
+        return None
+    if pool.fingerprint != mtgjson_fingerprint():
+        logger.warning("Ignoring card pool %s built from a different AllPrintings", path)
+        return None
+    return pool
+
+
+def build_in_background() -> subprocess.Popen:
+    """Run `build_card_pool` in a separate process, so startup doesn't wait
+    for it."""
+    logger.warning("Building card pool %s in the background", settings.CARD_POOL_PATH)
+    return subprocess.Popen(
+        [sys.executable, str(Path(settings.BASE_DIR) / "manage.py"), "build_card_pool"],
+        cwd=settings.BASE_DIR,
+    )
+
+
+_pool: CardPool | None = None
+_pool_lock = threading.Lock()
+_next_check = 0.0
+
+
+def get_card_pool() -> CardPool | None:
+    """This process's card pool, or None if `settings.CARD_POOL` is off or
+    there is no current snapshot yet."""
+    global _pool, _next_check
+    if not settings.CARD_POOL:
+        return None
+    with _pool_lock:
+        if _pool is None and time.monotonic() >= _next_check:
+            _pool = load_card_pool()
+            _next_check = time.monotonic() + SNAPSHOT_RECHECK_SECONDS
+        return _pool
+
+
+def clear_card_pool() -> None:
+    global _pool, _next_check
+    with _pool_lock:
+        _pool = None
+        _next_check = 0.0
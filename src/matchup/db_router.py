@@ -1,4 +1,4 @@
-MTGJSON_MODELS = {'card', 'cardidentifiers'}
+MTGJSON_MODELS = {'card', 'cardidentifiers', 'cardset'}
 
 
 class MtgjsonRouter:
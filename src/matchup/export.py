@@ -0,0 +1,166 @@
+"""Stream the vote log to files for offline analysis.
+
+Votes are read in primary-key order, from the archives (see `archive`)
+and then the live table a chunk at a time, so memory doesn't grow with
+the number of votes. Three formats:
+
+    csv     gzipped CSV, one row per vote with uuids, card names and winner
+    jsonl   gzipped JSON lines with the same fields
+    bin     fixed-width records of `RECORD`: card 1 id, card 2 id (int32),
+            outcome (int8: 1 if card 1 won, 0 if card 2, -1 if neither)
+            and the time in microseconds since the epoch (int64). Card ids
+            index a JSON list of names in a sidecar file. Records are not
+            compressed, so the file can be memory-mapped; see `read_binary`.
+
+Voters' IP addresses are never exported. Pass the last exported vote id as
+`after_id` to export only newer votes. Reusing the names sidecar keeps
+card ids stable across incremental binary exports.
+"""
+
+import csv
+import gzip
+import itertools
+import json
+import mmap
+import struct
+from collections.abc import Iterator
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from django.db.models import Max
+
+from . import archive
+from .models import Vote
+from .replay import CHUNK_SIZE, NameIndex, _resolve_uuids
+
+FORMATS = ("csv", "jsonl", "bin")
+FIELDS = ("id", "created_at", "card_1_uuid", "card_2_uuid", "chosen_uuid",
+          "card_1_name", "card_2_name", "winner")
+RECORD = struct.Struct("<iibq")
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+def votes(after_id: int, upto_id: int) -> Iterator[tuple[int, str, str, str, datetime]]:
+    """(pk, card_1_uuid, card_2_uuid, chosen_uuid, created_at) in pk order."""
+    manifest = archive.read_manifest()
+    archived_id = archive.last_archived_id(manifest)
+    if after_id < archived_id:
+        for *row, created_at in archive.archived_votes(
+            after_id, min(upto_id, archived_id), manifest, timestamps=True
+        ):
+            yield (*row, datetime.fromisoformat(created_at))
+        after_id = archived_id
+    # A query per chunk, like `replay.vote_chunks`: an open cursor would
+    # hold SQLite's shared lock, and block votes, for the whole export.
+    while after_id < upto_id:
+        chunk = list(
+            Vote.objects.filter(pk__gt=after_id, pk__lte=upto_id)
+            .order_by("pk")
+            .values_list("pk", "card_1_uuid", "card_2_uuid", "chosen_uuid", "created_at")
+            [:CHUNK_SIZE]
+        )
+        if not chunk:
+            return
+        yield from chunk
+        after_id = chunk[-1][0]
+
+
+def _winner(card_1: str, card_2: str, chosen: str) -> int | None:
+    """1 or 2 for the card that was chosen, or None if neither was."""
+    if chosen == card_1:
+        return 1
+    if chosen == card_2:
+        return 2
+    return None
+
+
+def _rows(index: NameIndex, after_id: int, upto_id: int) -> Iterator[tuple]:
+    """`votes` plus the two cards' name ids (-1 if unknown), a chunk of
+    uuids resolved at a time."""
+    for chunk in itertools.batched(votes(after_id, upto_id), CHUNK_SIZE):
+        _resolve_uuids(index, chunk)
+        uuid_ids = index.uuid_ids
+        for row in chunk:
+            yield (*row, uuid_ids[row[1]], uuid_ids[row[2]])
+
+
+def _load_names(path: Path) -> NameIndex:
+    index = NameIndex()
+    if path.exists():
+        for name in json.loads(path.read_text()):
+            index.name_id(name)
+    return index
+
+
+def export_votes(
+    path: Path, fmt: str, after_id: int = 0, names_path: Path | None = None
+) -> tuple[int, int]:
+    """Write votes with ids above `after_id` to `path` in `fmt`.
+
+    Binary exports also write card names to `names_path` (by default
+    `path` with ".names.json" appended), extending it if it exists.
+    Returns (votes written, last vote id).
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format {fmt!r}")
+    path = Path(path)
+    upto_id = max(
+        Vote.objects.aggregate(last=Max("pk"))["last"] or 0,
+        archive.last_archived_id(),
+    )
+    if fmt == "bin":
+        names_path = Path(names_path or f"{path}.names.json")
+        index = _load_names(names_path)
+    else:
+        index = NameIndex()
+
+    count = 0
+    last_id = after_id
+    rows = _rows(index, after_id, upto_id)
+    if fmt == "bin":
+        with open(path, "wb") as f:
+            for pk, card_1, card_2, chosen, created_at, id_1, id_2 in rows:
+                micros = (created_at - _EPOCH) // _MICROSECOND
+                winner = _winner(card_1, card_2, chosen)
+                outcome = -1 if winner is None else 2 - winner
+                f.write(RECORD.pack(id_1, id_2, outcome, micros))
+                count += 1
+                last_id = pk
+        names_path.write_text(json.dumps(index.names))
+        return count, last_id
+
+    names = index.names
+    with gzip.open(path, "wt", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f) if fmt == "csv" else None
+        if writer:
+            writer.writerow(FIELDS)
+        for pk, card_1, card_2, chosen, created_at, id_1, id_2 in rows:
+            values = (
+                pk,
+                created_at.isoformat(),
+                card_1,
+                card_2,
+                chosen,
+                names[id_1] if id_1 >= 0 else None,
+                names[id_2] if id_2 >= 0 else None,
+                _winner(card_1, card_2, chosen),
+            )
+            if writer:
+                writer.writerow(values)
+            else:
+                f.write(json.dumps(dict(zip(FIELDS, values))) + "\n")
+            count += 1
+            last_id = pk
+    return count, last_id
+
+
+def read_binary(path: Path) -> Iterator[tuple[int, int, int, int]]:
+    """Memory-map a binary export and yield its (card 1 id, card 2 id,
+    outcome, microseconds) records."""
+    with open(path, "rb") as f:
+        if not f.seek(0, 2):
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            yield from RECORD.iter_unpack(data)
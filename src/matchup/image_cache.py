@@ -0,0 +1,155 @@
+"""Size-bounded on-disk cache of card images.
+
+With `settings.CARD_IMAGE_PROXY` on, pages link card images to our own
+`card_image` view instead of Scryfall. The view serves them from files
+named by scryfall id under `settings.CARD_IMAGE_CACHE_DIR`, fetching misses
+from `settings.CARD_IMAGE_UPSTREAM`.
+
+The cache is least-recently-used by file mtime: hits touch their file, and
+once the directory grows past `max_bytes` the oldest files are deleted
+until it is back under `LOW_WATER` of the limit. Every gunicorn worker
+shares the directory; new files are written to a temporary name and
+renamed into place, so a reader never sees a partial image. A worker only
+counts its own writes between scans, so it rescans at least every
+`RESCAN_SECONDS` to see what the others have added.
+"""
+
+import os
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+
+from django.conf import settings
+
+# Evict down to this fraction of the limit, so eviction (which lists the
+# whole directory) runs once per batch of misses rather than once per miss.
+LOW_WATER = 0.9
+
+# Rescan on a miss at least this often, even if our own count is under
+# the limit.
+RESCAN_SECONDS = 60
+
+FETCH_TIMEOUT = 10
+
+# A temporary file this old belongs to a write that will never finish.
+STALE_TMP_SECONDS = 10 * 60
+
+# Scryfall's "normal" images are around 100 KB; refuse anything this big.
+MAX_IMAGE_BYTES = 5 * 1024 * 1024
+
+
+class ImageCache:
+    def __init__(self, directory: Path, max_bytes: int, upstream: str):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.upstream = upstream
+        self._size = None  # bytes in the directory, as of the last scan
+        self._scanned = 0.0  # time.monotonic() of the last scan
+        self._lock = threading.Lock()
+
+    def path(self, scryfall_id: str) -> Path:
+        return self.directory / f"{scryfall_id}.jpg"
+
+    def upstream_url(self, scryfall_id: str) -> str:
+        return self.upstream.format(id=scryfall_id)
+
+    def get(self, scryfall_id: str) -> Path:
+        """Return the path of the cached image, fetching it on a miss.
+
+        Raises `urllib.error.URLError` if the upstream fetch fails or the
+        image is larger than `MAX_IMAGE_BYTES`.
+        """
+        path = self.path(scryfall_id)
+        try:
+            os.utime(path)
+            return path
+        except FileNotFoundError:
+            pass
+
+        with urllib.request.urlopen(self.upstream_url(scryfall_id), timeout=FETCH_TIMEOUT) as response:
+            data = response.read(MAX_IMAGE_BYTES + 1)
+        if len(data) > MAX_IMAGE_BYTES:
+            raise urllib.error.URLError(f"image over {MAX_IMAGE_BYTES} bytes")
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+        with self._lock:
+            if self._size is not None:
+                self._size += len(data)
+            if (
+                self._size is None
+                or self._size > self.max_bytes
+                or time.monotonic() - self._scanned > RESCAN_SECONDS
+            ):
+                self._evict()
+        return path
+
+    def _evict(self) -> None:
+        """Rescan the directory and delete the least recently used images,
+        and any temporary files left behind by a crashed write."""
+        entries = []
+        size = 0
+        stale = time.time() - STALE_TMP_SECONDS
+        for entry in os.scandir(self.directory):
+            is_tmp = entry.name.endswith(".tmp")
+            if not (is_tmp or entry.name.endswith(".jpg")):
+                continue
+            try:
+                st = entry.stat()
+                if is_tmp and st.st_mtime < stale:
+                    os.unlink(entry.path)
+                    continue
+            except FileNotFoundError:
+                continue  # renamed into place or evicted meanwhile
+            size += st.st_size
+            if not is_tmp:
+                entries.append((st.st_mtime, st.st_size, entry.path))
+
+        if size > self.max_bytes:
+            entries.sort()
+            target = self.max_bytes * LOW_WATER
+            for _, file_size, file_path in entries:
+                if size <= target:
+                    break
+                try:
+                    os.unlink(file_path)
+                except FileNotFoundError:
+                    pass  # another worker got there first
+                size -= file_size
+        self._size = size
+        self._scanned = time.monotonic()
+
+
+_cache: ImageCache | None = None
+_cache_lock = threading.Lock()
+
+
+def get_image_cache() -> ImageCache:
+    """Return this process's cache, built from settings on first use."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ImageCache(
+                settings.CARD_IMAGE_CACHE_DIR,
+                settings.CARD_IMAGE_CACHE_BYTES,
+                settings.CARD_IMAGE_UPSTREAM,
+            )
+        return _cache
+
+
+def clear_image_cache() -> None:
+    """Forget the cache object, e.g. after settings change in tests."""
+    global _cache
+    with _cache_lock:
+        _cache = None
@@ -0,0 +1,56 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from matchup import archive
+
+
+class Command(BaseCommand):
+    help = (
+        "Move old votes from db.sqlite3 into monthly archive files. "
+        "Ratings and other aggregates are left in place."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=settings.VOTE_ARCHIVE_DAYS,
+            help=f"Archive votes older than this many days (default: {settings.VOTE_ARCHIVE_DAYS})",
+        )
+        parser.add_argument(
+            "--vacuum",
+            action="store_true",
+            help="VACUUM db.sqlite3 afterwards to return the space to the filesystem",
+        )
+        parser.add_argument(
+            "--verify",
+            action="store_true",
+            help="Only check the archives against their checksums",
+        )
+
+    def handle(self, *args, **options):
+        if options["verify"]:
+            problems = archive.verify()
+            if problems:
+                raise CommandError("Archive problems:\n" + "\n".join(problems))
+            manifest = archive.read_manifest()
+            self.stdout.write(self.style.SUCCESS(
+                f"{len(manifest)} archive files, {archive.archived_count(manifest)} votes, all OK."
+            ))
+            return
+
+        cutoff = timezone.now() - timedelta(days=options["days"])
+        moved = archive.archive_votes(cutoff)
+        for name, count in sorted(moved.items()):
+            self.stdout.write(f"{name:<28}{count:>10} votes")
+        if options["vacuum"]:
+            with connection.cursor() as cursor:
+                cursor.execute("VACUUM")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Archived {sum(moved.values())} votes cast before {cutoff:%Y-%m-%d %H:%M}."
+        ))
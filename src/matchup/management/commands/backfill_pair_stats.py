@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from matchup.models import PairStat
+from matchup.pairstats import tally_pairs
+from matchup.shadow import swap_table
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the head-to-head PairStat table from the vote log, then "
+        "atomically swap it in."
+    )
+
+    def handle(self, *args, **options):
+        tally = tally_pairs()
+        counted = tally.votes
+
+        # Votes cast meanwhile are counted under the write lock, just
+        # before the swap.
+        def catch_up():
+            touched = set()
+            tally_pairs(tally, touched)
+            return [tally.row(key) for key in touched]
+
+        written = swap_table(
+            PairStat,
+            tally.rows(),
+            key=("name_a", "name_b"),
+            catch_up=catch_up,
+        )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Counted {tally.votes} votes ({tally.votes - counted} cast during "
+            f"the rebuild) into {len(tally.pairs)} pairs; swapped in {written} "
+            f"pairs plus late updates."
+        ))
@@ -0,0 +1,82 @@
+import math
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from matchup.bootstrap import bootstrap, intervals, load_pairs, ranks
+from matchup.models import RatingInterval, RatingVersion
+
+
+class Command(BaseCommand):
+    help = (
+        "Estimate a confidence interval for every card's rank by refitting "
+        "resampled head-to-head records across a process pool."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--samples", type=int, default=100,
+                            help="Bootstrap resamples (default: 100)")
+        parser.add_argument("--workers", type=int, default=None,
+                            help="Worker processes (default: one per CPU)")
+        parser.add_argument("--confidence", type=float, default=0.95,
+                            help="Share of resampled ranks inside each interval (default: 0.95)")
+        parser.add_argument("--seed", type=int, default=0,
+                            help="Seed for the resamples (default: 0)")
+        parser.add_argument("--show", type=int, default=10,
+                            help="Print this many cards from the top and around "
+                                 "MATCHUP_BOUNDARY_RANK (default: 10)")
+
+    def handle(self, *args, **options):
+        if options["samples"] < 1:
+            raise CommandError("--samples must be at least 1.")
+        started = time.perf_counter()
+        pairs = load_pairs()
+        if not pairs.names:
+            self.stdout.write("No head-to-head records yet. Run backfill_pair_stats first.")
+            return
+
+        strengths, replicates = bootstrap(
+            pairs, options["samples"], options["workers"], options["seed"]
+        )
+        point = ranks(strengths)
+        bounds = intervals(replicates, options["confidence"])
+        fitted = time.perf_counter() - started
+
+        with transaction.atomic():
+            RatingInterval.objects.all().delete()
+            RatingInterval.objects.bulk_create(
+                (
+                    RatingInterval(
+                        name=name,
+                        strength=math.log(strength),
+                        rank=rank,
+                        rank_low=low,
+                        rank_high=high,
+                        confidence=options["confidence"],
+                    )
+                    for name, strength, rank, (low, high)
+                    in zip(pairs.names, strengths, point, bounds)
+                ),
+                batch_size=2000,
+            )
+            # The leaderboard shows these intervals.
+            RatingVersion.bump()
+
+        by_rank = sorted(range(len(point)), key=point.__getitem__)
+        show = options["show"]
+        boundary = settings.MATCHUP_BOUNDARY_RANK
+        rows = by_rank[:show]
+        if boundary > show:
+            rows += by_rank[max(show, boundary - show // 2 - 1):boundary + show // 2]
+        self.stdout.write(f"\n{'Rank':>6}  {'Interval':<13} Card")
+        self.stdout.write("-" * 50)
+        for i in rows:
+            low, high = bounds[i]
+            self.stdout.write(f"{point[i]:>6}  {f'{low}-{high}':<13} {pairs.names[i]}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"\nStored {options['confidence']:.0%} rank intervals for {len(pairs.names)} cards "
+            f"from {len(pairs.a)} pairs and {options['samples']} resamples in {fitted:.1f}s."
+        ))
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from matchup.canonical import best_printings, scryfall_ids
+from matchup.models import CanonicalPrinting, RatingVersion
+
+
+class Command(BaseCommand):
+    help = "Pick the preferred printing and image of every card name."
+
+    def handle(self, *args, **options):
+        ids = scryfall_ids()
+        best = best_printings(ids)
+
+        # A few tens of thousands of small rows: one transaction is quick
+        # enough that readers never see a half-built table.
+        with transaction.atomic():
+            CanonicalPrinting.objects.all().delete()
+            CanonicalPrinting.objects.bulk_create(
+                (
+                    CanonicalPrinting(name=name, uuid=uuid, scryfall_id=ids[uuid])
+                    for name, uuid in best.items()
+                ),
+                batch_size=2000,
+            )
+            # The leaderboard shows these images, so cached copies are stale.
+            RatingVersion.bump()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Picked canonical printings for {len(best)} card names."
+        ))
@@ -0,0 +1,26 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from matchup.cardpool import write_card_pool
+
+
+class Command(BaseCommand):
+    help = "Write the packed card pool snapshot that web workers map at startup."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--output",
+            default=None,
+            help="Where to write the snapshot (default: settings.CARD_POOL_PATH)",
+        )
+
+    def handle(self, *args, **options):
+        path = options["output"] or settings.CARD_POOL_PATH
+        started = time.perf_counter()
+        pool = write_card_pool(path)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {len(pool)} cards to {path} in {elapsed:.1f}s."
+        ))
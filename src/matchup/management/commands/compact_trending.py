@@ -0,0 +1,34 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from matchup.trending import compact
+
+
+class Command(BaseCommand):
+    help = "Fold old hourly trending buckets into daily ones and drop expired buckets."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--hourly-days",
+            type=int,
+            default=settings.TRENDING_HOURLY_DAYS,
+            help="Keep hourly buckets for this many whole days "
+                 f"(default: {settings.TRENDING_HOURLY_DAYS})",
+        )
+        parser.add_argument(
+            "--retention-days",
+            type=int,
+            default=settings.TRENDING_RETENTION_DAYS,
+            help="Delete buckets older than this many days "
+                 f"(default: {settings.TRENDING_RETENTION_DAYS})",
+        )
+
+    def handle(self, *args, **options):
+        folded, days, deleted = compact(
+            timezone.now(), options["hourly_days"], options["retention_days"]
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Folded {folded} hourly buckets into {days} daily buckets; "
+            f"deleted {deleted} expired buckets."
+        ))
@@ -0,0 +1,109 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from matchup.models import RatingSnapshot
+from matchup.snapshots import BLOBS, compare
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare two rating snapshots: rank changes, Kendall's tau and top-k "
+        "overlap. Defaults to the latest snapshot and the one before it."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("old", nargs="?", type=int, help="Earlier snapshot id")
+        parser.add_argument("new", nargs="?", type=int, help="Later snapshot id")
+        parser.add_argument(
+            "--hours",
+            type=float,
+            help="Compare against the latest snapshot at least this many hours "
+                 "older than the new one",
+        )
+        parser.add_argument(
+            "-k",
+            type=int,
+            default=settings.MATCHUP_BOUNDARY_RANK,
+            help="Size of the top of the ranking to compare "
+                 f"(default: {settings.MATCHUP_BOUNDARY_RANK})",
+        )
+        parser.add_argument(
+            "--movers",
+            type=int,
+            default=10,
+            help="Show this many top-k cards whose rank changed most (default: 10)",
+        )
+        parser.add_argument(
+            "--history",
+            type=int,
+            metavar="N",
+            help="Instead, show tau and overlap between each of the last N "
+                 "snapshots and the one before",
+        )
+        parser.add_argument("--list", action="store_true", help="List snapshots and exit")
+
+    def handle(self, *args, **options):
+        snapshots = RatingSnapshot.objects.defer(*BLOBS)
+        if options["list"]:
+            for s in snapshots.order_by("taken_at"):
+                self.stdout.write(f"{s.pk:>6}  {s}")
+            return
+
+        k = options["k"]
+        if options["history"]:
+            recent = list(snapshots.order_by("-taken_at")[:options["history"] + 1])[::-1]
+            if len(recent) < 2:
+                raise CommandError("Need at least two snapshots.")
+            self.stdout.write(
+                f"\n{'Taken at':<18}{'Cards':>9}{'Tau':>8}"
+                f"{f'Top {k} tau':>14}{f'Top {k} overlap':>18}"
+            )
+            self.stdout.write("-" * 67)
+            for old, new in zip(recent, recent[1:]):
+                c = compare(old, new, k, movers=0)
+                self.stdout.write(
+                    f"{new.taken_at:%Y-%m-%d %H:%M}  {new.count:>9}{c.tau:>8.3f}"
+                    f"{c.top_tau:>14.3f}{c.overlap:>18.1%}"
+                )
+            return
+
+        if options["new"]:
+            new = self._get(snapshots, options["new"])
+        else:
+            new = snapshots.order_by("-taken_at").first()
+        if new is None:
+            raise CommandError("No snapshots yet. Run snapshot_ratings first.")
+        if options["old"]:
+            old = self._get(snapshots, options["old"])
+        else:
+            before = snapshots.filter(taken_at__lt=new.taken_at)
+            if options["hours"] is not None:
+                before = before.filter(
+                    taken_at__lte=new.taken_at - timedelta(hours=options["hours"])
+                )
+            old = before.order_by("-taken_at").first()
+            if old is None:
+                raise CommandError("No earlier snapshot to compare with.")
+
+        c = compare(old, new, k, options["movers"])
+        self.stdout.write(f"\nFrom {old} to {new}")
+        self.stdout.write(f"{c.common} cards in both, {c.added} new, {c.removed} gone")
+        for label, value in (
+            ("Kendall's tau", f"{c.tau:.3f}"),
+            (f"Top {k} tau", f"{c.top_tau:.3f}"),
+            (f"Top {k} overlap", f"{c.overlap:.1%}"),
+        ):
+            self.stdout.write(f"{label + ':':<20}{value:>8}")
+        if c.movers:
+            self.stdout.write(f"\n{'Rank':>6}{'Was':>8}{'Change':>8}  Card")
+            self.stdout.write("-" * 50)
+            for name, was, rank in c.movers:
+                self.stdout.write(f"{rank:>6}{was:>8}{was - rank:>+8}  {name}")
+
+    def _get(self, snapshots, pk):
+        try:
+            return snapshots.get(pk=pk)
+        except RatingSnapshot.DoesNotExist:
+            raise CommandError(f"No snapshot {pk}.")
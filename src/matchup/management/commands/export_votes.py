@@ -0,0 +1,44 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from matchup.export import FORMATS, export_votes
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream votes, including archived ones, to a gzipped CSV or JSON lines "
+        "file or to fixed-width binary records for offline analysis."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("output", help="File to write")
+        parser.add_argument(
+            "--format",
+            choices=FORMATS,
+            default="csv",
+            help="csv and jsonl are gzipped; bin writes a names sidecar too (default: csv)",
+        )
+        parser.add_argument(
+            "--since",
+            type=int,
+            default=0,
+            metavar="VOTE_ID",
+            help="Only export votes after this id, as printed by the previous export",
+        )
+        parser.add_argument(
+            "--names",
+            help="Card names sidecar for --format bin; an existing file is extended "
+                 "so card ids stay stable (default: OUTPUT.names.json)",
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        count, last_id = export_votes(
+            options["output"], options["format"], options["since"], options["names"]
+        )
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Exported {count} votes to {options['output']} in {elapsed:.1f}s."
+        ))
+        self.stdout.write(f"Next time, export new votes with --since {last_id}")
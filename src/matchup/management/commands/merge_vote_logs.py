@@ -0,0 +1,47 @@
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from matchup.votelog import log_path, merge
+
+
+class Command(BaseCommand):
+    help = (
+        "Apply votes from other nodes' vote logs to this database: merged by "
+        "time, deduplicated by matchup token, and rated in batches."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "logs",
+            nargs="*",
+            help="Log files, or directories of *.jsonl logs "
+                 "(default: every log in VOTE_LOG_DIR except this node's)",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Votes per transaction (default: 1000)",
+        )
+
+    def handle(self, *args, **options):
+        paths = []
+        for arg in options["logs"] or [settings.VOTE_LOG_DIR]:
+            path = Path(arg)
+            if path.is_dir():
+                paths.extend(p for p in sorted(path.glob("*.jsonl")) if p != log_path())
+            elif path.is_file():
+                paths.append(path)
+            else:
+                raise CommandError(f"No such log: {path}")
+        if not paths:
+            self.stdout.write("No vote logs to merge.")
+            return
+
+        applied, skipped = merge(paths, options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(
+            f"Merged {len(paths)} logs: applied {applied} votes, "
+            f"skipped {skipped} already recorded."
+        ))
@@ -1,78 +1,56 @@
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 
-from matchup.elo import update_ratings
-from matchup.models import Card, CardRating, Vote
+from matchup.models import CardRating, RatingVersion
+from matchup.rating_engines import ENGINES, get_engine
+from matchup.replay import replay_votes
+from matchup.shadow import swap_table
 
 
 class Command(BaseCommand):
-    help = "Recalculate all Elo ratings by replaying votes in chronological order."
+    help = (
+        "Recalculate all ratings by replaying votes in the order they were "
+        "recorded, then atomically swap the new ratings in."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--engine",
+            choices=sorted(ENGINES),
+            default=None,
+            help="Rating engine to replay with (default: settings.RATING_ENGINE)",
+        )
 
     def handle(self, *args, **options):
-        votes = Vote.objects.order_by("created_at")
-        vote_count = votes.count()
-        if vote_count == 0:
+        try:
+            engine = get_engine(options["engine"])
+        except ValueError as e:
+            raise CommandError(e)
+
+        result = replay_votes(engine)
+        if result.votes == 0:
             self.stdout.write("No votes to replay.")
             return
-
-        # Collect all UUIDs and resolve to names in one query
-        all_uuids = set()
-        for v in votes.iterator():
-            all_uuids.add(v.card_1_uuid)
-            all_uuids.add(v.card_2_uuid)
-
-        uuid_to_name = dict(
-            Card.objects.using("mtgjson")
-            .filter(uuid__in=list(all_uuids))
-            .values_list("uuid", "name")
+        replayed = result.votes
+
+        # Votes cast while we were replaying (or writing the shadow table)
+        # are applied under the write lock, just before the swap. That is
+        # also the swap's transaction, so bump the rating version there.
+        def catch_up():
+            touched = set()
+            replay_votes(engine, result, touched)
+            RatingVersion.bump()
+            return [result.row(i) for i in touched]
+
+        written = swap_table(
+            CardRating,
+            result.rows(),
+            key=("name",),
+            catch_up=catch_up,
         )
 
-        # Wipe existing ratings
-        deleted_count, _ = CardRating.objects.all().delete()
-        self.stdout.write(f"Cleared {deleted_count} existing ratings.")
-
-        # Replay all votes
-        ratings: dict[str, float] = {}
-        wins: dict[str, int] = {}
-        losses: dict[str, int] = {}
-
-        for v in votes.iterator():
-            name_1 = uuid_to_name.get(v.card_1_uuid)
-            name_2 = uuid_to_name.get(v.card_2_uuid)
-            if not name_1 or not name_2:
-                continue
-
-            r1 = ratings.get(name_1, 1500.0)
-            r2 = ratings.get(name_2, 1500.0)
-            a_won = v.chosen_uuid == v.card_1_uuid
-
-            new_r1, new_r2 = update_ratings(r1, r2, a_won)
-            ratings[name_1] = new_r1
-            ratings[name_2] = new_r2
-
-            wins.setdefault(name_1, 0)
-            wins.setdefault(name_2, 0)
-            losses.setdefault(name_1, 0)
-            losses.setdefault(name_2, 0)
-
-            if a_won:
-                wins[name_1] += 1
-                losses[name_2] += 1
-            else:
-                wins[name_2] += 1
-                losses[name_1] += 1
-
-        # Bulk create all ratings
-        CardRating.objects.bulk_create([
-            CardRating(
-                name=name,
-                rating=ratings[name],
-                wins=wins.get(name, 0),
-                losses=losses.get(name, 0),
-            )
-            for name in ratings
-        ])
-
         self.stdout.write(
-            f"Replayed {vote_count} votes. "
-            f"{len(ratings)} cards rated."
+            f"Replayed {result.votes} votes with {engine.name} "
+            f"({result.votes - replayed} cast during the rebuild). "
+            f"{len(result.rated())} cards rated; swapped in {written} "
+            f"ratings plus late updates."
         )
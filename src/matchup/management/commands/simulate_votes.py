@@ -0,0 +1,99 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+
+from matchup.rating_engines import ENGINES
+from matchup.simulation import STRATEGIES, SimulationConfig, run
+
+
+class Command(BaseCommand):
+    help = (
+        "Simulate voters with hidden card fame and report how many votes each "
+        "rating engine and selection strategy needs before the top N stabilizes."
+    )
+
+    def add_arguments(self, parser):
+        defaults = SimulationConfig()
+        parser.add_argument("--seeds", type=int, default=8,
+                            help="Number of independent runs (default: 8)")
+        parser.add_argument("--workers", type=int, default=None,
+                            help="Worker processes (default: one per CPU)")
+        parser.add_argument("--cards", type=int, default=defaults.num_cards,
+                            help=f"Synthetic card pool size (default: {defaults.num_cards})")
+        parser.add_argument("--top", type=int, default=defaults.top_k,
+                            help=f"Size of the ranking that matters (default: {defaults.top_k})")
+        parser.add_argument("--max-votes", type=int, default=defaults.max_votes,
+                            help=f"Give up after this many votes (default: {defaults.max_votes})")
+        parser.add_argument("--check-every", type=int, default=defaults.check_every,
+                            help=f"Votes between evaluations (default: {defaults.check_every})")
+        parser.add_argument("--target-tau", type=float, default=defaults.target_tau,
+                            help=f"Kendall tau target over the true top N (default: {defaults.target_tau})")
+        parser.add_argument("--target-precision", type=float, default=defaults.target_precision,
+                            help=f"Top-N precision target (default: {defaults.target_precision})")
+        parser.add_argument("--noise", type=float, default=defaults.noise,
+                            help=f"Voter noise, in fame standard deviations (default: {defaults.noise})")
+        parser.add_argument("--engine", choices=sorted(ENGINES), default=defaults.engine,
+                            help=f"Rating engine (default: {defaults.engine})")
+        parser.add_argument("--strategy", choices=STRATEGIES, default=defaults.strategy,
+                            help=f"Matchup selection strategy (default: {defaults.strategy})")
+        parser.add_argument("--exploration", type=float, default=defaults.exploration,
+                            help=f"Uniform share of active selection (default: {defaults.exploration})")
+        parser.add_argument("--delta", type=float, default=defaults.rating_delta,
+                            help=f"Active selection rating window (default: {defaults.rating_delta})")
+        parser.add_argument("--sample-exponent", type=float, default=defaults.sample_exponent,
+                            help="Weight uniform draws by printings to this power: 0 samples names, "
+                                 f"1 samples printings (default: {defaults.sample_exponent})")
+
+    def handle(self, *args, **options):
+        config = SimulationConfig(
+            num_cards=options["cards"],
+            top_k=options["top"],
+            max_votes=options["max_votes"],
+            check_every=options["check_every"],
+            target_tau=options["target_tau"],
+            target_precision=options["target_precision"],
+            noise=options["noise"],
+            engine=options["engine"],
+            strategy=options["strategy"],
+            exploration=options["exploration"],
+            rating_delta=options["delta"],
+            sample_exponent=options["sample_exponent"],
+        )
+
+        started = time.perf_counter()
+        results = run(list(range(options["seeds"])), config, workers=options["workers"])
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(
+            f"\n{config.strategy} selection, {config.engine} engine, "
+            f"{config.num_cards} cards, top {config.top_k}\n"
+        )
+        self.stdout.write(
+            f"{'Seed':<6}{'Votes':>10}{'To tau':>10}{'To prec.':>10}{'Tau':>8}{'Prec.':>8}"
+        )
+        self.stdout.write("-" * 52)
+        for r in results:
+            self.stdout.write(
+                f"{r.seed:<6}{r.votes:>10}{_fmt(r.votes_to_tau):>10}"
+                f"{_fmt(r.votes_to_precision):>10}{r.final_tau:>8.3f}{r.final_precision:>8.3f}"
+            )
+
+        self.stdout.write("")
+        for label, values in [
+            (f"tau >= {config.target_tau}", [r.votes_to_tau for r in results]),
+            (f"precision >= {config.target_precision}", [r.votes_to_precision for r in results]),
+        ]:
+            reached = [v for v in values if v is not None]
+            if reached:
+                self.stdout.write(
+                    f"Votes to {label}: median {statistics.median(reached):.0f} "
+                    f"({len(reached)}/{len(values)} runs reached it)"
+                )
+            else:
+                self.stdout.write(f"Votes to {label}: not reached in {config.max_votes} votes")
+        self.stdout.write(f"Finished in {elapsed:.1f}s")
+
+
+def _fmt(votes):
+    return "-" if votes is None else str(votes)
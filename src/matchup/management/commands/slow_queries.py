@@ -0,0 +1,73 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from matchup.slow_queries import read_log
+
+
+class Command(BaseCommand):
+    help = "Summarize the slow query log, worst offenders by total time first."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--log",
+            default=None,
+            help="Path to the slow query log (default: settings.SLOW_QUERY_LOG)",
+        )
+        parser.add_argument(
+            "-n",
+            type=int,
+            default=10,
+            help="Number of statements to display (default: 10)",
+        )
+        parser.add_argument(
+            "--plans",
+            action="store_true",
+            help="Show the most recent EXPLAIN QUERY PLAN for each statement",
+        )
+
+    def handle(self, *args, **options):
+        path = options["log"] or settings.SLOW_QUERY_LOG
+        try:
+            records = read_log(path)
+        except FileNotFoundError:
+            raise CommandError(f"No slow query log at {path}")
+
+        if not records:
+            self.stdout.write("No slow queries logged.")
+            return
+
+        # Group by (alias, normalized SQL)
+        groups: dict[tuple[str, str], dict] = {}
+        for r in records:
+            g = groups.setdefault((r["alias"], r["sql"]), {
+                "count": 0,
+                "total_ms": 0.0,
+                "max_ms": 0.0,
+                "plan": [],
+            })
+            g["count"] += 1
+            g["total_ms"] += r["ms"]
+            g["max_ms"] = max(g["max_ms"], r["ms"])
+            if r.get("plan"):
+                g["plan"] = r["plan"]
+
+        worst = sorted(groups.items(), key=lambda item: item[1]["total_ms"], reverse=True)
+        top_n = options["n"]
+
+        self.stdout.write(
+            f"\n{len(records)} slow queries, {len(groups)} distinct statements\n"
+        )
+        self.stdout.write(
+            f"{'Total ms':>10}{'Count':>7}{'Mean ms':>10}{'Max ms':>10}  {'DB':<9}Statement"
+        )
+        self.stdout.write("-" * 78)
+
+        for (alias, sql), g in worst[:top_n]:
+            mean_ms = g["total_ms"] / g["count"]
+            self.stdout.write(
+                f"{g['total_ms']:>10.1f}{g['count']:>7}{mean_ms:>10.1f}{g['max_ms']:>10.1f}  "
+                f"{alias:<9}{sql}"
+            )
+            if options["plans"] and g["plan"]:
+                for line in g["plan"]:
+                    self.stdout.write(f"{'':>39}{line}")
@@ -0,0 +1,52 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from matchup.snapshots import prune, take
+
+
+class Command(BaseCommand):
+    help = (
+        "Store the full ranking as a compressed snapshot, unless ratings haven't "
+        "changed since the last one, and thin out old snapshots."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Take a snapshot even if ratings haven't changed",
+        )
+        parser.add_argument(
+            "--hourly-days",
+            type=int,
+            default=settings.RATING_SNAPSHOT_HOURLY_DAYS,
+            help="Keep every snapshot for this many whole days, then one a day "
+                 f"(default: {settings.RATING_SNAPSHOT_HOURLY_DAYS})",
+        )
+        parser.add_argument(
+            "--retention-days",
+            type=int,
+            default=settings.RATING_SNAPSHOT_RETENTION_DAYS,
+            help="Delete snapshots older than this many days "
+                 f"(default: {settings.RATING_SNAPSHOT_RETENTION_DAYS})",
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        snapshot = take(options["force"])
+        elapsed = time.perf_counter() - started
+        deleted = prune(timezone.now(), options["hourly_days"], options["retention_days"])
+
+        if snapshot is None:
+            self.stdout.write("Ratings unchanged since the last snapshot; skipped.")
+        else:
+            size = len(snapshot.names) + len(snapshot.ratings)
+            self.stdout.write(self.style.SUCCESS(
+                f"Snapshot {snapshot.pk}: {snapshot.count} cards at v{snapshot.version}, "
+                f"{size / 1024:.0f} KiB in {elapsed:.1f}s."
+            ))
+        if deleted:
+            self.stdout.write(f"Pruned {deleted} old snapshots.")
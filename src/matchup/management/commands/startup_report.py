@@ -0,0 +1,72 @@
+import json
+import statistics
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Runs in a fresh interpreter, so imports are as cold as on a new machine.
+CHILD = """
+import time
+start = time.perf_counter()
+
+import json, os, sys
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "fivehundredmagic.settings")
+from django.core.wsgi import get_wsgi_application
+application = get_wsgi_application()
+imported = time.perf_counter() - start
+
+from django.conf import settings
+if sys.argv[1] != "default":
+    settings.CARD_POOL = sys.argv[1] == "on"
+from matchup.warmup import warm_up
+print(json.dumps({"import": imported, **warm_up()}))
+"""
+
+
+class Command(BaseCommand):
+    help = (
+        "Time a cold start in fresh interpreters: Python and Django imports, "
+        "opening the databases, loading the card pool and the first matchup."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--runs",
+            type=int,
+            default=3,
+            help="Number of cold starts to time; the median is shown (default: 3)",
+        )
+        parser.add_argument(
+            "--card-pool",
+            choices=["on", "off", "default"],
+            default="default",
+            help="Override settings.CARD_POOL in the child processes",
+        )
+
+    def handle(self, *args, **options):
+        runs = []
+        for _ in range(options["runs"]):
+            start = time.perf_counter()
+            proc = subprocess.run(
+                [sys.executable, "-c", CHILD, options["card_pool"]],
+                cwd=settings.BASE_DIR,
+                capture_output=True,
+                text=True,
+            )
+            total = time.perf_counter() - start
+            if proc.returncode != 0:
+                raise CommandError(f"Startup failed:\n{proc.stderr}")
+            phases = json.loads(proc.stdout.strip().splitlines()[-1])
+            # Process spawn and interpreter startup, before our first line ran
+            runs.append({"interpreter": total - sum(phases.values()), **phases, "total": total})
+
+        self.stdout.write(f"\nCold start, median of {len(runs)} runs")
+        self.stdout.write("=" * 40)
+        for phase in runs[0]:
+            ms = 1000 * statistics.median(run[phase] for run in runs)
+            if phase == "total":
+                self.stdout.write("-" * 40)
+            self.stdout.write(f"{phase:<20}{ms:>10.1f} ms")
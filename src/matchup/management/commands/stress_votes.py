@@ -0,0 +1,98 @@
+import tempfile
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+
+from matchup import stress
+
+
+class Command(BaseCommand):
+    help = (
+        "Stress the vote write path with concurrent processes against a "
+        "file-backed SQLite database and report contention and lost updates."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--processes",
+            type=int,
+            default=4,
+            help="Number of concurrent voting processes (default: 4)",
+        )
+        parser.add_argument(
+            "--votes",
+            type=int,
+            default=250,
+            help="Votes cast by each process (default: 250)",
+        )
+        parser.add_argument(
+            "--cards",
+            type=int,
+            default=50,
+            help="Size of the synthetic card pool; fewer cards means more "
+                 "contention on the same CardRating rows (default: 50)",
+        )
+        parser.add_argument(
+            "--timeout",
+            type=float,
+            default=5.0,
+            help="SQLite busy timeout in seconds (default: 5)",
+        )
+        parser.add_argument(
+            "--dir",
+            default=None,
+            help="Keep the stress databases in this directory instead of a "
+                 "temporary one",
+        )
+
+    def handle(self, *args, **options):
+        if options["dir"]:
+            workdir = Path(options["dir"])
+            workdir.mkdir(parents=True, exist_ok=True)
+            report = self._run(workdir, options)
+        else:
+            with tempfile.TemporaryDirectory() as tmp:
+                report = self._run(Path(tmp), options)
+
+        self.stdout.write("\nVote Path Stress Test")
+        self.stdout.write("=" * 40)
+        self.stdout.write(f"Processes:        {report.processes}")
+        self.stdout.write(f"Votes attempted:  {report.attempted}")
+        self.stdout.write(f"Votes accepted:   {report.votes}")
+        self.stdout.write(f"Busy errors:      {report.busy_errors}")
+        self.stdout.write(f"Other errors:     {report.other_errors}")
+        self.stdout.write(f"Elapsed:          {report.elapsed:.2f}s")
+        self.stdout.write(f"Throughput:       {report.throughput:.1f} votes/s")
+        self.stdout.write(
+            f"Latency (ms):     p50 {report.percentile(50):.1f}  "
+            f"p95 {report.percentile(95):.1f}  p99 {report.percentile(99):.1f}"
+        )
+
+        self.stdout.write("\nVote latency, including lock waits")
+        total = len(report.latencies_ms) or 1
+        for label, count in report.histogram():
+            if count:
+                bar = "#" * max(1, round(count / total * 40))
+                self.stdout.write(f"{label:>12}: {count:>6} {bar}")
+
+        self.stdout.write("\nConsistency")
+        self.stdout.write(f"Vote rows:        {report.vote_rows}")
+        self.stdout.write(f"Lost wins:        {report.lost_wins}")
+        self.stdout.write(f"Lost losses:      {report.lost_losses}")
+        self.stdout.write(f"Cards affected:   {report.mismatched_cards}")
+
+        if report.lost_wins or report.lost_losses:
+            self.stdout.write(self.style.WARNING(
+                "CardRating lost updates under concurrent writes."
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS("No lost updates."))
+
+    def _run(self, workdir, options):
+        return stress.run(
+            workdir,
+            processes=options["processes"],
+            votes_per_process=options["votes"],
+            num_cards=options["cards"],
+            timeout=options["timeout"],
+        )
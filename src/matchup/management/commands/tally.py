@@ -1,10 +1,12 @@
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 
-from matchup.models import CardRating
+from matchup.models import CanonicalPrinting, CardRating
+from matchup.rating_engines import ENGINES, get_engine
+from matchup.replay import replay_votes
 
 
 class Command(BaseCommand):
-    help = "Display card rankings by Elo rating."
+    help = "Display card rankings by rating."
 
     def add_arguments(self, parser):
         parser.add_argument(
@@ -13,21 +15,62 @@ class Command(BaseCommand):
             default=500,
             help="Number of top cards to display (default: 500)",
         )
+        parser.add_argument(
+            "--engine",
+            choices=sorted(ENGINES),
+            default=None,
+            help="Replay all votes with this rating engine and show the "
+                 "resulting ranking, without saving it",
+        )
+        parser.add_argument(
+            "--images",
+            action="store_true",
+            help="Show each card's image URL, from its canonical printing",
+        )
 
     def handle(self, *args, **options):
-        total = CardRating.objects.count()
+        top_n = options["n"]
+
+        if options["engine"]:
+            try:
+                engine = get_engine(options["engine"])
+            except ValueError as e:
+                raise CommandError(e)
+            result = replay_votes(engine)
+            rows = sorted(
+                (
+                    (row["name"], row["rating"], row["wins"], row["losses"])
+                    for row in result.rows()
+                ),
+                key=lambda row: row[1],
+                reverse=True,
+            )
+            total = len(rows)
+            ratings = rows[:top_n]
+            source = f" (replayed with {engine.name})"
+        else:
+            total = CardRating.objects.count()
+            ratings = CardRating.objects.order_by("-rating").values_list(
+                "name", "rating", "wins", "losses"
+            )[:top_n]
+            source = ""
+
         if total == 0:
             self.stdout.write("No ratings yet. Vote on some matchups first!")
             return
 
-        top_n = options["n"]
-        ratings = CardRating.objects.order_by("-rating")[:top_n]
+        ratings = list(ratings)
+        printings = {}
+        if options["images"]:
+            printings = CanonicalPrinting.objects.in_bulk([name for name, *_ in ratings])
 
-        self.stdout.write(f"\nTop {min(top_n, total)} of {total} rated cards\n")
+        self.stdout.write(f"\nTop {min(top_n, total)} of {total} rated cards{source}\n")
         self.stdout.write(f"{'Rank':<6}{'Card':<40}{'Rating':>8}{'Wins':>6}{'Losses':>8}")
         self.stdout.write("-" * 68)
 
-        for i, cr in enumerate(ratings, 1):
+        for i, (name, rating, wins, losses) in enumerate(ratings, 1):
             self.stdout.write(
-                f"{i:<6}{cr.name:<40}{cr.rating:>8.1f}{cr.wins:>6}{cr.losses:>8}"
+                f"{i:<6}{name:<40}{rating:>8.1f}{wins:>6}{losses:>8}"
             )
+            if name in printings:
+                self.stdout.write(f"{'':<6}{printings[name].image_url()}")
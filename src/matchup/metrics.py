@@ -0,0 +1,79 @@
+"""Ranking agreement metrics."""
+
+from collections.abc import Hashable, Sequence
+
+
+def _count_inversions(values: list[float]) -> int:
+    """Count pairs i < j with values[i] > values[j], by merge sort."""
+    inversions = 0
+    width = 1
+    n = len(values)
+    values = list(values)
+    while width < n:
+        merged = []
+        for lo in range(0, n, 2 * width):
+            mid = min(lo + width, n)
+            hi = min(lo + 2 * width, n)
+            i, j = lo, mid
+            while i < mid and j < hi:
+                if values[j] < values[i]:
+                    merged.append(values[j])
+                    inversions += mid - i
+                    j += 1
+                else:
+                    merged.append(values[i])
+                    i += 1
+            merged.extend(values[i:mid])
+            merged.extend(values[j:hi])
+        values = merged
+        width *= 2
+    return inversions
+
+
+def kendall_tau(x: Sequence[float], y: Sequence[float]) -> float:
+    """Kendall's tau-a between two paired score sequences, in O(n log n).
+
+    1.0 means both order every pair the same way, -1.0 means every pair is
+    reversed. Tied pairs count as neither concordant nor discordant.
+    """
+    n = len(x)
+    if n != len(y):
+        raise ValueError("x and y must be the same length")
+    if n < 2:
+        return 1.0
+    total = n * (n - 1) // 2
+
+    # Pairs tied in x: count them, then break the ties by y so they don't
+    # register as inversions below.
+    pairs = sorted(zip(x, y))
+    ties_x = _count_ties([p[0] for p in pairs])
+    discordant = _count_inversions([p[1] for p in pairs])
+
+    # Pairs tied in y (but not x) are neither concordant nor discordant.
+    ties_y = _count_ties(sorted(y)) - _count_ties(pairs)
+    concordant = total - ties_x - ties_y - discordant
+    return (concordant - discordant) / total
+
+
+def _count_ties(values: Sequence) -> int:
+    """Count equal pairs in a sorted sequence."""
+    ties = 0
+    run = 1
+    for prev, cur in zip(values, values[1:]):
+        if cur == prev:
+            run += 1
+        else:
+            ties += run * (run - 1) // 2
+            run = 1
+    return ties + run * (run - 1) // 2
+
+
+def top_k_overlap(a: Sequence[Hashable], b: Sequence[Hashable], k: int) -> float:
+    """Fraction of the first `k` items of ranking `a` that are in the first `k` of `b`.
+
+    With `a` as the true ranking, this is precision at k.
+    """
+    top_a = set(a[:k])
+    if not top_a:
+        return 1.0
+    return len(top_a & set(b[:k])) / len(top_a)
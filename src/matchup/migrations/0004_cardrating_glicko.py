@@ -0,0 +1,23 @@
+# Generated by Django 6.1.2 on 2026-10-19 06:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('matchup', '0003_cardrating'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cardrating',
+            name='deviation',
+            field=models.FloatField(default=350.0),
+        ),
+        migrations.AddField(
+            model_name='cardrating',
+            name='volatility',
+            field=models.FloatField(default=0.06),
+        ),
+    ]
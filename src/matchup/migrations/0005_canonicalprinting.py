@@ -0,0 +1,37 @@
+# Generated by Django 6.1.2 on 2026-10-19 06:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('matchup', '0004_cardrating_glicko'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CardSet',
+            fields=[
+                ('code', models.TextField(primary_key=True, serialize=False)),
+                ('name', models.TextField()),
+                ('releaseDate', models.TextField(db_column='releaseDate', null=True)),
+                ('type', models.TextField(null=True)),
+            ],
+            options={
+                'db_table': 'sets',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='CanonicalPrinting',
+            fields=[
+                ('name', models.TextField(primary_key=True, serialize=False)),
+                ('uuid', models.TextField()),
+                ('scryfall_id', models.TextField()),
+            ],
+            options={
+                'db_table': 'matchup_canonicalprinting',
+            },
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 6.1.2 on 2026-10-19 06:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('matchup', '0005_canonicalprinting'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RatingVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.BigIntegerField(default=0)),
+                ('updated', models.DateTimeField(null=True)),
+            ],
+            options={
+                'db_table': 'matchup_ratingversion',
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 6.1.2 on 2026-10-19 06:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('matchup', '0006_ratingversion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PairStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name_a', models.TextField()),
+                ('name_b', models.TextField()),
+                ('wins_a', models.IntegerField(default=0)),
+                ('wins_b', models.IntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'matchup_pairstat',
+                'constraints': [models.UniqueConstraint(fields=('name_a', 'name_b'), name='pairstat_unique_pair')],
+            },
+        ),
+    ]
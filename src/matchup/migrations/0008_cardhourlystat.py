@@ -0,0 +1,28 @@
+# Generated by Django 6.1.2 on 2026-10-19 06:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('matchup', '0007_pairstat'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CardHourlyStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.TextField()),
+                ('hour', models.DateTimeField()),
+                ('hours', models.SmallIntegerField(default=1)),
+                ('wins', models.IntegerField(default=0)),
+                ('appearances', models.IntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'matchup_cardhourlystat',
+                'constraints': [models.UniqueConstraint(fields=('hour', 'name'), name='cardhourlystat_unique_bucket')],
+            },
+        ),
+    ]
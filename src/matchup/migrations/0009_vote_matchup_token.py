@@ -0,0 +1,18 @@
+# Generated by Django 6.1.2 on 2026-10-19 07:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('matchup', '0008_cardhourlystat'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='vote',
+            name='matchup_token',
+            field=models.UUIDField(blank=True, null=True, unique=True),
+        ),
+    ]
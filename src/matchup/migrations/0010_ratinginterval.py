@@ -0,0 +1,28 @@
+# Generated by Django 6.1.2 on 2026-10-19 07:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('matchup', '0009_vote_matchup_token'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RatingInterval',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.TextField(unique=True)),
+                ('strength', models.FloatField()),
+                ('rank', models.IntegerField()),
+                ('rank_low', models.IntegerField()),
+                ('rank_high', models.IntegerField()),
+                ('confidence', models.FloatField()),
+            ],
+            options={
+                'db_table': 'matchup_ratinginterval',
+            },
+        ),
+    ]
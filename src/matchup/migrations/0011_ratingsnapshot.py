@@ -0,0 +1,28 @@
+# Generated by Django 6.1.2 on 2026-10-19 07:20
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('matchup', '0010_ratinginterval'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RatingSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('taken_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('version', models.BigIntegerField()),
+                ('count', models.IntegerField()),
+                ('names', models.BinaryField()),
+                ('ratings', models.BinaryField()),
+            ],
+            options={
+                'db_table': 'matchup_ratingsnapshot',
+            },
+        ),
+    ]
@@ -1,6 +1,40 @@
 import uuid
 
-from django.db import models
+from django.conf import settings
+from django.db import connection, models
+from django.urls import reverse
+from django.utils import timezone
+
+from .rating_engines import RatingState
+
+
+def scryfall_image_url(scryfall_id: str | None) -> str | None:
+    """Scryfall CDN URL of a card's normal-size front image."""
+    if not scryfall_id:
+        return None
+    sid = scryfall_id
+    return f"https://cards.scryfall.io/normal/front/{sid[0]}/{sid[1]}/{sid}.jpg"
+
+
+def card_image_url(scryfall_id: str | None) -> str | None:
+    """URL to show a card's image at: our own image cache if
+    `settings.CARD_IMAGE_PROXY` is on, otherwise Scryfall's CDN."""
+    if scryfall_id and settings.CARD_IMAGE_PROXY:
+        return reverse('card_image', args=[scryfall_id])
+    return scryfall_image_url(scryfall_id)
+
+
+class CardQuerySet(models.QuerySet):
+    def eligible(self):
+        """"Real" paper cards in English or Phyrexian."""
+        return (
+            self.exclude(isFunny=True)
+            .exclude(isOnlineOnly=True)
+            .exclude(isOversized=True)
+            .exclude(side='b')
+            .filter(availability__contains='paper')
+            .filter(language__in=['English', 'Phyrexian'])
+        )
 
 
 class Card(models.Model):
@@ -18,6 +52,13 @@ class Card(models.Model):
     side = models.TextField(null=True)
     language = models.TextField(null=True)
     supertypes = models.TextField(null=True)
+    frameVersion = models.TextField(db_column='frameVersion', null=True)
+    isPromo = models.BooleanField(db_column='isPromo', null=True)
+    frameEffects = models.TextField(db_column='frameEffects', null=True)
+    borderColor = models.TextField(db_column='borderColor', null=True)
+    isFullArt = models.BooleanField(db_column='isFullArt', null=True)
+
+    objects = CardQuerySet.as_manager()
 
     class Meta:
         managed = False
@@ -38,15 +79,74 @@ class CardIdentifiers(models.Model):
         db_table = 'cardIdentifiers'
 
     def scryfall_image_url(self):
-        if not self.scryfallId:
-            return None
-        sid = self.scryfallId
-        return f"https://cards.scryfall.io/normal/front/{sid[0]}/{sid[1]}/{sid}.jpg"
+        return scryfall_image_url(self.scryfallId)
     
     def __str__(self):
         return self.uuid
 
 
+class RatingVersion(models.Model):
+    """Single-row counter bumped whenever ratings change.
+
+    The leaderboard and ranking export derive their ETag and Last-Modified
+    headers from it, so unchanged rankings cost one primary-key lookup.
+    """
+
+    version = models.BigIntegerField(default=0)
+    updated = models.DateTimeField(null=True)
+
+    class Meta:
+        db_table = 'matchup_ratingversion'
+
+    def __str__(self):
+        return f"v{self.version}"
+
+    @classmethod
+    def current(cls) -> 'RatingVersion':
+        return cls.objects.filter(pk=1).first() or cls(pk=1)
+
+    @classmethod
+    def bump(cls) -> None:
+        """Record a ratings change. Call inside the writing transaction."""
+        now = timezone.now()
+        if not cls.objects.filter(pk=1).update(version=models.F('version') + 1, updated=now):
+            cls.objects.create(pk=1, version=1, updated=now)
+
+
+class CardSet(models.Model):
+    """Unmanaged model for the mtgjson `sets` table."""
+
+    code = models.TextField(primary_key=True)
+    name = models.TextField()
+    releaseDate = models.TextField(db_column='releaseDate', null=True)
+    type = models.TextField(null=True)
+
+    class Meta:
+        managed = False
+        db_table = 'sets'
+
+    def __str__(self):
+        return f"{self.name} ({self.code})"
+
+
+class CanonicalPrinting(models.Model):
+    """The preferred printing of each card name, used wherever we show one
+    image per card. Built from mtgjson by `build_canonical_printings`."""
+
+    name = models.TextField(primary_key=True)
+    uuid = models.TextField()
+    scryfall_id = models.TextField()
+
+    class Meta:
+        db_table = 'matchup_canonicalprinting'
+
+    def __str__(self):
+        return f"{self.name} ({self.uuid[:8]})"
+
+    def image_url(self):
+        return card_image_url(self.scryfall_id)
+
+
 class Matchup(models.Model):
     """A generated matchup that can be voted on exactly once."""
 
@@ -71,6 +171,8 @@ class Vote(models.Model):
     chosen_uuid = models.TextField()
     ip_address = models.GenericIPAddressField()
     created_at = models.DateTimeField(auto_now_add=True)
+    # The Matchup voted on; merging node vote logs dedupes on it.
+    matchup_token = models.UUIDField(null=True, blank=True, unique=True)
 
     class Meta:
         db_table = 'matchup_vote'
@@ -84,10 +186,15 @@ class Vote(models.Model):
 
 
 class CardRating(models.Model):
-    """Elo rating for a card, keyed by card name (across all printings)."""
+    """Rating for a card, keyed by card name (across all printings).
+
+    `deviation` and `volatility` are only used by the Glicko-2 engine.
+    """
 
     name = models.TextField(unique=True)
     rating = models.FloatField(default=1500.0)
+    deviation = models.FloatField(default=350.0)
+    volatility = models.FloatField(default=0.06)
     wins = models.IntegerField(default=0)
     losses = models.IntegerField(default=0)
 
@@ -96,3 +203,138 @@ class CardRating(models.Model):
 
     def __str__(self):
         return f"{self.name} ({self.rating:.0f})"
+
+    @property
+    def state(self) -> RatingState:
+        return RatingState(self.rating, self.deviation, self.volatility, self.wins + self.losses)
+
+    def set_state(self, state: RatingState) -> None:
+        self.rating = state.rating
+        self.deviation = state.deviation
+        self.volatility = state.volatility
+
+
+class RatingInterval(models.Model):
+    """Bootstrap confidence interval for the rank of a card name.
+
+    Written by `bootstrap_ratings`. `rank` is the name's rank in a
+    Bradley-Terry fit of every `PairStat` record (`strength` is its log
+    strength there), and `rank_low` to `rank_high` holds the middle
+    `confidence` of its ranks across refits of resampled records.
+    """
+
+    name = models.TextField(unique=True)
+    strength = models.FloatField()
+    rank = models.IntegerField()
+    rank_low = models.IntegerField()
+    rank_high = models.IntegerField()
+    confidence = models.FloatField()
+
+    class Meta:
+        db_table = 'matchup_ratinginterval'
+
+    def __str__(self):
+        return f"{self.name} #{self.rank} ({self.rank_low}-{self.rank_high})"
+
+
+class RatingSnapshot(models.Model):
+    """The full ranking at one point in time, written by `snapshot_ratings`.
+
+    `names` holds every rated card name, sorted and newline-separated, and
+    `ratings` their ratings in the same order as float32s, both
+    zlib-compressed. `version` is the `RatingVersion` it was taken at.
+    See `matchup.snapshots`.
+    """
+
+    taken_at = models.DateTimeField(default=timezone.now, db_index=True)
+    version = models.BigIntegerField()
+    count = models.IntegerField()
+    names = models.BinaryField()
+    ratings = models.BinaryField()
+
+    class Meta:
+        db_table = 'matchup_ratingsnapshot'
+
+    def __str__(self):
+        return f"{self.taken_at:%Y-%m-%d %H:%M} v{self.version} ({self.count} cards)"
+
+
+class PairStat(models.Model):
+    """Head-to-head record between two card names, with `name_a < name_b`.
+
+    Maintained by the vote path and rebuilt by `backfill_pair_stats`. Pair
+    models (Bradley-Terry and friends) can read this instead of the vote log.
+    """
+
+    name_a = models.TextField()
+    name_b = models.TextField()
+    wins_a = models.IntegerField(default=0)
+    wins_b = models.IntegerField(default=0)
+
+    class Meta:
+        db_table = 'matchup_pairstat'
+        constraints = [
+            models.UniqueConstraint(fields=['name_a', 'name_b'], name='pairstat_unique_pair'),
+        ]
+
+    def __str__(self):
+        return f"{self.name_a} {self.wins_a}-{self.wins_b} {self.name_b}"
+
+    @classmethod
+    def record(cls, winner: str, loser: str) -> None:
+        """Count a win of `winner` over `loser` with a single upsert."""
+        if winner == loser:
+            return
+        if winner < loser:
+            key, wins = (winner, loser), (1, 0)
+        else:
+            key, wins = (loser, winner), (0, 1)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'INSERT INTO "matchup_pairstat" ("name_a", "name_b", "wins_a", "wins_b") '
+                'VALUES (%s, %s, %s, %s) '
+                'ON CONFLICT ("name_a", "name_b") DO UPDATE SET '
+                '"wins_a" = "wins_a" + excluded."wins_a", '
+                '"wins_b" = "wins_b" + excluded."wins_b"',
+                [*key, *wins],
+            )
+
+
+class CardHourlyStat(models.Model):
+    """Wins and appearances of a card name within one time bucket.
+
+    Buckets start as hours, written by the vote path. `compact_trending`
+    later folds old hourly buckets into day-long ones (`hours=24`) and
+    drops buckets older than the longest trending window needs.
+    """
+
+    name = models.TextField()
+    hour = models.DateTimeField()
+    hours = models.SmallIntegerField(default=1)
+    wins = models.IntegerField(default=0)
+    appearances = models.IntegerField(default=0)
+
+    class Meta:
+        db_table = 'matchup_cardhourlystat'
+        constraints = [
+            models.UniqueConstraint(fields=['hour', 'name'], name='cardhourlystat_unique_bucket'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} @ {self.hour:%Y-%m-%d %H:00} ({self.wins}/{self.appearances})"
+
+    @classmethod
+    def record(cls, winner: str, loser: str, at=None) -> None:
+        """Count one matchup in the buckets for the hour of `at` (default: now)."""
+        hour = connection.ops.adapt_datetimefield_value(
+            (at or timezone.now()).replace(minute=0, second=0, microsecond=0)
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'INSERT INTO "matchup_cardhourlystat" ("name", "hour", "hours", "wins", "appearances") '
+                'VALUES (%s, %s, 1, 1, 1), (%s, %s, 1, 0, 1) '
+                'ON CONFLICT ("hour", "name") DO UPDATE SET '
+                '"wins" = "wins" + excluded."wins", '
+                '"appearances" = "appearances" + excluded."appearances"',
+                [winner, hour, loser, hour],
+            )
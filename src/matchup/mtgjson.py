@@ -0,0 +1,119 @@
+"""Raw sqlite3 access to mtgjson for the hot read paths in `views`.
+
+Going through the ORM for a one-row lookup means cloning querysets,
+compiling SQL and building `Card` instances on every request. The functions
+here run fixed SQL strings on a per-thread, read-only `sqlite3` connection
+(whose statement cache keeps them prepared) and return plain tuples.
+
+Managed tables and anything off the request path keep using the ORM. Under
+tests the mtgjson database is in memory, so we borrow Django's connection
+to see the test's data.
+"""
+
+import os
+import sqlite3
+import threading
+from pathlib import Path
+from typing import NamedTuple
+
+from django.conf import settings
+from django.db import connections
+
+
+class Printing(NamedTuple):
+    uuid: str
+    name: str
+    supertypes: str | None
+
+
+# Mirrors CardQuerySet.eligible.
+_ELIGIBLE = """
+    "isFunny" IS NOT 1
+    AND "isOnlineOnly" IS NOT 1
+    AND "isOversized" IS NOT 1
+    AND "side" IS NOT 'b'
+    AND "availability" LIKE '%paper%'
+    AND "language" IN ('English', 'Phyrexian')
+"""
+
+_RANDOM_PRINTINGS = f"""
+    SELECT "uuid", "name", "supertypes" FROM "cards"
+    WHERE {_ELIGIBLE}
+    ORDER BY RANDOM() LIMIT ?
+"""
+
+_RANDOM_PRINTINGS_OF = f"""
+    SELECT "uuid", "name", "supertypes" FROM "cards"
+    WHERE "name" = ? AND {_ELIGIBLE}
+    ORDER BY RANDOM() LIMIT ?
+"""
+
+_SCRYFALL_ID = """
+    SELECT "scryfallId" FROM "cardIdentifiers"
+    WHERE "uuid" = ? AND "scryfallId" IS NOT NULL AND "scryfallId" != ''
+    LIMIT 1
+"""
+
+_ANY_SCRYFALL_ID = """
+    SELECT i."scryfallId" FROM "cards" c
+    JOIN "cardIdentifiers" i ON i."uuid" = c."uuid"
+    WHERE c."name" = ? AND i."scryfallId" IS NOT NULL AND i."scryfallId" != ''
+    LIMIT 1
+"""
+
+_NAMES_OF_PAIR = 'SELECT "uuid", "name" FROM "cards" WHERE "uuid" IN (?, ?)'
+
+_local = threading.local()
+
+
+def connection() -> sqlite3.Connection:
+    """This thread's read-only connection to the mtgjson database."""
+    db = connections['mtgjson']
+    if db.is_in_memory_db():
+        db.ensure_connection()
+        return db.connection
+
+    # Keyed by pid as well, so a worker forked from the gunicorn master
+    # opens its own connection rather than sharing the master's.
+    pid = os.getpid()
+    if getattr(_local, 'pid', None) != pid:
+        uri = Path(settings.DATABASES['mtgjson']['NAME']).resolve().as_uri() + '?mode=ro'
+        _local.connection = sqlite3.connect(uri, uri=True)
+        _local.pid = pid
+    return _local.connection
+
+
+def close() -> None:
+    """Close this thread's connection, e.g. in the gunicorn master before
+    it forks workers, so none of them inherits the open handle."""
+    conn = getattr(_local, 'connection', None)
+    if conn is not None and getattr(_local, 'pid', None) == os.getpid():
+        conn.close()
+    _local.connection = None
+    _local.pid = None
+
+
+def random_printings(n: int) -> list[Printing]:
+    """Up to `n` random eligible printings."""
+    return list(map(Printing._make, connection().execute(_RANDOM_PRINTINGS, (n,))))
+
+
+def random_printings_of(name: str, n: int) -> list[Printing]:
+    """Up to `n` random eligible printings of the card called `name`."""
+    return list(map(Printing._make, connection().execute(_RANDOM_PRINTINGS_OF, (name, n))))
+
+
+def scryfall_id(uuid: str) -> str | None:
+    row = connection().execute(_SCRYFALL_ID, (uuid,)).fetchone()
+    return row[0] if row else None
+
+
+def any_scryfall_id(name: str) -> str | None:
+    """The scryfall id of some printing of `name`."""
+    row = connection().execute(_ANY_SCRYFALL_ID, (name,)).fetchone()
+    return row[0] if row else None
+
+
+def names_of_pair(uuid_1: str, uuid_2: str) -> dict[str, str]:
+    """Map the two printings' uuids to card names."""
+    return dict(connection().execute(_NAMES_OF_PAIR, (uuid_1, uuid_2)))
@@ -0,0 +1,66 @@
+"""Rebuild the `PairStat` head-to-head table from the vote log.
+
+Votes are streamed with `replay.new_vote_chunks`. Counts are kept in a
+dict keyed by the pair's two name ids packed into one int, with both win
+counts packed into one int value, so each distinct pair costs roughly
+100 bytes while tallying.
+"""
+
+from collections.abc import Iterator
+from dataclasses import dataclass, field
+
+from .replay import NameIndex, new_vote_chunks
+
+_SHIFT = 32
+_LOW = (1 << _SHIFT) - 1
+
+
+@dataclass
+class PairTally(NameIndex):
+    # (id_a << 32 | id_b) -> (wins_a << 32 | wins_b), with names[id_a] < names[id_b]
+    pairs: dict[int, int] = field(default_factory=dict)
+
+    def row(self, key: int) -> dict:
+        """Field values for the PairStat with packed `key`."""
+        wins = self.pairs[key]
+        return {
+            "name_a": self.names[key >> _SHIFT],
+            "name_b": self.names[key & _LOW],
+            "wins_a": wins >> _SHIFT,
+            "wins_b": wins & _LOW,
+        }
+
+    def rows(self) -> Iterator[dict]:
+        return map(self.row, self.pairs)
+
+
+def tally_pairs(tally: PairTally | None = None, touched: set[int] | None = None) -> PairTally:
+    """Count head-to-head wins over all votes.
+
+    Pass a previous `tally` to continue from its last vote. Keys of pairs
+    that changed are added to `touched`, if given.
+    """
+    if tally is None:
+        tally = PairTally()
+
+    names = tally.names
+    uuid_ids = tally.uuid_ids
+    pairs = tally.pairs
+
+    for chunk in new_vote_chunks(tally):
+        for _, card_1, card_2, chosen in chunk:
+            i = uuid_ids[card_1]
+            j = uuid_ids[card_2]
+            if i < 0 or j < 0 or i == j:
+                continue
+
+            winner_is_a = chosen == card_1
+            if names[j] < names[i]:
+                i, j = j, i
+                winner_is_a = not winner_is_a
+            key = i << _SHIFT | j
+            pairs[key] = pairs.get(key, 0) + (1 << _SHIFT if winner_is_a else 1)
+            if touched is not None:
+                touched.add(key)
+
+    return tally
@@ -0,0 +1,138 @@
+"""Per-IP token-bucket load shedding.
+
+`RateLimitMiddleware` runs before sessions, auth and the views, so an
+over-limit client is turned away with a 429 before any ORM work happens.
+Bucket state lives in its own small SQLite file (`settings.RATE_LIMIT_DB`)
+rather than in process memory, so all gunicorn workers share one budget per
+client. That file never touches the main database's write lock.
+"""
+
+import math
+import random
+import sqlite3
+import threading
+import time
+
+from django.conf import settings
+from django.http import HttpResponse
+
+# Buckets untouched for this long are full again and can be forgotten.
+PRUNE_AFTER_SECONDS = 3600
+
+# Fraction of requests that also prune stale buckets.
+PRUNE_PROBABILITY = 0.001
+
+
+def client_ip(request) -> str:
+    """Get the client IP as seen by the proxy in front of us.
+
+    Fly's proxy sets Fly-Client-IP. Failing that, use the right-most
+    X-Forwarded-For entry, the one the proxy appended: entries to its left
+    come from the client, which could otherwise pick a fresh rate-limit
+    bucket per request.
+    """
+    fly_ip = request.META.get('HTTP_FLY_CLIENT_IP')
+    if fly_ip:
+        return fly_ip.strip()
+    xff = request.META.get('HTTP_X_FORWARDED_FOR')
+    return xff.split(',')[-1].strip() if xff else request.META.get('REMOTE_ADDR')
+
+
+class TokenBucketStore:
+    """Token buckets in a SQLite file, one connection per thread."""
+
+    def __init__(self, path):
+        self.path = str(path)
+        self._local = threading.local()
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # A short timeout: if the bucket table is contended we would
+            # rather let a request through than queue it.
+            conn = sqlite3.connect(self.path, timeout=0.05, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=OFF')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS buckets ('
+                'key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)'
+            )
+            self._local.conn = conn
+        return conn
+
+    def take(self, key: str, rate: float, burst: float, now: float | None = None) -> tuple[bool, float]:
+        """Try to take one token from `key`'s bucket.
+
+        Returns (allowed, retry_after_seconds). Fails open if the store is
+        unavailable.
+        """
+        if now is None:
+            now = time.time()
+        try:
+            conn = self._connection()
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                row = conn.execute(
+                    'SELECT tokens, updated FROM buckets WHERE key = ?', (key,)
+                ).fetchone()
+                if row is None:
+                    tokens = burst
+                else:
+                    tokens = min(burst, row[0] + max(0.0, now - row[1]) * rate)
+
+                allowed = tokens >= 1.0
+                if allowed:
+                    tokens -= 1.0
+                conn.execute(
+                    'INSERT INTO buckets (key, tokens, updated) VALUES (?, ?, ?) '
+                    'ON CONFLICT (key) DO UPDATE SET tokens = excluded.tokens, '
+                    'updated = excluded.updated',
+                    (key, tokens, now),
+                )
+                if random.random() < PRUNE_PROBABILITY:
+                    conn.execute(
+                        'DELETE FROM buckets WHERE updated < ?', (now - PRUNE_AFTER_SECONDS,)
+                    )
+                conn.execute('COMMIT')
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+        except sqlite3.Error:
+            return True, 0.0
+
+        retry_after = 0.0 if allowed else (1.0 - tokens) / rate
+        return allowed, retry_after
+
+
+_stores: dict[str, TokenBucketStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_store(path) -> TokenBucketStore:
+    with _stores_lock:
+        store = _stores.get(str(path))
+        if store is None:
+            store = _stores[str(path)] = TokenBucketStore(path)
+        return store
+
+
+class RateLimitMiddleware:
+    """Reject requests over the per-IP, per-method budget in `settings.RATE_LIMITS`."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        limit = settings.RATE_LIMITS.get(request.method) if settings.RATE_LIMIT_DB else None
+        if limit and not request.path.startswith(settings.RATE_LIMIT_EXEMPT):
+            rate, burst = limit
+            key = f'{request.method}:{client_ip(request)}'
+            allowed, retry_after = get_store(settings.RATE_LIMIT_DB).take(key, rate, burst)
+            if not allowed:
+                return HttpResponse(
+                    'Too many requests. Slow down a little.',
+                    status=429,
+                    content_type='text/plain',
+                    headers={'Retry-After': str(math.ceil(retry_after))},
+                )
+        return self.get_response(request)
@@ -0,0 +1,118 @@
+"""Avoid showing the same pair, or the same cards to one visitor, again.
+
+Random draws from tens of thousands of names rarely repeat, but active
+selection keeps pairing the same few cards near the top-500 boundary, and
+themed matchups draw from small pools. A repeated pair tells us little.
+
+`RecentPairs` remembers the pairs this process has issued recently, in two
+generations of pair keys: when the current generation is full or old, it
+replaces the previous one, which is dropped. Memory stays bounded and a
+pair is forgotten after one to two generations. Each gunicorn worker
+keeps its own, so nothing is shared and no query is needed to check it.
+
+A pair key is a 64-bit digest rather than the names themselves, to keep
+each entry small. Two pairs can share a key, but with the default 100,000
+pairs remembered the chance that a new pair is wrongly taken for a recent
+one is below one in 10^14.
+
+Per visitor, the last few card names shown are kept in the `recent_cards`
+cookie as 4-byte digests, so a visitor rarely sees a card twice in a row.
+"""
+
+import base64
+import binascii
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+
+COOKIE = "recent_cards"
+DIGEST_SIZE = 4
+
+
+def pair_key(name_1: str, name_2: str) -> int:
+    """A 64-bit digest of the pair, the same for either order of the two
+    names and in every process (unlike `hash`, which is salted per process)."""
+    if name_2 < name_1:
+        name_1, name_2 = name_2, name_1
+    digest = hashlib.blake2b(f"{name_1}\0{name_2}".encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+class RecentPairs:
+    """Time-rotating set of pair keys, holding at most `capacity` of them.
+
+    Each generation lasts at most `seconds / 2` and holds at most
+    `capacity / 2` keys, so a pair is remembered for up to `seconds`.
+    """
+
+    def __init__(self, capacity: int, seconds: float):
+        self.generation_size = max(1, capacity // 2)
+        self.generation_seconds = seconds / 2
+        self._current = set()
+        self._previous = set()
+        self._started = time.monotonic()
+        self._lock = threading.Lock()
+
+    def __contains__(self, key: int) -> bool:
+        return key in self._current or key in self._previous
+
+    def __len__(self) -> int:
+        return len(self._current) + len(self._previous)
+
+    def add(self, key: int) -> None:
+        with self._lock:
+            now = time.monotonic()
+            if (
+                len(self._current) >= self.generation_size
+                or now - self._started >= self.generation_seconds
+            ):
+                self._previous = self._current
+                self._current = set()
+                self._started = now
+            self._current.add(key)
+
+
+_recent_pairs: RecentPairs | None = None
+_recent_pairs_lock = threading.Lock()
+
+
+def get_recent_pairs() -> RecentPairs:
+    """This process's `RecentPairs`, sized from the settings."""
+    global _recent_pairs
+    with _recent_pairs_lock:
+        if _recent_pairs is None:
+            _recent_pairs = RecentPairs(
+                settings.MATCHUP_REPEAT_PAIRS, settings.MATCHUP_REPEAT_SECONDS
+            )
+        return _recent_pairs
+
+
+def clear_recent_pairs() -> None:
+    global _recent_pairs
+    with _recent_pairs_lock:
+        _recent_pairs = None
+
+
+def card_digest(name: str) -> bytes:
+    return hashlib.blake2b(name.encode(), digest_size=DIGEST_SIZE).digest()
+
+
+def decode_recent_cards(cookie: str | None) -> list[bytes]:
+    """Digests from a `recent_cards` cookie, oldest first; empty if malformed."""
+    if not cookie:
+        return []
+    try:
+        data = base64.urlsafe_b64decode(cookie.encode("ascii"))
+    except (binascii.Error, UnicodeEncodeError, ValueError):
+        return []
+    if len(data) % DIGEST_SIZE:
+        return []
+    return [data[i:i + DIGEST_SIZE] for i in range(0, len(data), DIGEST_SIZE)]
+
+
+def encode_recent_cards(digests: list[bytes], limit: int) -> str:
+    """A cookie value holding the newest `limit` digests."""
+    kept = digests[-limit:] if limit else []
+    return base64.urlsafe_b64encode(b"".join(kept)).decode("ascii")
@@ -0,0 +1,197 @@
+"""Replay the vote log through a rating engine.
+
+Votes are streamed once, in primary-key chunks, fetching only the columns
+the replay needs. Card names are interned to dense integer ids as they are
+first seen, and per-card state lives in arrays (`RatingTable` plus win and
+loss counters), so memory grows by a few dozen bytes per card rather than
+per dict entry, and not at all with the number of votes.
+"""
+
+from array import array
+from collections.abc import Iterator
+from dataclasses import dataclass, field
+
+from django.db.models import Max
+
+from . import archive
+from .models import Card, Vote
+from .rating_engines import RatingEngine, RatingState, RatingTable
+
+CHUNK_SIZE = 5000
+
+
+@dataclass
+class NameIndex:
+    """Dense integer ids for the card names seen while streaming votes."""
+
+    votes: int = 0
+    last_vote_id: int = 0
+    names: list[str] = field(default_factory=list)
+    # Name id of every card uuid seen so far, or -1 if it has no name.
+    uuid_ids: dict[str, int] = field(default_factory=dict)
+    _name_ids: dict[str, int] = field(default_factory=dict)
+
+    def __len__(self) -> int:
+        """Number of interned card names."""
+        return len(self.names)
+
+    def name_id(self, name: str) -> int:
+        """Intern `name`, returning its id."""
+        i = self._name_ids.get(name)
+        if i is None:
+            i = self._name_ids[name] = len(self.names)
+            self.names.append(name)
+            self._added()
+        return i
+
+    def _added(self) -> None:
+        """Hook for subclasses to grow per-name storage."""
+
+
+@dataclass
+class ReplayResult(NameIndex):
+    table: RatingTable = field(default_factory=RatingTable)
+    wins: array = field(default_factory=lambda: array('i'))
+    losses: array = field(default_factory=lambda: array('i'))
+
+    def rated(self) -> list[int]:
+        """Ids of cards that have played at least one matchup."""
+        wins = self.wins
+        losses = self.losses
+        return [i for i in range(len(self)) if wins[i] or losses[i]]
+
+    def _added(self) -> None:
+        # New names start from the default state.
+        self.table.add()
+        self.wins.append(0)
+        self.losses.append(0)
+
+    def state(self, name: str) -> RatingState:
+        return self.table.state(self._name_ids[name])
+
+    def row(self, i: int) -> dict:
+        """Field values for card `i`'s CardRating."""
+        table = self.table
+        return {
+            "name": self.names[i],
+            "rating": table.rating[i],
+            "deviation": table.deviation[i],
+            "volatility": table.volatility[i],
+            "wins": self.wins[i],
+            "losses": self.losses[i],
+        }
+
+    def rows(self) -> Iterator[dict]:
+        return (self.row(i) for i in self.rated())
+
+
+def vote_chunks(
+    after_id: int, upto_id: int, chunk_size: int | None = None
+) -> Iterator[list[tuple[int, str, str, str]]]:
+    """Yield (pk, card_1_uuid, card_2_uuid, chosen_uuid) in pk order, a chunk at a time.
+
+    Votes moved out by `archive_votes` are read from the archive files
+    first, then the rest from the live table.
+    """
+    chunk_size = chunk_size or CHUNK_SIZE
+    manifest = archive.read_manifest()
+    archived_id = archive.last_archived_id(manifest)
+    if after_id < archived_id:
+        yield from archive.vote_chunks(after_id, min(upto_id, archived_id), chunk_size, manifest)
+        after_id = archived_id
+    while after_id < upto_id:
+        chunk = list(
+            Vote.objects.filter(pk__gt=after_id, pk__lte=upto_id)
+            .order_by("pk")
+            .values_list("pk", "card_1_uuid", "card_2_uuid", "chosen_uuid")[:chunk_size]
+        )
+        if not chunk:
+            return
+        yield chunk
+        after_id = chunk[-1][0]
+
+
+def _resolve_uuids(result: NameIndex, chunk) -> None:
+    """Intern the names of any uuids in `chunk` we haven't seen yet.
+
+    Rows are (pk, card_1_uuid, card_2_uuid, ...).
+    """
+    uuid_ids = result.uuid_ids
+    new_uuids = set()
+    for _, card_1, card_2, *_ in chunk:
+        if card_1 not in uuid_ids:
+            new_uuids.add(card_1)
+        if card_2 not in uuid_ids:
+            new_uuids.add(card_2)
+    if not new_uuids:
+        return
+
+    names = dict(
+        Card.objects.using("mtgjson")
+        .filter(uuid__in=list(new_uuids))
+        .values_list("uuid", "name")
+    )
+    for u in new_uuids:
+        name = names.get(u)
+        uuid_ids[u] = result.name_id(name) if name else -1
+
+
+def new_vote_chunks(index: NameIndex) -> Iterator[list[tuple[int, str, str, str]]]:
+    """Yield chunks of the votes cast after `index.last_vote_id`.
+
+    Every uuid in a chunk is in `index.uuid_ids` by the time it is yielded.
+    `index.votes` and `index.last_vote_id` advance as chunks are consumed.
+    """
+    # Fix the upper bound so votes cast meanwhile wait for the next call.
+    upto_id = Vote.objects.filter(pk__gt=index.last_vote_id).aggregate(last=Max("pk"))["last"]
+    if upto_id is None:
+        upto_id = archive.last_archived_id()
+        if upto_id <= index.last_vote_id:
+            return
+    for chunk in vote_chunks(index.last_vote_id, upto_id):
+        _resolve_uuids(index, chunk)
+        yield chunk
+        index.votes += len(chunk)
+    index.last_vote_id = upto_id
+
+
+def replay_votes(
+    engine: RatingEngine,
+    result: ReplayResult | None = None,
+    touched: set[int] | None = None,
+) -> ReplayResult:
+    """Replay votes in the order they were recorded.
+
+    Pass a previous `result` to continue from its last vote instead of
+    starting over. Ids of cards whose state changed are added to
+    `touched`, if given.
+    """
+    if result is None:
+        result = ReplayResult()
+
+    table = result.table
+    wins = result.wins
+    losses = result.losses
+    uuid_ids = result.uuid_ids
+    update = engine.update_table
+
+    for chunk in new_vote_chunks(result):
+        for _, card_1, card_2, chosen in chunk:
+            i = uuid_ids[card_1]
+            j = uuid_ids[card_2]
+            if i < 0 or j < 0:
+                continue
+
+            a_won = chosen == card_1
+            update(table, i, j, a_won)
+            if a_won:
+                wins[i] += 1
+                losses[j] += 1
+            else:
+                wins[j] += 1
+                losses[i] += 1
+            if touched is not None:
+                touched.add(i)
+                touched.add(j)
+
+    return result
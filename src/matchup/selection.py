@@ -0,0 +1,106 @@
+"""Information-maximizing matchup selection.
+
+Uniform random pairs spend most votes on two obscure cards that will never
+be near the top 500. `RatingIndex` keeps rated card names sorted by rating
+so we can instead pick an informative "anchor" card (few games played, or
+ranked near the top-500 boundary) and pair it with a neighbor whose rating
+is within some delta, where the outcome is least predictable.
+"""
+
+import bisect
+import random
+import threading
+import time
+from collections.abc import Iterable
+
+from django.conf import settings
+from django.db.models import F
+
+
+class RatingIndex:
+    """Rated card names sorted by rating, with weighted anchor sampling.
+
+    `entries` are (name, rating, games) tuples. Anchor weights favor cards
+    with few games and cards within `boundary_width` ranks of
+    `boundary_rank`; they are precomputed as a cumulative table so each
+    draw is a binary search.
+    """
+
+    def __init__(
+        self,
+        entries: Iterable[tuple[str, float, int]],
+        boundary_rank: int = 500,
+        boundary_width: int = 100,
+    ):
+        ordered = sorted(entries, key=lambda e: e[1])
+        self.names = [e[0] for e in ordered]
+        self.ratings = [e[1] for e in ordered]
+        self.games = [e[2] for e in ordered]
+
+        n = len(ordered)
+        self._cumulative = []
+        total = 0.0
+        for i, games in enumerate(self.games):
+            rank = n - i  # ascending order, so the last entry is rank 1
+            weight = 1.0 / (1 + games)
+            if abs(rank - boundary_rank) <= boundary_width:
+                weight += 1.0
+            total += weight
+            self._cumulative.append(total)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def sample_anchor(self, rng: random.Random) -> int:
+        """Return the index of a weighted-random anchor card."""
+        target = rng.random() * self._cumulative[-1]
+        return min(bisect.bisect_right(self._cumulative, target), len(self) - 1)
+
+    def sample_neighbor(self, i: int, delta: float, rng: random.Random) -> int:
+        """Return the index of a card other than `i` rated within `delta` of it.
+
+        Falls back to the adjacent card when nothing is that close.
+        """
+        lo = bisect.bisect_left(self.ratings, self.ratings[i] - delta)
+        hi = bisect.bisect_right(self.ratings, self.ratings[i] + delta)
+        if hi - lo > 1:
+            j = rng.randrange(lo, hi - 1)
+            return j if j < i else j + 1
+        return i - 1 if i > 0 else i + 1
+
+    def sample_pair(self, delta: float, rng: random.Random) -> tuple[str, str] | None:
+        """Return two distinct names for an informative matchup."""
+        if len(self) < 2:
+            return None
+        i = self.sample_anchor(rng)
+        j = self.sample_neighbor(i, delta, rng)
+        return self.names[i], self.names[j]
+
+
+_index: RatingIndex | None = None
+_index_built = 0.0
+_index_lock = threading.Lock()
+
+
+def get_rating_index() -> RatingIndex:
+    """Return this process's rating index, rebuilding it once it is stale."""
+    global _index, _index_built
+    from .models import CardRating
+
+    with _index_lock:
+        if _index is None or time.monotonic() - _index_built > settings.MATCHUP_INDEX_TTL:
+            _index = RatingIndex(
+                CardRating.objects.values_list(
+                    'name', 'rating', F('wins') + F('losses')
+                ).iterator(),
+                boundary_rank=settings.MATCHUP_BOUNDARY_RANK,
+                boundary_width=settings.MATCHUP_BOUNDARY_WIDTH,
+            )
+            _index_built = time.monotonic()
+        return _index
+
+
+def clear_rating_index() -> None:
+    global _index
+    with _index_lock:
+        _index = None
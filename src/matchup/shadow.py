@@ -0,0 +1,98 @@
+"""Rebuild a table out of place and swap it in atomically.
+
+Rebuilding a derived table in place (delete everything, then insert) leaves
+readers looking at an empty or partial table, and concurrent writers
+updating rows that are about to be thrown away. Instead, `swap_table`
+fills a shadow copy of the table in small batches while the site keeps
+running, then takes the write lock once to catch up on anything that
+changed meanwhile and rename the shadow over the live table.
+
+SQLite only: it relies on transactional DDL and `sqlite_master`.
+"""
+
+from collections.abc import Callable, Iterable
+from itertools import batched
+
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+
+def swap_table(
+    model,
+    rows: Iterable[dict],
+    *,
+    key: tuple[str, ...],
+    catch_up: Callable[[], Iterable[dict]] | None = None,
+    using: str = DEFAULT_DB_ALIAS,
+    batch_size: int = 2000,
+) -> int:
+    """Replace the contents of `model`'s table with `rows`.
+
+    `rows` are dicts of field name to value; the primary key is assigned
+    fresh and missing fields take their defaults. `catch_up` is called
+    while holding the write lock, just before the swap, and returns rows
+    that replace any shadow rows with the same `key` fields. Use it to apply
+    writes that reached the live table during the rebuild.
+
+    Returns the number of rows written to the shadow table.
+    """
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        raise NotImplementedError("swap_table only supports SQLite")
+
+    qn = connection.ops.quote_name
+    table = model._meta.db_table
+    shadow = f"{table}__shadow"
+    fields = [f for f in model._meta.concrete_fields if not f.primary_key]
+    key_fields = [model._meta.get_field(name) for name in key]
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT type, sql FROM sqlite_master WHERE tbl_name = %s AND sql IS NOT NULL",
+            [table],
+        )
+        schema = cursor.fetchall()
+    create_table = next(sql for kind, sql in schema if kind == 'table')
+    create_indexes = [sql for kind, sql in schema if kind == 'index']
+
+    # A shadow left behind by an interrupted rebuild is simply replaced.
+    with connection.cursor() as cursor:
+        cursor.execute(f"DROP TABLE IF EXISTS {qn(shadow)}")
+        cursor.execute(create_table.replace(qn(table), qn(shadow), 1))
+
+    insert_sql = "INSERT INTO {} ({}) VALUES ({})".format(
+        qn(shadow),
+        ", ".join(qn(f.column) for f in fields),
+        ", ".join(["%s"] * len(fields)),
+    )
+
+    def params(row):
+        return [
+            f.get_db_prep_save(row[f.name] if f.name in row else f.get_default(), connection)
+            for f in fields
+        ]
+
+    # Fill the shadow in short transactions so live writes can interleave.
+    written = 0
+    for batch in batched(rows, batch_size):
+        with transaction.atomic(using=using), connection.cursor() as cursor:
+            cursor.executemany(insert_sql, [params(row) for row in batch])
+        written += len(batch)
+
+    with transaction.atomic(using=using), connection.cursor() as cursor:
+        if catch_up is not None:
+            delete_sql = "DELETE FROM {} WHERE {}".format(
+                qn(shadow), " AND ".join(f"{qn(f.column)} = %s" for f in key_fields)
+            )
+            changed = list(catch_up())
+            cursor.executemany(delete_sql, [
+                [f.get_db_prep_save(row[f.name], connection) for f in key_fields]
+                for row in changed
+            ])
+            cursor.executemany(insert_sql, [params(row) for row in changed])
+
+        cursor.execute(f"DROP TABLE {qn(table)}")
+        cursor.execute(f"ALTER TABLE {qn(shadow)} RENAME TO {qn(table)}")
+        for sql in create_indexes:
+            cursor.execute(sql)
+
+    return written
@@ -0,0 +1,129 @@
+"""Offline voter simulator for comparing selection and rating strategies.
+
+A synthetic card pool gets hidden "true fame" scores. Simulated voters pick
+the more famous card of each matchup with logistic noise, and the votes are
+fed to a rating engine from `rating_engines`. Every `check_every` votes the
+estimated top-k is compared with the true one, and we record how many votes
+it took to reach the target Kendall tau and precision.
+
+Pure Python and model-free, so runs can fan out across a process pool.
+"""
+
+import itertools
+import math
+import random
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+
+from .metrics import kendall_tau, top_k_overlap
+from .rating_engines import RatingState, get_engine
+from .selection import RatingIndex
+
+STRATEGIES = ('uniform', 'active')
+
+
+@dataclass(frozen=True)
+class SimulationConfig:
+    num_cards: int = 20_000
+    top_k: int = 500
+    max_votes: int = 2_000_000
+    check_every: int = 10_000
+    target_tau: float = 0.8
+    target_precision: float = 0.9
+    # Logistic temperature of voter choices, in units of true-fame standard
+    # deviations. Smaller means voters agree more with the true ranking.
+    noise: float = 0.5
+    engine: str = 'elo'
+    strategy: str = 'uniform'
+    exploration: float = 0.3
+    rating_delta: float = 100.0
+    # Uniform draws weight each card by its number of printings to this
+    # power: 0 draws card names evenly, 1 draws printings, as the site did
+    # before MATCHUP_SAMPLE_BY. Printing counts are heavy-tailed, like
+    # MTGJSON's, and independent of fame.
+    sample_exponent: float = 0.0
+
+
+@dataclass
+class SimulationResult:
+    seed: int
+    votes: int
+    votes_to_tau: int | None = None
+    votes_to_precision: int | None = None
+    final_tau: float = 0.0
+    final_precision: float = 0.0
+    trace: list[tuple[int, float, float]] = field(default_factory=list)
+
+
+def evaluate(fame: list[float], ratings: list[float], top_k: int) -> tuple[float, float]:
+    """Return (Kendall tau over the true top-k, precision at k)."""
+    true_order = sorted(range(len(fame)), key=fame.__getitem__, reverse=True)
+    est_order = sorted(range(len(ratings)), key=ratings.__getitem__, reverse=True)
+    true_top = true_order[:top_k]
+    tau = kendall_tau([fame[i] for i in true_top], [ratings[i] for i in true_top])
+    return tau, top_k_overlap(true_order, est_order, top_k)
+
+
+def simulate(seed: int, config: SimulationConfig) -> SimulationResult:
+    """Run one simulated voting campaign."""
+    rng = random.Random(seed)
+    engine = get_engine(config.engine)
+    n = config.num_cards
+
+    fame = [rng.gauss(0.0, 1.0) for _ in range(n)]
+    states = [RatingState()] * n
+    result = SimulationResult(seed=seed, votes=0)
+
+    cumulative = None
+    if config.sample_exponent:
+        reprints = random.Random(f"printings-{seed}")
+        printings = [min(80, int(reprints.paretovariate(1.2))) for _ in range(n)]
+        cumulative = list(itertools.accumulate(p ** config.sample_exponent for p in printings))
+
+    index = None
+    vote = 0
+    for vote in range(1, config.max_votes + 1):
+        if config.strategy == 'active' and rng.random() >= config.exploration:
+            if index is None:
+                index = RatingIndex(
+                    ((i, s.rating, s.games) for i, s in enumerate(states)),
+                    boundary_rank=config.top_k,
+                )
+            a, b = index.sample_pair(config.rating_delta, rng)
+        elif cumulative:
+            a, b = rng.choices(range(n), cum_weights=cumulative, k=2)
+            while b == a:
+                b = rng.choices(range(n), cum_weights=cumulative)[0]
+        else:
+            a = rng.randrange(n)
+            b = rng.randrange(n - 1)
+            if b >= a:
+                b += 1
+
+        p_a = 1.0 / (1.0 + math.exp((fame[b] - fame[a]) / config.noise))
+        states[a], states[b] = engine.update(states[a], states[b], rng.random() < p_a)
+
+        if vote % config.check_every == 0:
+            index = None  # pick up the new ratings
+            tau, precision = evaluate(fame, [s.rating for s in states], config.top_k)
+            result.trace.append((vote, tau, precision))
+            if result.votes_to_tau is None and tau >= config.target_tau:
+                result.votes_to_tau = vote
+            if result.votes_to_precision is None and precision >= config.target_precision:
+                result.votes_to_precision = vote
+            if result.votes_to_tau is not None and result.votes_to_precision is not None:
+                break
+
+    result.votes = vote
+    result.final_tau, result.final_precision = evaluate(
+        fame, [s.rating for s in states], config.top_k
+    )
+    return result
+
+
+def run(seeds: list[int], config: SimulationConfig, workers: int | None = None) -> list[SimulationResult]:
+    """Simulate each seed, in parallel across `workers` processes."""
+    if workers == 1:
+        return [simulate(seed, config) for seed in seeds]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(simulate, seeds, [config] * len(seeds)))
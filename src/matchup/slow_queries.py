@@ -0,0 +1,148 @@
+"""Log slow SQL statements along with SQLite's query plan.
+
+`SlowQueryLogger` is installed as an execute wrapper on every database
+connection (see `MatchupConfig.ready`). Statements that take longer than
+`settings.SLOW_QUERY_THRESHOLD_MS` are logged and appended, one JSON object
+per line, to `settings.SLOW_QUERY_LOG`. Once that file reaches
+`settings.SLOW_QUERY_LOG_MAX_BYTES` it is renamed to "<log>.1", replacing
+the previous one, so the log never takes more than twice that on the data
+volume. The `slow_queries` management command summarizes both files.
+"""
+
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+from django.conf import settings
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r"(?<![\w\"])-?\d+(?:\.\d+)?\b")
+_PLACEHOLDER_LIST_RE = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_sql(sql: str) -> str:
+    """Reduce a statement to its shape so that similar queries group together.
+
+    Literals and parameters become `?`, `IN (?, ?, ...)` lists collapse to
+    a single `(...)`, and whitespace is squashed.
+    """
+    sql = sql.replace("%s", "?")
+    sql = _STRING_RE.sub("?", sql)
+    sql = _NUMBER_RE.sub("?", sql)
+    sql = _PLACEHOLDER_LIST_RE.sub("(...)", sql)
+    return _WHITESPACE_RE.sub(" ", sql).strip()
+
+
+def explain(connection, sql: str, params) -> list[str]:
+    """Return SQLite's EXPLAIN QUERY PLAN for a read statement, one line per step."""
+    if not sql.lstrip().upper().startswith(("SELECT", "WITH")):
+        return []
+    _local.explaining = True
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+            rows = cursor.fetchall()
+    except Exception:
+        logger.exception("Could not explain slow query")
+        return []
+    finally:
+        _local.explaining = False
+
+    # Rows are (id, parent, notused, detail); indent children under parents.
+    depth = {0: -1}
+    plan = []
+    for node_id, parent, _, detail in rows:
+        depth[node_id] = depth.get(parent, -1) + 1
+        plan.append("  " * depth[node_id] + detail)
+    return plan
+
+
+class SlowQueryLogger:
+    """Execute wrapper that records statements slower than the threshold."""
+
+    def __call__(self, execute, sql, params, many, context):
+        if getattr(_local, "explaining", False):
+            return execute(sql, params, many, context)
+
+        start = time.perf_counter()
+        result = execute(sql, params, many, context)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+
+        threshold = settings.SLOW_QUERY_THRESHOLD_MS
+        if threshold is not None and elapsed_ms >= threshold:
+            connection = context["connection"]
+            record = {
+                "at": timezone.now().isoformat(),
+                "alias": connection.alias,
+                "ms": round(elapsed_ms, 3),
+                "many": many,
+                "sql": normalize_sql(sql),
+                "plan": [] if many else explain(connection, sql, params),
+            }
+            logger.warning(
+                "Slow query on %s (%.1f ms): %s", record["alias"], elapsed_ms, record["sql"]
+            )
+            _append(record)
+        return result
+
+
+def rotated(path) -> str:
+    return f"{path}.1"
+
+
+def _append(record: dict) -> None:
+    path = settings.SLOW_QUERY_LOG
+    if not path:
+        return
+    try:
+        try:
+            if os.stat(path).st_size >= settings.SLOW_QUERY_LOG_MAX_BYTES:
+                # Concurrent workers may both rotate; at worst the older
+                # file is lost.
+                os.replace(path, rotated(path))
+        except FileNotFoundError:
+            pass
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+    except OSError:
+        logger.exception("Could not write slow query log %s", path)
+
+
+def install(sender=None, connection=None, **kwargs) -> None:
+    """`connection_created` receiver that adds the wrapper once per connection."""
+    if not any(isinstance(w, SlowQueryLogger) for w in connection.execute_wrappers):
+        connection.execute_wrappers.append(SlowQueryLogger())
+
+
+def read_log(path) -> list[dict]:
+    """Load slow query records from the log and its rotated predecessor,
+    oldest first, skipping lines that fail to parse.
+
+    Raises FileNotFoundError if neither exists.
+    """
+    records = []
+    found = False
+    for name in (rotated(path), path):
+        try:
+            f = open(name, encoding="utf-8")
+        except FileNotFoundError:
+            continue
+        found = True
+        with f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    continue
+    if not found:
+        raise FileNotFoundError(path)
+    return records
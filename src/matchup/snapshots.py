@@ -0,0 +1,162 @@
+"""Snapshots of the full ranking, to see whether it has settled.
+
+`take` stores every card rating as one `RatingSnapshot` row: names sorted
+and newline-separated, ratings as float32 in the same order, each
+zlib-compressed. Sorted names compress well, and two snapshots can be
+lined up by name with a single merge pass. It skips the snapshot if
+ratings haven't changed since the last one, so it is cheap to run hourly.
+
+`compare` lines up two snapshots and reports rank changes, Kendall's tau
+over the cards in both, and how much the top k overlap. `prune` keeps
+hourly snapshots for a few days and one a day after that, like
+`trending.compact`.
+"""
+
+import zlib
+from array import array
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+from django.db import transaction
+
+from .metrics import kendall_tau, top_k_overlap
+from .models import CardRating, RatingSnapshot, RatingVersion
+
+# The blob columns, left out when only listing snapshots.
+BLOBS = ('names', 'ratings')
+
+
+def take(force: bool = False) -> RatingSnapshot | None:
+    """Store the current ratings. Returns None, unless `force`, if they
+    haven't changed since the last snapshot."""
+    # Read the version first and without a transaction, which would hold
+    # the write lock: a vote landing in between only means the next run
+    # takes a snapshot it could have skipped.
+    version = RatingVersion.current().version
+    latest = RatingSnapshot.objects.defer(*BLOBS).order_by('-taken_at').first()
+    if not force and latest is not None and latest.version == version:
+        return None
+    rows = sorted(CardRating.objects.values_list('name', 'rating').iterator())
+
+    names = '\n'.join(name for name, _ in rows).encode()
+    ratings = array('f', (rating for _, rating in rows))
+    return RatingSnapshot.objects.create(
+        version=version,
+        count=len(rows),
+        names=zlib.compress(names),
+        ratings=zlib.compress(ratings.tobytes()),
+    )
+
+
+def load(snapshot: RatingSnapshot) -> tuple[list[str], array]:
+    """(names, ratings) of `snapshot`, sorted by name."""
+    if not snapshot.count:
+        return [], array('f')
+    names = zlib.decompress(snapshot.names).decode().split('\n')
+    ratings = array('f')
+    ratings.frombytes(zlib.decompress(snapshot.ratings))
+    return names, ratings
+
+
+def ranking(names: list[str], ratings: array) -> list[str]:
+    """Names best first."""
+    order = sorted(range(len(names)), key=ratings.__getitem__, reverse=True)
+    return [names[i] for i in order]
+
+
+@dataclass
+class Comparison:
+    old: RatingSnapshot
+    new: RatingSnapshot
+    common: int
+    added: int
+    removed: int
+    tau: float
+    top_tau: float
+    overlap: float
+    k: int
+    movers: list[tuple[str, int, int]]  # (name, old rank, new rank)
+
+
+def _line_up(old: tuple[list[str], array], new: tuple[list[str], array]):
+    """Ratings of the names in both snapshots, as (names, old, new)."""
+    (old_names, old_ratings), (new_names, new_ratings) = old, new
+    names, x, y = [], [], []
+    i = j = 0
+    while i < len(old_names) and j < len(new_names):
+        if old_names[i] == new_names[j]:
+            names.append(old_names[i])
+            x.append(old_ratings[i])
+            y.append(new_ratings[j])
+            i += 1
+            j += 1
+        elif old_names[i] < new_names[j]:
+            i += 1
+        else:
+            j += 1
+    return names, x, y
+
+
+def compare(old: RatingSnapshot, new: RatingSnapshot, k: int, movers: int = 10) -> Comparison:
+    """How the ranking moved from `old` to `new`.
+
+    `tau` is over every card in both; `top_tau` is over the cards in the
+    top `k` of `new` that are also in `old`. `movers` are the cards in the
+    top `k` of `new` whose rank changed most.
+    """
+    old_data, new_data = load(old), load(new)
+    names, x, y = _line_up(old_data, new_data)
+    old_ranking, new_ranking = ranking(*old_data), ranking(*new_data)
+    old_rank = {name: rank for rank, name in enumerate(old_ranking, 1)}
+
+    top = [
+        (old_rank[name], rank)
+        for rank, name in enumerate(new_ranking[:k], 1)
+        if name in old_rank
+    ]
+    moved = sorted(
+        (
+            (name, old_rank[name], rank)
+            for rank, name in enumerate(new_ranking[:k], 1)
+            if name in old_rank and old_rank[name] != rank
+        ),
+        key=lambda m: (-abs(m[1] - m[2]), m[2]),
+    )
+    return Comparison(
+        old=old,
+        new=new,
+        common=len(names),
+        added=new.count - len(names),
+        removed=old.count - len(names),
+        tau=kendall_tau(x, y),
+        top_tau=kendall_tau([a for a, _ in top], [b for _, b in top]),
+        overlap=top_k_overlap(new_ranking, old_ranking, k),
+        k=k,
+        movers=moved[:movers],
+    )
+
+
+def prune(now: datetime, hourly_days: int, retention_days: int) -> int:
+    """Keep only the first snapshot of each day from before the last
+    `hourly_days` whole days, and none older than `retention_days`.
+
+    Returns the number of snapshots deleted.
+    """
+    midnight = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    cutoff = midnight - timedelta(days=hourly_days)
+    expired = midnight - timedelta(days=retention_days)
+
+    with transaction.atomic():
+        deleted, _ = RatingSnapshot.objects.filter(taken_at__lt=expired).delete()
+        seen = set()
+        extra = []
+        for pk, taken_at in (
+            RatingSnapshot.objects.filter(taken_at__lt=cutoff)
+            .order_by('taken_at')
+            .values_list('pk', 'taken_at')
+        ):
+            if taken_at.date() in seen:
+                extra.append(pk)
+            seen.add(taken_at.date())
+        thinned, _ = RatingSnapshot.objects.filter(pk__in=extra).delete()
+    return deleted + thinned
@@ -0,0 +1,270 @@
+"""Multi-process stress harness for the vote write path.
+
+Spawns worker processes that each run the real vote code path (create a
+`Matchup`, then POST a choice to `views.matchup`) against a shared,
+file-backed SQLite database, the same way gunicorn workers do in
+production. Afterwards the resulting `CardRating` rows are checked against
+the `Vote` log to count updates lost to read-modify-write races.
+
+Used by the `stress_votes` management command. Nothing here imports models
+at module level, because worker processes are spawned fresh and have to
+configure Django before the app registry is loaded.
+"""
+
+import multiprocessing
+import os
+import queue
+import random
+import sqlite3
+import time
+import uuid
+from dataclasses import dataclass, field
+from pathlib import Path
+
+# Upper bounds (ms) of the vote latency histogram buckets; the last bucket
+# is open-ended.
+LATENCY_BUCKETS_MS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 2048, 4096)
+
+
+@dataclass
+class WorkerResult:
+    votes: int = 0
+    busy_errors: int = 0
+    other_errors: int = 0
+    latencies_ms: list[float] = field(default_factory=list)
+
+
+@dataclass
+class StressReport:
+    processes: int
+    attempted: int
+    elapsed: float
+    votes: int
+    busy_errors: int
+    other_errors: int
+    latencies_ms: list[float]
+    vote_rows: int
+    lost_wins: int
+    lost_losses: int
+    mismatched_cards: int
+
+    @property
+    def throughput(self) -> float:
+        return self.votes / self.elapsed if self.elapsed else 0.0
+
+    def percentile(self, p: float) -> float:
+        if not self.latencies_ms:
+            return 0.0
+        ordered = sorted(self.latencies_ms)
+        return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+    def histogram(self) -> list[tuple[str, int]]:
+        counts = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        for ms in self.latencies_ms:
+            for i, bound in enumerate(LATENCY_BUCKETS_MS):
+                if ms < bound:
+                    counts[i] += 1
+                    break
+            else:
+                counts[-1] += 1
+        labels = [f"< {bound} ms" for bound in LATENCY_BUCKETS_MS]
+        labels.append(f">= {LATENCY_BUCKETS_MS[-1]} ms")
+        return list(zip(labels, counts))
+
+
+def seed_mtgjson(path: Path, num_cards: int) -> dict[str, str]:
+    """Create a minimal mtgjson database with synthetic cards.
+
+    Returns a map of card uuid to card name.
+    """
+    cards = {str(uuid.uuid4()): f"Stress Card {i}" for i in range(num_cards)}
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.execute(
+            'CREATE TABLE "cards" ('
+            '"uuid" TEXT PRIMARY KEY, "name" TEXT, "setCode" TEXT, '
+            '"rarity" TEXT, "layout" TEXT, "isFunny" INTEGER, '
+            '"isOnlineOnly" INTEGER, "isOversized" INTEGER, '
+            '"availability" TEXT, "side" TEXT, "language" TEXT, '
+            '"supertypes" TEXT, "frameVersion" TEXT, "isPromo" INTEGER, '
+            '"frameEffects" TEXT, "borderColor" TEXT, "isFullArt" INTEGER)'
+        )
+        conn.execute(
+            'CREATE TABLE "cardIdentifiers" ("uuid" TEXT PRIMARY KEY, "scryfallId" TEXT)'
+        )
+        conn.executemany(
+            'INSERT INTO "cards" ("uuid", "name", "setCode", "rarity", "layout", '
+            '"availability", "language") '
+            "VALUES (?, ?, 'STR', 'common', 'normal', 'paper', 'English')",
+            cards.items(),
+        )
+        conn.executemany(
+            'INSERT INTO "cardIdentifiers" ("uuid", "scryfallId") VALUES (?, ?)',
+            [(u, str(uuid.uuid4())) for u in cards],
+        )
+    conn.close()
+    return cards
+
+
+def _configure_django(default_path: str, mtgjson_path: str, timeout: float) -> None:
+    """Point a freshly spawned process's Django at the stress databases."""
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "fivehundredmagic.settings")
+    import django
+    from django.conf import settings
+
+    settings.DATABASES["default"]["NAME"] = default_path
+    settings.DATABASES["default"].setdefault("OPTIONS", {})["timeout"] = timeout
+    settings.DATABASES["mtgjson"]["NAME"] = mtgjson_path
+    settings.SLOW_QUERY_THRESHOLD_MS = None
+    django.setup()
+
+
+def migrate(default_path: str, mtgjson_path: str, timeout: float) -> None:
+    _configure_django(default_path, mtgjson_path, timeout)
+    from django.core.management import call_command
+
+    call_command("migrate", verbosity=0)
+
+
+def run_worker(
+    default_path: str,
+    mtgjson_path: str,
+    timeout: float,
+    card_uuids: list[str],
+    num_votes: int,
+    seed: int,
+    start,
+    results,
+) -> None:
+    """Cast `num_votes` votes through the real view, then report back."""
+    _configure_django(default_path, mtgjson_path, timeout)
+    from django.db import OperationalError, connections
+    from django.test import RequestFactory
+
+    from matchup.models import Matchup
+    from matchup.views import matchup
+
+    rng = random.Random(seed)
+    factory = RequestFactory()
+    result = WorkerResult()
+
+    start.wait()
+    for _ in range(num_votes):
+        card_1, card_2 = rng.sample(card_uuids, 2)
+        began = time.perf_counter()
+        try:
+            m = Matchup.objects.create(card_1_uuid=card_1, card_2_uuid=card_2)
+            request = factory.post("/", {
+                "matchup_token": str(m.token),
+                "chosen_uuid": rng.choice((card_1, card_2)),
+            })
+            response = matchup(request)
+        except OperationalError as e:
+            if "locked" in str(e) or "busy" in str(e):
+                result.busy_errors += 1
+            else:
+                result.other_errors += 1
+            continue
+        result.latencies_ms.append((time.perf_counter() - began) * 1000)
+        if response.status_code == 302:
+            result.votes += 1
+        else:
+            result.other_errors += 1
+
+    connections.close_all()
+    results.put(result)
+
+
+def check_consistency(default_path: Path, cards: dict[str, str]) -> tuple[int, int, int, int]:
+    """Compare `CardRating` win/loss counts against the `Vote` log.
+
+    Returns (vote_rows, lost_wins, lost_losses, mismatched_cards).
+    """
+    conn = sqlite3.connect(default_path)
+    votes = conn.execute(
+        "SELECT card_1_uuid, card_2_uuid, chosen_uuid FROM matchup_vote"
+    ).fetchall()
+    ratings = {
+        name: (wins, losses)
+        for name, wins, losses in conn.execute(
+            "SELECT name, wins, losses FROM matchup_cardrating"
+        )
+    }
+    conn.close()
+
+    expected: dict[str, list[int]] = {}
+    for card_1, card_2, chosen in votes:
+        loser = card_2 if chosen == card_1 else card_1
+        expected.setdefault(cards[chosen], [0, 0])[0] += 1
+        expected.setdefault(cards[loser], [0, 0])[1] += 1
+
+    lost_wins = lost_losses = mismatched = 0
+    for name, (wins, losses) in expected.items():
+        actual_wins, actual_losses = ratings.get(name, (0, 0))
+        lost_wins += wins - actual_wins
+        lost_losses += losses - actual_losses
+        if (wins, losses) != (actual_wins, actual_losses):
+            mismatched += 1
+    return len(votes), lost_wins, lost_losses, mismatched
+
+
+def run(
+    workdir: Path,
+    processes: int,
+    votes_per_process: int,
+    num_cards: int,
+    timeout: float,
+    seed: int = 0,
+) -> StressReport:
+    """Run a full stress pass in `workdir` and return the report."""
+    default_path = workdir / "stress.sqlite3"
+    mtgjson_path = workdir / "stress-mtgjson.sqlite"
+    cards = seed_mtgjson(mtgjson_path, num_cards)
+
+    ctx = multiprocessing.get_context("spawn")
+    setup = ctx.Process(target=migrate, args=(str(default_path), str(mtgjson_path), timeout))
+    setup.start()
+    setup.join()
+    if setup.exitcode != 0:
+        raise RuntimeError("Could not migrate the stress database")
+
+    start = ctx.Event()
+    results = ctx.Queue()
+    workers = [
+        ctx.Process(target=run_worker, args=(
+            str(default_path), str(mtgjson_path), timeout, list(cards),
+            votes_per_process, seed + i, start, results,
+        ))
+        for i in range(processes)
+    ]
+    for w in workers:
+        w.start()
+
+    began = time.perf_counter()
+    start.set()
+    # Drain the queue before joining so large results can't block a worker.
+    worker_results = []
+    while len(worker_results) < len(workers):
+        try:
+            worker_results.append(results.get(timeout=1))
+        except queue.Empty:
+            if not any(w.is_alive() for w in workers) and results.empty():
+                raise RuntimeError("A stress worker exited without reporting results")
+    elapsed = time.perf_counter() - began
+    for w in workers:
+        w.join()
+
+    vote_rows, lost_wins, lost_losses, mismatched = check_consistency(default_path, cards)
+    return StressReport(
+        processes=processes,
+        attempted=processes * votes_per_process,
+        elapsed=elapsed,
+        votes=sum(r.votes for r in worker_results),
+        busy_errors=sum(r.busy_errors for r in worker_results),
+        other_errors=sum(r.other_errors for r in worker_results),
+        latencies_ms=[ms for r in worker_results for ms in r.latencies_ms],
+        vote_rows=vote_rows,
+        lost_wins=lost_wins,
+        lost_losses=lost_losses,
+        mismatched_cards=mismatched,
+    )
@@ -12,6 +12,43 @@ CARD_2_UUID = "bbbbbbbb-2222-2222-2222-222222222222"
 SCRYFALL_ID = "abcdef01-2345-6789-abcd-ef0123456789"
 
 
+def _create_mtgjson_tables():
+    """Create the unmanaged mtgjson tables in the test database."""
+    from django.db import connections
+    with connections["mtgjson"].cursor() as cursor:
+        cursor.execute(
+            'CREATE TABLE IF NOT EXISTS "cards" ('
+            '"uuid" TEXT PRIMARY KEY, "name" TEXT, "setCode" TEXT, '
+            '"rarity" TEXT, "layout" TEXT, "isFunny" INTEGER, '
+            '"isOnlineOnly" INTEGER, "isOversized" INTEGER, '
+            '"availability" TEXT, "side" TEXT, "language" TEXT, '
+            '"supertypes" TEXT, "frameVersion" TEXT, "isPromo" INTEGER, '
+            '"frameEffects" TEXT, "borderColor" TEXT, "isFullArt" INTEGER)'
+        )
+        cursor.execute(
+            'CREATE TABLE IF NOT EXISTS "cardIdentifiers" ('
+            '"uuid" TEXT PRIMARY KEY, "scryfallId" TEXT)'
+        )
+        cursor.execute(
+            'CREATE TABLE IF NOT EXISTS "sets" ('
+            '"code" TEXT PRIMARY KEY, "name" TEXT, "releaseDate" TEXT, "type" TEXT)'
+        )
+
+
+def _seed_card(uuid, name, scryfall_id, **fields):
+    """Insert an eligible paper card and its identifiers into the mtgjson test database."""
+    defaults = {
+        "setCode": "TST",
+        "rarity": "common",
+        "layout": "normal",
+        "language": "English",
+        "availability": "paper",
+    }
+    defaults.update(fields)
+    Card.objects.using("mtgjson").create(uuid=uuid, name=name, **defaults)
+    CardIdentifiers.objects.using("mtgjson").create(uuid=uuid, scryfallId=scryfall_id)
+
+
 class CardIdentifiersModelTest(TestCase):
     databases = {"default", "mtgjson"}
 
@@ -122,6 +159,18 @@ class VotePostTest(TestCase):
         self.assertEqual(response.status_code, 400)
         self.assertEqual(Vote.objects.count(), 1)
 
+    @patch("matchup.views._update_elo")
+    def test_concurrent_submit_of_same_token_rejected(self, mock_elo):
+        m = self._create_matchup()
+        data = {"matchup_token": str(m.token), "chosen_uuid": CARD_1_UUID}
+        self.client.post("/", data)
+        # The second request read the matchup before the first one committed.
+        with patch.object(Matchup.objects, "get", return_value=m):
+            response = self.client.post("/", data)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Vote.objects.count(), 1)
+        self.assertEqual(mock_elo.call_count, 1)
+
     @patch("matchup.views._update_elo")
     def test_fabricated_token_rejected(self, mock_elo):
         response = self.client.post("/", {
@@ -176,7 +225,23 @@ class VotePostTest(TestCase):
             HTTP_X_FORWARDED_FOR="203.0.113.50, 70.41.3.18",
         )
         vote = Vote.objects.first()
-        self.assertEqual(vote.ip_address, "203.0.113.50")
+        # The left entries are the client's to forge; the proxy appended the last.
+        self.assertEqual(vote.ip_address, "70.41.3.18")
+
+    @patch("matchup.views._update_elo")
+    def test_vote_prefers_fly_client_ip(self, mock_elo):
+        m = self._create_matchup()
+        self.client.post(
+            "/",
+            {
+                "matchup_token": str(m.token),
+                "chosen_uuid": CARD_1_UUID,
+            },
+            HTTP_X_FORWARDED_FOR="203.0.113.50, 70.41.3.18",
+            HTTP_FLY_CLIENT_IP="198.51.100.7",
+        )
+        vote = Vote.objects.first()
+        self.assertEqual(vote.ip_address, "198.51.100.7")
 
 
 class EloMathTest(TestCase):
@@ -231,7 +296,8 @@ class EloVoteIntegrationTest(TestCase):
                 '"rarity" TEXT, "layout" TEXT, "isFunny" INTEGER, '
                 '"isOnlineOnly" INTEGER, "isOversized" INTEGER, '
                 '"availability" TEXT, "side" TEXT, "language" TEXT, '
-                '"supertypes" TEXT)'
+                '"supertypes" TEXT, "frameVersion" TEXT, "isPromo" INTEGER, '
+                '"frameEffects" TEXT, "borderColor" TEXT, "isFullArt" INTEGER)'
             )
 
     def _seed_mtgjson_cards(self):
@@ -320,7 +386,8 @@ class LanguageFilterTest(TestCase):
                 '"rarity" TEXT, "layout" TEXT, "isFunny" INTEGER, '
                 '"isOnlineOnly" INTEGER, "isOversized" INTEGER, '
                 '"availability" TEXT, "side" TEXT, "language" TEXT, '
-                '"supertypes" TEXT)'
+                '"supertypes" TEXT, "frameVersion" TEXT, "isPromo" INTEGER, '
+                '"frameEffects" TEXT, "borderColor" TEXT, "isFullArt" INTEGER)'
             )
             cursor.execute(
                 'CREATE TABLE IF NOT EXISTS "cardIdentifiers" ('
@@ -438,7 +505,8 @@ class LeaderboardTest(TestCase):
                 '"rarity" TEXT, "layout" TEXT, "isFunny" INTEGER, '
                 '"isOnlineOnly" INTEGER, "isOversized" INTEGER, '
                 '"availability" TEXT, "side" TEXT, "language" TEXT, '
-                '"supertypes" TEXT)'
+                '"supertypes" TEXT, "frameVersion" TEXT, "isPromo" INTEGER, '
+                '"frameEffects" TEXT, "borderColor" TEXT, "isFullArt" INTEGER)'
             )
             cursor.execute(
                 'CREATE TABLE IF NOT EXISTS "cardIdentifiers" ('
@@ -702,7 +770,8 @@ class BasicLandFilterTest(TestCase):
                 '"rarity" TEXT, "layout" TEXT, "isFunny" INTEGER, '
                 '"isOnlineOnly" INTEGER, "isOversized" INTEGER, '
                 '"availability" TEXT, "side" TEXT, "language" TEXT, '
-                '"supertypes" TEXT)'
+                '"supertypes" TEXT, "frameVersion" TEXT, "isPromo" INTEGER, '
+                '"frameEffects" TEXT, "borderColor" TEXT, "isFullArt" INTEGER)'
             )
             cursor.execute(
                 'CREATE TABLE IF NOT EXISTS "cardIdentifiers" ('
@@ -850,3 +919,1733 @@ class BasicLandFilterTest(TestCase):
             # Actually, we can have 0, 1, or 2 - let's just verify valid results
             self.assertIn(basic_in_result, [0, 1, 2])
 
+
+
+class SlowQueryLogTest(TestCase):
+    def setUp(self):
+        import tempfile
+        from pathlib import Path
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.log_path = Path(tmp.name) / "slow.jsonl"
+
+    def test_normalize_sql(self):
+        from matchup.slow_queries import normalize_sql
+        sql = (
+            'SELECT "cards"."name" FROM "cards" WHERE "cards"."uuid" IN (%s, %s) '
+            "AND \"cards\".\"name\" = 'Bolt'  LIMIT 21"
+        )
+        self.assertEqual(
+            normalize_sql(sql),
+            'SELECT "cards"."name" FROM "cards" WHERE "cards"."uuid" IN (...) '
+            'AND "cards"."name" = ? LIMIT ?',
+        )
+
+    def test_slow_query_logged_with_plan(self):
+        from matchup.slow_queries import read_log
+        with self.settings(SLOW_QUERY_THRESHOLD_MS=0, SLOW_QUERY_LOG=self.log_path):
+            with self.assertLogs("matchup.slow_queries", "WARNING"):
+                list(Matchup.objects.filter(card_1_uuid=CARD_1_UUID))
+
+        records = read_log(self.log_path)
+        selects = [r for r in records if "matchup_matchup" in r["sql"]]
+        self.assertEqual(len(selects), 1)
+        self.assertEqual(selects[0]["alias"], "default")
+        self.assertIn('"card_1_uuid" = ?', selects[0]["sql"])
+        self.assertTrue(any("SCAN" in line or "SEARCH" in line for line in selects[0]["plan"]))
+
+    def test_fast_query_not_logged(self):
+        with self.settings(SLOW_QUERY_THRESHOLD_MS=60_000, SLOW_QUERY_LOG=self.log_path):
+            list(Matchup.objects.all())
+        self.assertFalse(self.log_path.exists())
+
+    def test_log_rotates_at_max_size(self):
+        from pathlib import Path
+        from matchup.slow_queries import read_log
+        rotated = Path(f"{self.log_path}.1")
+        with self.settings(SLOW_QUERY_THRESHOLD_MS=0, SLOW_QUERY_LOG=self.log_path,
+                           SLOW_QUERY_LOG_MAX_BYTES=1):
+            with self.assertLogs("matchup.slow_queries", "WARNING"):
+                for _ in range(3):
+                    list(Matchup.objects.filter(card_1_uuid=CARD_1_UUID))
+        # Every append found a full log, so only the last two records remain.
+        self.assertEqual(len(self.log_path.read_text().splitlines()), 1)
+        self.assertEqual(len(rotated.read_text().splitlines()), 1)
+        self.assertEqual(len(read_log(self.log_path)), 2)
+
+        self.log_path.unlink()
+        self.assertEqual(len(read_log(self.log_path)), 1)
+        rotated.unlink()
+        with self.assertRaises(FileNotFoundError):
+            read_log(self.log_path)
+
+    def test_command_summarizes_by_total_time(self):
+        import json
+        from io import StringIO
+        with open(self.log_path, "w") as f:
+            for ms, sql in [(5, "SELECT a"), (30, "SELECT b"), (40, "SELECT a")]:
+                f.write(json.dumps({"alias": "mtgjson", "ms": ms, "sql": sql, "plan": []}) + "\n")
+
+        out = StringIO()
+        call_command("slow_queries", "--log", str(self.log_path), stdout=out)
+        output = out.getvalue()
+        self.assertIn("3 slow queries, 2 distinct statements", output)
+        self.assertLess(output.index("SELECT a"), output.index("SELECT b"))
+
+
+class StressVotesTest(TestCase):
+    def test_stress_run_reports_consistency(self):
+        """Spawn real worker processes against a temporary file database."""
+        import tempfile
+        from pathlib import Path
+        from matchup import stress
+
+        with tempfile.TemporaryDirectory() as tmp:
+            report = stress.run(
+                Path(tmp), processes=2, votes_per_process=5, num_cards=10, timeout=5.0,
+            )
+
+        self.assertEqual(report.attempted, 10)
+        self.assertEqual(report.votes + report.busy_errors + report.other_errors, 10)
+        self.assertEqual(report.vote_rows, report.votes)
+        self.assertEqual(sum(count for _, count in report.histogram()), len(report.latencies_ms))
+        self.assertGreaterEqual(report.lost_wins, 0)
+
+
+class RateLimitTest(TestCase):
+    def setUp(self):
+        import tempfile
+        from pathlib import Path
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.db_path = Path(tmp.name) / "ratelimit.sqlite3"
+
+    def test_bucket_refills_over_time(self):
+        from matchup.ratelimit import TokenBucketStore
+        store = TokenBucketStore(self.db_path)
+        self.assertEqual(store.take("k", rate=1.0, burst=2, now=100.0), (True, 0.0))
+        self.assertEqual(store.take("k", rate=1.0, burst=2, now=100.0), (True, 0.0))
+        allowed, retry_after = store.take("k", rate=1.0, burst=2, now=100.0)
+        self.assertFalse(allowed)
+        self.assertAlmostEqual(retry_after, 1.0)
+        # Half a second later there is still not a whole token
+        self.assertFalse(store.take("k", rate=1.0, burst=2, now=100.5)[0])
+        self.assertTrue(store.take("k", rate=1.0, burst=2, now=101.0)[0])
+        # Other keys have their own bucket
+        self.assertTrue(store.take("other", rate=1.0, burst=2, now=101.0)[0])
+
+    def test_buckets_shared_between_store_instances(self):
+        from matchup.ratelimit import TokenBucketStore
+        TokenBucketStore(self.db_path).take("k", rate=0.001, burst=1, now=100.0)
+        self.assertFalse(TokenBucketStore(self.db_path).take("k", rate=0.001, burst=1, now=100.0)[0])
+
+    @patch("matchup.views._update_elo")
+    def test_middleware_rejects_before_view(self, mock_elo):
+        with self.settings(RATE_LIMIT_DB=self.db_path, RATE_LIMITS={"POST": (0.001, 2)}):
+            statuses = [
+                self.client.post("/", {}, HTTP_X_FORWARDED_FOR="203.0.113.9").status_code
+                for _ in range(3)
+            ]
+            other_ip = self.client.post("/", {}, HTTP_X_FORWARDED_FOR="203.0.113.10")
+
+        # The first two reach the view (which rejects the empty form)
+        self.assertEqual(statuses, [400, 400, 429])
+        self.assertEqual(other_ip.status_code, 400)
+
+    @patch("matchup.views._update_elo")
+    def test_spoofed_forwarded_for_shares_the_bucket(self, mock_elo):
+        with self.settings(RATE_LIMIT_DB=self.db_path, RATE_LIMITS={"POST": (0.001, 2)}):
+            statuses = [
+                self.client.post(
+                    "/", {}, HTTP_X_FORWARDED_FOR=f"10.9.8.{i}, 203.0.113.9"
+                ).status_code
+                for i in range(3)
+            ]
+        self.assertEqual(statuses, [400, 400, 429])
+
+    def test_disabled_without_store(self):
+        with self.settings(RATE_LIMIT_DB=None, RATE_LIMITS={"POST": (0.001, 1)}):
+            statuses = [self.client.post("/", {}).status_code for _ in range(3)]
+        self.assertEqual(statuses, [400, 400, 400])
+
+
+class RatingIndexTest(TestCase):
+    def test_neighbor_within_delta(self):
+        import random
+        from matchup.selection import RatingIndex
+        index = RatingIndex(
+            [("A", 1000.0, 50), ("B", 1490.0, 50), ("C", 1500.0, 50),
+             ("D", 1520.0, 50), ("E", 2000.0, 50)],
+        )
+        rng = random.Random(1)
+        c = index.names.index("C")
+        neighbors = {index.names[index.sample_neighbor(c, 50, rng)] for _ in range(100)}
+        self.assertEqual(neighbors, {"B", "D"})
+
+    def test_isolated_card_falls_back_to_adjacent(self):
+        import random
+        from matchup.selection import RatingIndex
+        index = RatingIndex([("A", 1000.0, 0), ("B", 1500.0, 0), ("C", 2000.0, 0)])
+        a = index.names.index("A")
+        self.assertEqual(index.names[index.sample_neighbor(a, 10, random.Random(1))], "B")
+
+    def test_anchor_prefers_few_games_and_boundary(self):
+        import random
+        from collections import Counter
+        from matchup.selection import RatingIndex
+        entries = [(f"card{i}", 1500.0 + i, 1000) for i in range(20)]
+        entries.append(("new", 1400.0, 0))
+        index = RatingIndex(entries, boundary_rank=1, boundary_width=0)
+        rng = random.Random(7)
+        counts = Counter(index.names[index.sample_anchor(rng)] for _ in range(2000))
+        # "new" (weight 1) and the rank-1 card (weight ~1) dominate the rest (~0.001 each)
+        self.assertGreater(counts["new"], 800)
+        self.assertGreater(counts["card19"], 800)
+
+    def test_sample_pair_needs_two_cards(self):
+        import random
+        from matchup.selection import RatingIndex
+        self.assertIsNone(RatingIndex([("A", 1500.0, 0)]).sample_pair(100, random.Random()))
+
+
+class ActiveMatchupTest(TestCase):
+    databases = {"default", "mtgjson"}
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        _create_mtgjson_tables()
+
+    def setUp(self):
+        from matchup.selection import clear_rating_index
+        clear_rating_index()
+        self.addCleanup(clear_rating_index)
+        _seed_card(CARD_1_UUID, "Lightning Bolt", "aaaaaaaa-1111-1111-1111-111111111111")
+        _seed_card(CARD_2_UUID, "Black Lotus", "bbbbbbbb-2222-2222-2222-222222222222")
+        _seed_card("cccccccc-3333-3333-3333-333333333333", "Unrated Card",
+                   "cccccccc-3333-3333-3333-333333333333")
+        CardRating.objects.create(name="Lightning Bolt", rating=1600, wins=1, losses=0)
+        CardRating.objects.create(name="Black Lotus", rating=1590, wins=0, losses=1)
+
+    def test_active_strategy_pairs_rated_cards(self):
+        from matchup.views import _get_random_matchup
+        with self.settings(MATCHUP_STRATEGY="active", MATCHUP_EXPLORATION=0.0):
+            for _ in range(10):
+                card1, card2 = _get_random_matchup()
+                self.assertEqual(
+                    {card1["name"], card2["name"]}, {"Lightning Bolt", "Black Lotus"}
+                )
+
+    def test_active_strategy_falls_back_to_uniform(self):
+        from matchup.views import _get_random_matchup
+        CardRating.objects.filter(name="Black Lotus").delete()
+        with self.settings(MATCHUP_STRATEGY="active", MATCHUP_EXPLORATION=0.0):
+            card1, card2 = _get_random_matchup()
+        self.assertIsNotNone(card1)
+        self.assertIsNotNone(card2)
+
+
+class RankingMetricsTest(TestCase):
+    def _brute_force_tau(self, x, y):
+        n = len(x)
+        score = 0
+        for i in range(n):
+            for j in range(i + 1, n):
+                s = (x[i] - x[j]) * (y[i] - y[j])
+                score += (s > 0) - (s < 0)
+        return score / (n * (n - 1) / 2)
+
+    def test_kendall_tau_matches_brute_force(self):
+        import random
+        from matchup.metrics import kendall_tau
+        rng = random.Random(3)
+        for _ in range(20):
+            x = [rng.randint(0, 10) for _ in range(40)]
+            y = [rng.randint(0, 10) for _ in range(40)]
+            self.assertAlmostEqual(kendall_tau(x, y), self._brute_force_tau(x, y))
+
+    def test_kendall_tau_extremes(self):
+        from matchup.metrics import kendall_tau
+        self.assertEqual(kendall_tau([1, 2, 3], [10, 20, 30]), 1.0)
+        self.assertEqual(kendall_tau([1, 2, 3], [30, 20, 10]), -1.0)
+
+    def test_top_k_overlap(self):
+        from matchup.metrics import top_k_overlap
+        self.assertEqual(top_k_overlap(["a", "b", "c", "d"], ["b", "a", "d", "c"], 2), 1.0)
+        self.assertEqual(top_k_overlap(["a", "b", "c", "d"], ["a", "c", "b", "d"], 2), 0.5)
+
+
+class SimulationTest(TestCase):
+    def test_simulation_converges_on_small_pool(self):
+        from matchup.simulation import SimulationConfig, run
+        config = SimulationConfig(
+            num_cards=50, top_k=10, max_votes=20_000, check_every=500,
+            target_tau=0.5, target_precision=0.7, noise=0.3,
+        )
+        [result] = run([1], config, workers=1)
+        self.assertIsNotNone(result.votes_to_precision)
+        self.assertIsNotNone(result.votes_to_tau)
+        self.assertLess(result.votes, config.max_votes)
+
+    def test_simulation_is_deterministic_per_seed(self):
+        from matchup.simulation import SimulationConfig, simulate
+        config = SimulationConfig(
+            num_cards=30, top_k=5, max_votes=1000, check_every=250, strategy="active",
+        )
+        self.assertEqual(simulate(4, config).trace, simulate(4, config).trace)
+
+    def test_simulation_without_votes(self):
+        from matchup.simulation import SimulationConfig, simulate
+        result = simulate(1, SimulationConfig(num_cards=10, top_k=3, max_votes=0))
+        self.assertEqual((result.votes, result.trace), (0, []))
+
+
+class RatingEngineTest(TestCase):
+    def test_elo_engine_matches_elo_module(self):
+        from matchup.rating_engines import RatingState, get_engine
+        a, b = get_engine("elo").update(RatingState(), RatingState(), a_won=True)
+        self.assertEqual((a.rating, b.rating), update_ratings(1500.0, 1500.0, True))
+        self.assertEqual((a.games, b.games), (1, 1))
+        self.assertEqual(a.deviation, RatingState().deviation)
+
+    def test_provisional_k_moves_new_cards_faster(self):
+        from matchup.rating_engines import RatingState, get_engine
+        engine = get_engine("elo-provisional")
+        new, _ = engine.update(RatingState(games=0), RatingState(games=100), a_won=True)
+        settled, _ = engine.update(RatingState(games=100), RatingState(games=100), a_won=True)
+        self.assertGreater(new.rating - 1500, settled.rating - 1500)
+        self.assertAlmostEqual(settled.rating, 1516.0)
+
+    def test_glicko2_shrinks_deviation(self):
+        from matchup.rating_engines import RatingState, get_engine
+        engine = get_engine("glicko2")
+        a, b = engine.update(RatingState(), RatingState(), a_won=True)
+        self.assertGreater(a.rating, 1500)
+        self.assertLess(b.rating, 1500)
+        self.assertAlmostEqual(a.rating - 1500, 1500 - b.rating)
+        self.assertLess(a.deviation, 350)
+        self.assertGreater(a.volatility, 0)
+
+    def test_glicko2_uncertain_card_moves_more(self):
+        from matchup.rating_engines import RatingState, get_engine
+        engine = get_engine("glicko2")
+        uncertain, _ = engine.update(RatingState(deviation=300), RatingState(deviation=50), a_won=True)
+        certain, _ = engine.update(RatingState(deviation=50), RatingState(deviation=50), a_won=True)
+        self.assertGreater(uncertain.rating, certain.rating)
+
+    def test_unknown_engine(self):
+        from matchup.rating_engines import get_engine
+        with self.assertRaises(ValueError):
+            get_engine("trueskill")
+
+
+class RatingEngineVoteTest(TestCase):
+    databases = {"default", "mtgjson"}
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        _create_mtgjson_tables()
+
+    def setUp(self):
+        _seed_card(CARD_1_UUID, "Lightning Bolt", "aaaaaaaa-1111-1111-1111-111111111111")
+        _seed_card(CARD_2_UUID, "Black Lotus", "bbbbbbbb-2222-2222-2222-222222222222")
+
+    def _vote(self, chosen):
+        m = Matchup.objects.create(card_1_uuid=CARD_1_UUID, card_2_uuid=CARD_2_UUID)
+        self.client.post("/", {"matchup_token": str(m.token), "chosen_uuid": chosen})
+
+    def test_vote_path_uses_configured_engine(self):
+        with self.settings(RATING_ENGINE="glicko2"):
+            self._vote(CARD_1_UUID)
+        bolt = CardRating.objects.get(name="Lightning Bolt")
+        self.assertLess(bolt.deviation, 350)
+        self.assertEqual(bolt.wins, 1)
+
+    def test_recalculate_with_engine_matches_live(self):
+        from io import StringIO
+        with self.settings(RATING_ENGINE="glicko2"):
+            self._vote(CARD_1_UUID)
+            self._vote(CARD_2_UUID)
+        live = CardRating.objects.get(name="Black Lotus")
+
+        call_command("recalculate_elo", "--engine", "glicko2", stdout=StringIO())
+        recalc = CardRating.objects.get(name="Black Lotus")
+        self.assertAlmostEqual(live.rating, recalc.rating, places=6)
+        self.assertAlmostEqual(live.deviation, recalc.deviation, places=6)
+        self.assertAlmostEqual(live.volatility, recalc.volatility, places=6)
+
+    def test_tally_engine_preview_does_not_save(self):
+        from io import StringIO
+        self._vote(CARD_1_UUID)
+        before = list(CardRating.objects.values_list("name", "rating"))
+
+        out = StringIO()
+        call_command("tally", "--engine", "elo-provisional", stdout=out)
+        self.assertIn("replayed with elo-provisional", out.getvalue())
+        self.assertIn("Lightning Bolt", out.getvalue())
+        self.assertEqual(list(CardRating.objects.values_list("name", "rating")), before)
+
+
+class ShadowSwapTest(TestCase):
+    databases = {"default", "mtgjson"}
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        _create_mtgjson_tables()
+
+    def setUp(self):
+        _seed_card(CARD_1_UUID, "Lightning Bolt", "aaaaaaaa-1111-1111-1111-111111111111")
+        _seed_card(CARD_2_UUID, "Black Lotus", "bbbbbbbb-2222-2222-2222-222222222222")
+
+    def _vote(self, chosen):
+        m = Matchup.objects.create(card_1_uuid=CARD_1_UUID, card_2_uuid=CARD_2_UUID)
+        self.client.post("/", {"matchup_token": str(m.token), "chosen_uuid": chosen})
+
+    def test_swap_table_replaces_rows_and_applies_catch_up(self):
+        from django.db import IntegrityError
+        from matchup.shadow import swap_table
+        CardRating.objects.create(name="Stale Card", rating=9999)
+
+        written = swap_table(
+            CardRating,
+            [{"name": "A", "rating": 1600.0}, {"name": "B", "rating": 1400.0}],
+            key=("name",),
+            catch_up=lambda: [{"name": "B", "rating": 1450.0, "wins": 1}, {"name": "C"}],
+        )
+
+        self.assertEqual(written, 2)
+        self.assertEqual(
+            dict(CardRating.objects.values_list("name", "rating")),
+            {"A": 1600.0, "B": 1450.0, "C": 1500.0},
+        )
+        self.assertEqual(CardRating.objects.get(name="B").wins, 1)
+        # The unique constraint on name came along with the schema
+        with self.assertRaises(IntegrityError):
+            CardRating.objects.create(name="A")
+
+    def test_votes_during_rebuild_are_applied(self):
+        from matchup.shadow import swap_table
+        self._vote(CARD_1_UUID)
+        self._vote(CARD_2_UUID)
+
+        def swap_with_live_vote(*args, **kwargs):
+            # A vote lands on the live table after the replay finished
+            self._vote(CARD_1_UUID)
+            return swap_table(*args, **kwargs)
+
+        with patch(
+            "matchup.management.commands.recalculate_elo.swap_table",
+            side_effect=swap_with_live_vote,
+        ):
+            from io import StringIO
+            out = StringIO()
+            call_command("recalculate_elo", stdout=out)
+
+        self.assertIn("1 cast during the rebuild", out.getvalue())
+        bolt = CardRating.objects.get(name="Lightning Bolt")
+        self.assertEqual((bolt.wins, bolt.losses), (2, 1))
+
+        # Same result as a clean replay of all three votes
+        call_command("recalculate_elo", stdout=StringIO())
+        self.assertAlmostEqual(bolt.rating, CardRating.objects.get(name="Lightning Bolt").rating)
+
+
+class ReplayTest(TestCase):
+    databases = {"default", "mtgjson"}
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        _create_mtgjson_tables()
+
+    def setUp(self):
+        _seed_card(CARD_1_UUID, "Lightning Bolt", "aaaaaaaa-1111-1111-1111-111111111111")
+        _seed_card(CARD_2_UUID, "Black Lotus", "bbbbbbbb-2222-2222-2222-222222222222")
+        # A second printing of Bolt shares its rating
+        _seed_card("bolt2222-2222-2222-2222-222222222222", "Lightning Bolt",
+                   "cccccccc-3333-3333-3333-333333333333")
+        for card_1, chosen in [
+            (CARD_1_UUID, CARD_1_UUID),
+            ("bolt2222-2222-2222-2222-222222222222", CARD_2_UUID),
+            (CARD_1_UUID, CARD_1_UUID),
+            ("unknown-uuid", "unknown-uuid"),
+            ("bolt2222-2222-2222-2222-222222222222", "bolt2222-2222-2222-2222-222222222222"),
+        ]:
+            Vote.objects.create(card_1_uuid=card_1, card_2_uuid=CARD_2_UUID,
+                                chosen_uuid=chosen, ip_address="127.0.0.1")
+
+    def test_replay_interns_names_across_printings(self):
+        from matchup.rating_engines import get_engine
+        from matchup.replay import replay_votes
+        result = replay_votes(get_engine("elo"))
+        self.assertEqual(result.votes, 5)
+        self.assertEqual(sorted(result.names), ["Black Lotus", "Lightning Bolt"])
+        bolt = result.row(result.names.index("Lightning Bolt"))
+        self.assertEqual((bolt["wins"], bolt["losses"]), (3, 1))
+        self.assertEqual(result.state("Lightning Bolt").games, 4)
+
+    def test_chunked_replay_agrees(self):
+        from matchup import replay
+        from matchup.rating_engines import get_engine
+        engine = get_engine("glicko2")
+        whole = list(replay.replay_votes(engine).rows())
+
+        with patch.object(replay, "CHUNK_SIZE", 2):
+            chunked = list(replay.replay_votes(engine).rows())
+        self.assertEqual(chunked, whole)
+
+    def test_resumed_replay_agrees(self):
+        from matchup import replay
+        from matchup.rating_engines import get_engine
+        engine = get_engine("glicko2")
+        whole = list(replay.replay_votes(engine).rows())
+
+        # Replay the first three votes, then the two cast "later"
+        last = Vote.objects.order_by("pk").values_list("pk", flat=True)[2]
+        later = list(Vote.objects.filter(pk__gt=last).values())
+        Vote.objects.filter(pk__gt=last).delete()
+        partial = replay.replay_votes(engine)
+        Vote.objects.bulk_create([Vote(**row) for row in later])
+        touched = set()
+        replay.replay_votes(engine, partial, touched)
+
+        self.assertEqual(list(partial.rows()), whole)
+        self.assertEqual({partial.names[i] for i in touched}, {"Lightning Bolt", "Black Lotus"})
+
+
+@override_settings(
+    STORAGES={
+        "staticfiles": {
+            "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage",
+        },
+    }
+)
+class CanonicalPrintingTest(TestCase):
+    databases = {"default", "mtgjson"}
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        _create_mtgjson_tables()
+
+    def setUp(self):
+        from matchup.models import CardSet
+        CardSet.objects.using("mtgjson").bulk_create([
+            CardSet(code="OLD", name="Old Set", releaseDate="1994-01-01", type="core"),
+            CardSet(code="NEW", name="New Set", releaseDate="2024-01-01", type="expansion"),
+            CardSet(code="PRM", name="Promos", releaseDate="2025-01-01", type="promo"),
+        ])
+        _seed_card("bolt-old", "Lightning Bolt", "11111111-0000-0000-0000-000000000000",
+                   setCode="OLD", frameVersion="1993")
+        _seed_card("bolt-new", "Lightning Bolt", "22222222-0000-0000-0000-000000000000",
+                   setCode="NEW", frameVersion="2015")
+        _seed_card("bolt-promo", "Lightning Bolt", "33333333-0000-0000-0000-000000000000",
+                   setCode="PRM", frameVersion="2015", isPromo=True)
+        _seed_card("lotus", "Black Lotus", "44444444-0000-0000-0000-000000000000",
+                   setCode="OLD", frameVersion="1993")
+
+    def test_plain_printing_beats_treatments_in_the_same_set(self):
+        from matchup.canonical import best_printings, scryfall_ids
+        _seed_card("elf-a-plain", "Llanowar Elves", "55555555-0000-0000-0000-000000000000",
+                   setCode="NEW", frameVersion="2015", frameEffects="legendary")
+        for uuid, fields in [
+            ("elf-b-showcase", {"frameEffects": "legendary,showcase"}),
+            ("elf-c-extended", {"frameEffects": "extendedart"}),
+            ("elf-d-borderless", {"borderColor": "borderless"}),
+            ("elf-e-fullart", {"isFullArt": True}),
+        ]:
+            _seed_card(uuid, "Llanowar Elves", f"{uuid}-scryfall",
+                       setCode="NEW", frameVersion="2015", **fields)
+        self.assertEqual(best_printings(scryfall_ids())["Llanowar Elves"], "elf-a-plain")
+
+    def test_build_picks_preferred_printing(self):
+        from io import StringIO
+        from matchup.models import CanonicalPrinting
+        out = StringIO()
+        call_command("build_canonical_printings", stdout=out)
+        self.assertIn("2 card names", out.getvalue())
+        self.assertEqual(CanonicalPrinting.objects.get(name="Lightning Bolt").uuid, "bolt-new")
+        self.assertEqual(CanonicalPrinting.objects.get(name="Black Lotus").uuid, "lotus")
+
+        # Rebuilding replaces rather than duplicates
+        call_command("build_canonical_printings", stdout=StringIO())
+        self.assertEqual(CanonicalPrinting.objects.count(), 2)
+
+    def test_leaderboard_uses_canonical_image(self):
+        from io import StringIO
+        call_command("build_canonical_printings", stdout=StringIO())
+        CardRating.objects.create(name="Lightning Bolt", rating=1600)
+        response = self.client.get("/leaderboard/")
+        self.assertContains(response, "/2/2/22222222-0000-0000-0000-000000000000.jpg")
+
+
+class ImageCacheTest(TestCase):
+    def setUp(self):
+        import tempfile
+        from pathlib import Path
+        from matchup.image_cache import clear_image_cache
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.upstream = Path(self.tmp.name) / "upstream"
+        self.upstream.mkdir()
+        self.cache_dir = Path(self.tmp.name) / "cache"
+        for i in range(4):
+            (self.upstream / f"{i}0000000-0000-0000-0000-000000000000.jpg").write_bytes(b"x" * 100)
+        settings = override_settings(
+            CARD_IMAGE_PROXY=True,
+            CARD_IMAGE_UPSTREAM=self.upstream.as_uri() + "/{id}.jpg",
+            CARD_IMAGE_CACHE_DIR=self.cache_dir,
+            CARD_IMAGE_CACHE_BYTES=250,
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+        clear_image_cache()
+        self.addCleanup(clear_image_cache)
+
+    def test_serves_and_caches_image(self):
+        sid = "00000000-0000-0000-0000-000000000000"
+        response = self.client.get(f"/images/{sid}.jpg")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b"".join(response.streaming_content), b"x" * 100)
+        self.assertEqual(response["ETag"], f'"{sid}"')
+        self.assertIn("immutable", response["Cache-Control"])
+        self.assertTrue((self.cache_dir / f"{sid}.jpg").exists())
+
+        response = self.client.get(f"/images/{sid}.jpg", HTTP_IF_NONE_MATCH=f'"{sid}"')
+        self.assertEqual(response.status_code, 304)
+
+    def test_evicts_least_recently_used(self):
+        import os
+        from matchup.image_cache import get_image_cache
+        cache = get_image_cache()
+        sids = [f"{i}0000000-0000-0000-0000-000000000000" for i in range(4)]
+        for t, sid in enumerate(sids[:2]):
+            os.utime(cache.get(sid), (t, t))
+        cache.get(sids[0])  # hit: now the most recent
+        cache.get(sids[2])  # 300 bytes, over the limit
+        cached = sorted(p.stem for p in self.cache_dir.glob("*.jpg"))
+        self.assertEqual(cached, sorted([sids[0], sids[2]]))
+
+    def test_workers_rescan_for_each_others_writes(self):
+        from unittest import mock
+        from django.conf import settings
+        from matchup import image_cache
+        worker_1, worker_2 = (
+            image_cache.ImageCache(self.cache_dir, 250, settings.CARD_IMAGE_UPSTREAM)
+            for _ in range(2)
+        )
+        sids = [f"{i}0000000-0000-0000-0000-000000000000" for i in range(3)]
+        worker_1.get(sids[0])
+        worker_2.get(sids[1])
+        # Worker 1 has only counted its own 200 bytes, but a rescan is due.
+        with mock.patch.object(image_cache, "RESCAN_SECONDS", -1):
+            worker_1.get(sids[2])
+        self.assertLessEqual(sum(p.stat().st_size for p in self.cache_dir.iterdir()), 250)
+
+    def test_counts_and_cleans_up_temporary_files(self):
+        import os
+        from matchup.image_cache import get_image_cache
+        self.cache_dir.mkdir()
+        stale = self.cache_dir / "crashed.tmp"
+        stale.write_bytes(b"x" * 1000)
+        os.utime(stale, (0, 0))
+        in_flight = self.cache_dir / "writing.tmp"
+        in_flight.write_bytes(b"x" * 100)
+
+        cache = get_image_cache()
+        cache.get("00000000-0000-0000-0000-000000000000")
+        self.assertFalse(stale.exists())
+        self.assertTrue(in_flight.exists())
+        self.assertEqual(cache._size, 200)
+
+    def test_rejects_oversized_image(self):
+        from unittest import mock
+        from matchup import image_cache
+        sid = "00000000-0000-0000-0000-000000000000"
+        with mock.patch.object(image_cache, "MAX_IMAGE_BYTES", 99):
+            with self.assertLogs("matchup.views", "WARNING"):
+                response = self.client.get(f"/images/{sid}.jpg")
+        self.assertEqual(response.status_code, 502)
+        self.assertFalse(self.cache_dir.exists() and any(self.cache_dir.iterdir()))
+
+    def test_upstream_miss_and_disabled(self):
+        with self.assertLogs("matchup.views", "WARNING"):
+            response = self.client.get("/images/ffffffff-0000-0000-0000-000000000000.jpg")
+        self.assertEqual(response.status_code, 502)
+        sid = "00000000-0000-0000-0000-000000000000"
+        with override_settings(CARD_IMAGE_PROXY=False):
+            response = self.client.get(f"/images/{sid}.jpg")
+            self.assertEqual(response.status_code, 404)
+            response = self.client.get(f"/images/{sid}.jpg", HTTP_IF_NONE_MATCH=f'"{sid}"')
+            self.assertEqual(response.status_code, 404)
+
+    def test_head(self):
+        response = self.client.head("/images/00000000-0000-0000-0000-000000000000.jpg")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "image/jpeg")
+
+
+@override_settings(
+    STORAGES={
+        "staticfiles": {
+            "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage",
+        },
+    }
+)
+class RatingVersionTest(TestCase):
+    databases = {"default", "mtgjson"}
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        _create_mtgjson_tables()
+
+    def setUp(self):
+        _seed_card(CARD_1_UUID, "Lightning Bolt", "aaaaaaaa-1111-1111-1111-111111111111")
+        _seed_card(CARD_2_UUID, "Black Lotus", "bbbbbbbb-2222-2222-2222-222222222222")
+
+    def _vote(self):
+        m = Matchup.objects.create(card_1_uuid=CARD_1_UUID, card_2_uuid=CARD_2_UUID)
+        self.client.post("/", {"matchup_token": str(m.token), "chosen_uuid": CARD_1_UUID})
+
+    def test_leaderboard_not_modified_until_vote(self):
+        from matchup.models import RatingVersion
+        self._vote()
+        self.assertEqual(RatingVersion.current().version, 1)
+        response = self.client.get("/leaderboard/")
+        etag = response["ETag"]
+        self.assertEqual(etag, '"v1"')
+        self.assertIn("Last-Modified", response)
+
+        response = self.client.get("/leaderboard/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        self._vote()
+        response = self.client.get("/leaderboard/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["ETag"], '"v2"')
+
+    def test_recalculate_bumps_version(self):
+        from io import StringIO
+        from matchup.models import RatingVersion
+        self._vote()
+        call_command("recalculate_elo", stdout=StringIO())
+        self.assertEqual(RatingVersion.current().version, 2)
+
+    def test_export_json_and_csv(self):
+        self._vote()
+        response = self.client.get("/leaderboard/export.json")
+        data = response.json()
+        self.assertEqual(data["version"], 1)
+        self.assertEqual([c["name"] for c in data["cards"]], ["Lightning Bolt", "Black Lotus"])
+        self.assertEqual(data["cards"][0]["rank"], 1)
+
+        response = self.client.get("/leaderboard/export.csv")
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], "rank,name,rating,deviation,wins,losses")
+        self.assertTrue(lines[1].startswith("1,Lightning Bolt,"))
+
+        response = self.client.get("/leaderboard/export.csv", HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(self.client.get("/leaderboard/export.xml").status_code, 404)
+
+
+class CardPoolTest(TestCase):
+    databases = {"default", "mtgjson"}
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        _create_mtgjson_tables()
+
+    def setUp(self):
+        import tempfile
+        from pathlib import Path
+        from matchup.cardpool import clear_card_pool
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = Path(tmp.name) / "cardpool.bin"
+        self.addCleanup(clear_card_pool)
+
+        _seed_card(CARD_1_UUID, "Lightning Bolt", "aaaaaaaa-1111-1111-1111-111111111111")
+        _seed_card(CARD_2_UUID, "Black Lotus", "bbbbbbbb-2222-2222-2222-222222222222")
+        _seed_card("cccccccc-3333-3333-3333-333333333333", "Forest",
+                   "cccccccc-3333-3333-3333-333333333333", supertypes="Basic")
+        _seed_card("dddddddd-4444-4444-4444-444444444444", "No Image", "")
+        _seed_card("eeeeeeee-5555-5555-5555-555555555555", "Digital Card",
+                   "eeeeeeee-5555-5555-5555-555555555555", availability="mtgo")
+
+    def test_snapshot_round_trip(self):
+        from io import StringIO
+        from matchup.cardpool import CardPool, mtgjson_fingerprint
+        out = StringIO()
+        call_command("build_card_pool", "--output", str(self.path), stdout=out)
+        self.assertIn("Wrote 3 cards", out.getvalue())
+
+        pool = CardPool.open(self.path)
+        self.assertEqual(pool.fingerprint, mtgjson_fingerprint())
+        self.assertEqual(
+            sorted(pool.name(i) for i in range(len(pool))),
+            ["Black Lotus", "Forest", "Lightning Bolt"],
+        )
+        forest = [i for i in range(len(pool)) if pool.name(i) == "Forest"][0]
+        self.assertTrue(pool.is_basic_land(forest))
+        self.assertEqual(pool.card_info(forest)["uuid"], "cccccccc-3333-3333-3333-333333333333")
+
+    def test_stale_snapshot_falls_back_until_rebuilt(self):
+        import mmap
+        from io import StringIO
+        from matchup.cardpool import COLUMNS, CardPool, get_card_pool
+        from matchup.views import _get_uniform_matchup
+        stale = ("u", "Stale", "s") + ("",) * (len(COLUMNS) - 3)
+        self.path.write_bytes(CardPool.pack([stale], b"\0" * 32))
+        with override_settings(CARD_POOL=True, CARD_POOL_PATH=self.path):
+            with self.assertLogs("matchup.cardpool", "WARNING"):
+                self.assertIsNone(get_card_pool())
+            # Matchups come from the database meanwhile.
+            card1, card2 = _get_uniform_matchup()
+            self.assertNotEqual(card1["uuid"], card2["uuid"])
+
+            call_command("build_card_pool", "--output", str(self.path), stdout=StringIO())
+            self.assertIsNone(get_card_pool())  # not looked for again yet
+            with patch("matchup.cardpool._next_check", 0.0):  # ...until now
+                self.assertIsInstance(get_card_pool()._buffer, mmap.mmap)
+
+    def test_uniform_matchup_from_pool(self):
+        from matchup.views import _get_uniform_matchup
+        with override_settings(CARD_POOL=True, CARD_POOL_PATH=None):
+            _get_uniform_matchup()  # loads the pool
+            with self.assertNumQueries(0, using="mtgjson"):
+                for _ in range(10):
+                    card1, card2 = _get_uniform_matchup()
+                    self.assertNotEqual(card1["uuid"], card2["uuid"])
+                    self.assertIn("cards.scryfall.io", card1["image_url"])
+
+    def test_shared_pool_resolves_uuids(self):
+        from matchup.cardpool import CardPool, build_card_pool
+        pool = CardPool.shared(build_card_pool())
+        i = pool.find(CARD_2_UUID)
+        self.assertEqual(pool.name(i), "Black Lotus")
+        self.assertIsNone(pool.find("dddddddd-4444-4444-4444-444444444444"))
+        self.assertIsNone(pool.find("ffffffff"))
+
+    def test_vote_resolves_names_from_pool(self):
+        from matchup.cardpool import get_card_pool
+        from matchup.views import _update_elo
+        with override_settings(CARD_POOL=True, CARD_POOL_PATH=None):
+            get_card_pool()
+            with self.assertNumQueries(0, using="mtgjson"):
+                _update_elo(CARD_1_UUID, CARD_2_UUID, CARD_1_UUID)
+        self.assertEqual(CardRating.objects.get(name="Lightning Bolt").wins, 1)
+
+    def test_names_show_preferred_printing(self):
+        import random
+        from matchup.cardpool import CardPool, build_card_pool
+        from matchup.views import _get_pool_matchup
+        for k in range(6, 9):
+            uuid = f"ffffffff-{k}{k}{k}{k}-0000-0000-000000000000"
+            _seed_card(uuid, "Lightning Bolt", uuid, isPromo=True)
+        pool = CardPool.shared(build_card_pool())
+
+        self.assertEqual(len(pool), 6)
+        self.assertEqual(pool.name_count, 3)
+        names = {pool.name(pool.representative(k)): k for k in range(pool.name_count)}
+        self.assertEqual(sorted(names), ["Black Lotus", "Forest", "Lightning Bolt"])
+        self.assertEqual(pool.printings(names["Lightning Bolt"]), 4)
+        self.assertEqual(pool.uuid(pool.representative(names["Lightning Bolt"])), CARD_1_UUID)
+
+        rng = random.Random(0)
+        by_printings = pool.sampler("name", 1, {})
+        bolts = sum(pool.name(by_printings.draw(rng)) == "Lightning Bolt" for _ in range(3000))
+        self.assertAlmostEqual(bolts / 3000, 4 / 6, delta=0.03)
+
+        shown = set()
+        for _ in range(30):
+            card1, card2 = _get_pool_matchup(pool)
+            shown.update((card1["uuid"], card2["uuid"]))
+        self.assertIn(CARD_1_UUID, shown)
+        self.assertFalse(any(uuid.startswith("ffffffff") for uuid in shown))
+
+    def test_pool_matchups_never_pair_a_card_with_itself(self):
+        from matchup.cardpool import CardPool, build_card_pool
+        from matchup.models import CardHourlyStat, PairStat
+        from matchup.views import _get_pool_matchup, _update_elo
+        reprint = "ffffffff-6666-0000-0000-000000000000"
+        for uuid in (reprint, "ffffffff-7777-0000-0000-000000000000"):
+            _seed_card(uuid, "Lightning Bolt", uuid, setCode="M10")
+        pool = CardPool.shared(build_card_pool())
+        with override_settings(MATCHUP_SAMPLE_BY="printing"):
+            for selection in (None, pool.select({"rarity": ["common"]})):
+                for _ in range(30):
+                    card1, card2 = _get_pool_matchup(pool, selection)
+                    self.assertNotEqual(card1["name"], card2["name"])
+        # Only Bolts: no matchup rather than Bolt against Bolt.
+        self.assertEqual(_get_pool_matchup(pool, pool.select({"set": ["M10"]})), (None, None))
+
+        _update_elo(CARD_1_UUID, reprint, CARD_1_UUID)
+        self.assertFalse(CardRating.objects.exists())
+        self.assertFalse(PairStat.objects.exists())
+        self.assertFalse(CardHourlyStat.objects.exists())
+
+    def test_alias_sampler_matches_weights(self):
+        import random
+        from collections import Counter
+        from matchup.cardpool import AliasSampler
+        weights = [1, 2, 3, 4, 0, 10]
+        sampler = AliasSampler(weights, values="abcdef")
+        self.assertEqual(len(sampler), 5)
+
+        rng = random.Random(42)
+        draws = 200_000
+        counts = Counter(sampler.draw(rng) for _ in range(draws))
+        self.assertNotIn("e", counts)
+        total = sum(weights)
+        chi_square = sum(
+            (counts[v] - draws * w / total) ** 2 / (draws * w / total)
+            for v, w in zip("abcdef", weights) if w
+        )
+        # 4 degrees of freedom: p = 0.001 at 18.47
+        self.assertLess(chi_square, 18.47)
+        self.assertEqual(sorted(sampler.sample(5, rng)), list("abcdf"))
+
+    def test_category_weights(self):
+        from matchup.cardpool import CardPool, build_card_pool
+        pool = CardPool.shared(build_card_pool())
+        self.assertEqual(pool.category(pool.find("cccccccc-3333-3333-3333-333333333333")), "basic")
+        self.assertEqual(pool.category(pool.find(CARD_1_UUID)), "common")
+
+        sampler = pool.sampler("name", 0, {"basic": 0})
+        self.assertEqual(len(sampler), 2)
+        for _ in range(20):
+            self.assertEqual(
+                sorted(pool.name(i) for i in sampler.sample(2)), ["Black Lotus", "Lightning Bolt"]
+            )
+        self.assertIs(pool.sampler("name", 0, {"basic": 0}), sampler)
+
+
+class MtgjsonFastPathTest(TestCase):
+    databases = {"default", "mtgjson"}
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        _create_mtgjson_tables()
+
+    def setUp(self):
+        _seed_card(CARD_1_UUID, "Lightning Bolt", "aaaaaaaa-1111-1111-1111-111111111111")
+        _seed_card(CARD_2_UUID, "Black Lotus", "")
+        _seed_card("cccccccc-3333-3333-3333-333333333333", "Lightning Bolt",
+                   "cccccccc-3333-3333-3333-333333333333", isFunny=True)
+        _seed_card("dddddddd-4444-4444-4444-444444444444", "Forest",
+                   "dddddddd-4444-4444-4444-444444444444", side="b")
+
+    def test_random_printings_are_eligible(self):
+        from matchup import mtgjson
+        eligible = set(Card.objects.using("mtgjson").eligible().values_list("uuid", flat=True))
+        printings = mtgjson.random_printings(10)
+        self.assertEqual({p.uuid for p in printings}, eligible)
+        self.assertEqual(
+            [p.uuid for p in mtgjson.random_printings_of("Lightning Bolt", 3)], [CARD_1_UUID]
+        )
+
+    def test_close_before_fork(self):
+        import os
+        import sqlite3
+        from matchup import mtgjson
+        conn = sqlite3.connect(":memory:")
+        mtgjson._local.connection, mtgjson._local.pid = conn, os.getpid()
+        mtgjson.close()
+        with self.assertRaises(sqlite3.ProgrammingError):
+            conn.execute("SELECT 1")
+        self.assertIsNone(mtgjson._local.connection)
+
+    def test_lookups(self):
+        from matchup import mtgjson
+        self.assertEqual(
+            mtgjson.names_of_pair(CARD_1_UUID, CARD_2_UUID),
+            {CARD_1_UUID: "Lightning Bolt", CARD_2_UUID: "Black Lotus"},
+        )
+        self.assertEqual(mtgjson.scryfall_id(CARD_1_UUID), "aaaaaaaa-1111-1111-1111-111111111111")
+        self.assertIsNone(mtgjson.scryfall_id(CARD_2_UUID))
+        self.assertIsNone(mtgjson.any_scryfall_id("Black Lotus"))
+        self.assertIsNotNone(mtgjson.any_scryfall_id("Lightning Bolt"))
+
+
+class PairStatTest(TestCase):
+    databases = {"default", "mtgjson"}
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        _create_mtgjson_tables()
+
+    def setUp(self):
+        _seed_card(CARD_1_UUID, "Lightning Bolt", "aaaaaaaa-1111-1111-1111-111111111111")
+        _seed_card(CARD_2_UUID, "Black Lotus", "bbbbbbbb-2222-2222-2222-222222222222")
+        _seed_card("cccccccc-3333-3333-3333-333333333333", "Lightning Bolt",
+                   "cccccccc-3333-3333-3333-333333333333")
+
+    def _vote(self, card_1, card_2, chosen):
+        m = Matchup.objects.create(card_1_uuid=card_1, card_2_uuid=card_2)
+        self.client.post("/", {"matchup_token": str(m.token), "chosen_uuid": chosen})
+
+    def test_votes_update_pair_and_backfill_agrees(self):
+        from io import StringIO
+        from matchup.models import PairStat
+        self._vote(CARD_1_UUID, CARD_2_UUID, CARD_1_UUID)
+        self._vote(CARD_2_UUID, "cccccccc-3333-3333-3333-333333333333", CARD_2_UUID)
+        self._vote(CARD_2_UUID, CARD_1_UUID, CARD_1_UUID)
+        # Two printings of the same card aren't a head-to-head
+        self._vote(CARD_1_UUID, "cccccccc-3333-3333-3333-333333333333", CARD_1_UUID)
+
+        pair = PairStat.objects.get()
+        self.assertEqual(
+            (pair.name_a, pair.name_b, pair.wins_a, pair.wins_b),
+            ("Black Lotus", "Lightning Bolt", 1, 2),
+        )
+
+        live = list(PairStat.objects.values("name_a", "name_b", "wins_a", "wins_b"))
+        PairStat.objects.all().delete()
+        out = StringIO()
+        call_command("backfill_pair_stats", stdout=out)
+        self.assertIn("into 1 pairs", out.getvalue())
+        self.assertEqual(list(PairStat.objects.values("name_a", "name_b", "wins_a", "wins_b")), live)
+
+        # The swapped-in table still takes upserts
+        self._vote(CARD_1_UUID, CARD_2_UUID, CARD_2_UUID)
+        self.assertEqual(PairStat.objects.get().wins_a, 2)
+
+    def test_backfill_catches_up_late_votes(self):
+        from io import StringIO
+        from matchup import pairstats
+        from matchup.models import PairStat
+        self._vote(CARD_1_UUID, CARD_2_UUID, CARD_1_UUID)
+
+        real_tally = pairstats.tally_pairs
+
+        def tally_then_vote(tally=None, touched=None):
+            result = real_tally(tally, touched)
+            if tally is None:
+                Vote.objects.create(card_1_uuid=CARD_2_UUID, card_2_uuid=CARD_1_UUID,
+                                    chosen_uuid=CARD_2_UUID, ip_address="127.0.0.1")
+            return result
+
+        with patch("matchup.management.commands.backfill_pair_stats.tally_pairs", tally_then_vote):
+            call_command("backfill_pair_stats", stdout=StringIO())
+        pair = PairStat.objects.get()
+        self.assertEqual((pair.wins_a, pair.wins_b), (1, 1))
+
+
+@override_settings(
+    STORAGES={
+        "staticfiles": {
+            "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage",
+        },
+    }
+)
+class TrendingTest(TestCase):
+    databases = {"default", "mtgjson"}
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        _create_mtgjson_tables()
+
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        _seed_card(CARD_1_UUID, "Lightning Bolt", "aaaaaaaa-1111-1111-1111-111111111111")
+        _seed_card(CARD_2_UUID, "Black Lotus", "bbbbbbbb-2222-2222-2222-222222222222")
+
+    def _vote(self, chosen):
+        m = Matchup.objects.create(card_1_uuid=CARD_1_UUID, card_2_uuid=CARD_2_UUID)
+        self.client.post("/", {"matchup_token": str(m.token), "chosen_uuid": chosen})
+
+    def test_votes_fill_hourly_buckets(self):
+        from matchup.models import CardHourlyStat
+        from matchup.trending import window_ranking
+        self._vote(CARD_1_UUID)
+        self._vote(CARD_1_UUID)
+        self._vote(CARD_2_UUID)
+        bolt = CardHourlyStat.objects.get(name="Lightning Bolt")
+        self.assertEqual((bolt.wins, bolt.appearances, bolt.hours), (2, 3, 1))
+        self.assertEqual(bolt.hour.minute, 0)
+
+        ranking = window_ranking("24h")
+        self.assertEqual([c["name"] for c in ranking], ["Lightning Bolt", "Black Lotus"])
+
+        response = self.client.get("/trending/?window=24h")
+        self.assertContains(response, "2 picks of 3")
+        self.assertEqual(self.client.get("/trending/?window=1y").status_code, 400)
+
+    def test_window_includes_the_buckets_it_starts_in(self):
+        from datetime import datetime, timezone as dt_timezone
+        from unittest import mock
+        from matchup.models import CardHourlyStat
+        from matchup.trending import window_ranking
+        now = datetime(2026, 3, 10, 15, 30, tzinfo=dt_timezone.utc)
+        for name, hour, hours in [
+            ("Lightning Bolt", datetime(2026, 3, 9, 15), 1),  # the window's first, partial hour
+            ("Black Lotus", datetime(2026, 3, 9, 14), 1),
+            ("Giant Growth", datetime(2026, 3, 3), 24),  # the 7d window's first, partial day
+            ("Shock", datetime(2026, 3, 2), 24),
+        ]:
+            CardHourlyStat.objects.create(name=name, hour=hour.replace(tzinfo=dt_timezone.utc),
+                                          hours=hours, wins=1, appearances=1)
+        with mock.patch("django.utils.timezone.now", return_value=now):
+            self.assertEqual([c["name"] for c in window_ranking("24h")], ["Lightning Bolt"])
+            self.assertEqual([c["name"] for c in window_ranking("7d")],
+                             ["Black Lotus", "Giant Growth", "Lightning Bolt"])
+
+    def test_compact_folds_and_expires(self):
+        from datetime import datetime, timedelta, timezone as dt_timezone
+        from matchup.models import CardHourlyStat
+        from matchup.trending import compact
+        now = datetime(2026, 3, 10, 15, 30, tzinfo=dt_timezone.utc)
+        day = datetime(2026, 3, 5, tzinfo=dt_timezone.utc)
+        for h in (0, 5, 23):
+            CardHourlyStat.objects.create(name="Lightning Bolt", hour=day + timedelta(hours=h),
+                                          wins=1, appearances=2)
+        recent = CardHourlyStat.objects.create(name="Lightning Bolt", hour=now.replace(minute=0),
+                                               wins=1, appearances=1)
+        CardHourlyStat.objects.create(name="Black Lotus", hour=now - timedelta(days=60),
+                                      wins=1, appearances=1)
+
+        self.assertEqual(compact(now, hourly_days=2, retention_days=35), (3, 1, 1))
+        daily = CardHourlyStat.objects.get(hour=day)
+        self.assertEqual((daily.hours, daily.wins, daily.appearances), (24, 3, 6))
+        self.assertTrue(CardHourlyStat.objects.filter(pk=recent.pk).exists())
+
+        # Running again finds nothing more to do
+        self.assertEqual(compact(now, hourly_days=2, retention_days=35), (0, 0, 0))
+
+
+@override_settings(
+    STORAGES={
+        "staticfiles": {
+            "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage",
+        },
+    }
+)
+class ThemedPoolTest(TestCase):
+    databases = {"default", "mtgjson"}
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        _create_mtgjson_tables()
+
+    def setUp(self):
+        from matchup.cardpool import clear_card_pool
+        self.addCleanup(clear_card_pool)
+        cards = [
+            ("Black Lotus", "LEA", "rare", "1993", None),
+            ("Lightning Bolt", "LEA", "common", "1993", None),
+            ("Forest", "LEA", "common", "1993", "Basic"),
+            ("Ragavan", "MH2", "mythic", "2015", "Legendary"),
+            ("Snow-Covered Forest", "MH2", "common", "2015", "Basic,Snow"),
+        ]
+        for n, (name, set_code, rarity, frame, supertypes) in enumerate(cards):
+            uid = f"{n:08x}-0000-0000-0000-000000000000"
+            _seed_card(uid, name, uid, setCode=set_code, rarity=rarity,
+                       frameVersion=frame, supertypes=supertypes)
+
+    def _pool(self):
+        from matchup.cardpool import CardPool, build_card_pool
+        return CardPool(build_card_pool())
+
+    def _names(self, pool, selection):
+        return sorted(pool.name(selection.nth(k)) for k in range(len(selection)))
+
+    def test_select_intersects_filters(self):
+        pool = self._pool()
+        self.assertEqual(
+            self._names(pool, pool.select({"set": ["LEA"], "rarity": ["common"]})),
+            ["Forest", "Lightning Bolt"],
+        )
+        self.assertEqual(
+            self._names(pool, pool.select({"supertype": ["Basic"], "frame": ["2015"]})),
+            ["Snow-Covered Forest"],
+        )
+        self.assertEqual(
+            self._names(pool, pool.select({"rarity": ["rare", "mythic"]})),
+            ["Black Lotus", "Ragavan"],
+        )
+        self.assertEqual(len(pool.select({"set": ["XXX"]})), 0)
+
+    def test_prepare_builds_single_value_themes_before_fork(self):
+        from matchup.cardpool import get_card_pool
+        from matchup.warmup import warm_up
+        with override_settings(CARD_POOL=True, CARD_POOL_PATH=None):
+            warm_up()
+            pool = get_card_pool()
+        self.assertEqual(set(pool._bitmaps), {"rarity", "set_code", "layout", "supertypes",
+                                              "frame_version"})
+        self.assertIn((("supertype", ("Snow",)),), pool._prepared)
+        mh2 = pool.select({"set": ["MH2"]})
+        self.assertIs(mh2, pool._prepared[(("set", ("MH2",)),)])
+        self.assertEqual(self._names(pool, mh2), ["Ragavan", "Snow-Covered Forest"])
+        self.assertEqual(pool._selections, {})
+
+    def test_nth_matches_bitmap(self):
+        import random
+        from matchup.cardpool import Selection
+        rng = random.Random(4)
+        size = 5000
+        bitmap = rng.getrandbits(size) & rng.getrandbits(size)  # about a quarter set
+        selection = Selection(bitmap, size)
+        expected = [i for i in range(size) if bitmap >> i & 1]
+        self.assertEqual(len(selection), len(expected))
+        self.assertEqual([selection.nth(k) for k in range(len(selection))], expected)
+
+    def test_themed_matchup_view(self):
+        with override_settings(CARD_POOL=True, CARD_POOL_PATH=None):
+            response = self.client.get("/?set=MH2")
+            self.assertEqual(response.status_code, 200)
+            names = {response.context["card1"]["name"], response.context["card2"]["name"]}
+            self.assertEqual(names, {"Ragavan", "Snow-Covered Forest"})
+
+            m = Matchup.objects.get()
+            response = self.client.post("/?set=MH2", {
+                "matchup_token": str(m.token), "chosen_uuid": m.card_1_uuid,
+            })
+            self.assertRedirects(response, "/?set=MH2", fetch_redirect_response=False)
+
+            response = self.client.get("/?rarity=uncommon")
+            self.assertContains(response, "Could not find cards.")
+
+
+def _named_card(name):
+    return {"uuid": str(uuid.uuid5(uuid.NAMESPACE_URL, name)), "name": name, "image_url": ""}
+
+
+@override_settings(
+    STORAGES={
+        "staticfiles": {
+            "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage",
+        },
+    }
+)
+class RepeatAvoidanceTest(TestCase):
+    def setUp(self):
+        from matchup.recent import clear_recent_pairs
+        clear_recent_pairs()
+        self.addCleanup(clear_recent_pairs)
+
+    def test_recent_pairs_rotate(self):
+        from matchup.recent import RecentPairs, pair_key
+        self.assertEqual(pair_key("a", "b"), pair_key("b", "a"))
+        # Not salted per process, so every worker and restart agrees.
+        self.assertEqual(pair_key("Shock", "Lightning Bolt"), 11917676298249140816)
+
+        pairs = RecentPairs(capacity=4, seconds=3600)
+        for key in range(1, 6):
+            pairs.add(key)
+        self.assertLessEqual(len(pairs), 4)
+        self.assertNotIn(1, pairs)
+        self.assertNotIn(2, pairs)
+        self.assertIn(3, pairs)
+        self.assertIn(5, pairs)
+
+        # Every add starts a new generation, keeping only the one before.
+        pairs = RecentPairs(capacity=100, seconds=0)
+        pairs.add(1)
+        pairs.add(2)
+        self.assertIn(1, pairs)
+        pairs.add(3)
+        self.assertNotIn(1, pairs)
+
+    def test_recent_cards_cookie(self):
+        from matchup.recent import card_digest, decode_recent_cards, encode_recent_cards
+        digests = [card_digest(name) for name in "abcde"]
+        self.assertEqual(decode_recent_cards(encode_recent_cards(digests, 3)), digests[-3:])
+        self.assertEqual(decode_recent_cards(encode_recent_cards(digests, 0)), [])
+        for junk in ("", "!!!", "YQ==", "é"):
+            self.assertEqual(decode_recent_cards(junk), [])
+
+    def test_repeats_are_redrawn(self):
+        from matchup.recent import COOKIE, card_digest, decode_recent_cards
+        draws = [
+            (_named_card("A"), _named_card("B")),
+            (_named_card("B"), _named_card("A")),  # the same pair
+            (_named_card("A"), _named_card("C")),  # A was just shown
+            (_named_card("D"), _named_card("E")),
+        ]
+        with patch("matchup.views._get_random_matchup", side_effect=draws) as draw:
+            self.client.get("/")
+            response = self.client.get("/")
+        self.assertEqual(draw.call_count, 4)
+        m = Matchup.objects.order_by("id").last()
+        self.assertEqual(m.card_1_uuid, _named_card("D")["uuid"])
+        self.assertEqual(
+            decode_recent_cards(response.cookies[COOKIE].value),
+            [card_digest(name) for name in "ABDE"],
+        )
+
+    @override_settings(MATCHUP_REPEAT_ATTEMPTS=2, MATCHUP_RECENT_CARDS=0)
+    def test_repeat_accepted_after_attempts(self):
+        from matchup.recent import COOKIE
+        with patch("matchup.views._get_random_matchup", side_effect=lambda: _mock_matchup()) as draw:
+            self.client.get("/")
+            response = self.client.get("/")
+        self.assertEqual(draw.call_count, 3)
+        self.assertEqual(Matchup.objects.count(), 2)
+        self.assertNotIn(COOKIE, response.cookies)
+
+
+class VoteArchiveTest(TestCase):
+    databases = {"default", "mtgjson"}
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        _create_mtgjson_tables()
+
+    def setUp(self):
+        import tempfile
+        from datetime import timedelta
+        from pathlib import Path
+        from django.utils import timezone
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.directory = Path(tmp.name)
+        settings = override_settings(VOTE_ARCHIVE_DIR=self.directory)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        _seed_card(CARD_1_UUID, "Lightning Bolt", "aaaaaaaa-1111-1111-1111-111111111111")
+        _seed_card(CARD_2_UUID, "Black Lotus", "bbbbbbbb-2222-2222-2222-222222222222")
+        now = timezone.now()
+        # Two months back, one month back and today
+        for k, days in enumerate([70, 65, 35, 34, 33, 0, 0]):
+            v = Vote.objects.create(card_1_uuid=CARD_1_UUID, card_2_uuid=CARD_2_UUID,
+                                    chosen_uuid=CARD_1_UUID if k % 3 else CARD_2_UUID,
+                                    ip_address="127.0.0.1")
+            Vote.objects.filter(pk=v.pk).update(created_at=now - timedelta(days=days))
+
+    def test_replay_reads_archives_and_live_table(self):
+        from io import StringIO
+        from matchup import archive
+        from matchup.rating_engines import get_engine
+        from matchup.replay import replay_votes
+        engine = get_engine("elo")
+        before = list(replay_votes(engine).rows())
+
+        out = StringIO()
+        call_command("archive_votes", "--days", "30", stdout=out)
+        self.assertIn("Archived 5 votes", out.getvalue())
+        self.assertEqual(Vote.objects.count(), 2)
+        manifest = archive.read_manifest()
+        self.assertEqual(archive.archived_count(manifest), 5)
+        self.assertEqual(archive.last_archived_id(manifest), Vote.objects.order_by("pk").first().pk - 1)
+
+        self.assertEqual(list(replay_votes(engine).rows()), before)
+        chunks = list(archive.vote_chunks(0, 10**9, 2))
+        self.assertEqual([len(c) for c in chunks], [2, 2, 1])
+        self.assertEqual([v[0] for c in chunks for v in c], sorted(v[0] for c in chunks for v in c))
+
+        # Nothing new to archive; a partial replay picks up where it left off.
+        call_command("archive_votes", "--days", "30", stdout=StringIO())
+        self.assertEqual(archive.archived_count(), 5)
+        result = replay_votes(engine)
+        Vote.objects.create(card_1_uuid=CARD_1_UUID, card_2_uuid=CARD_2_UUID,
+                            chosen_uuid=CARD_1_UUID, ip_address="127.0.0.1")
+        replay_votes(engine, result)
+        self.assertEqual(result.votes, 8)
+
+    def test_archives_a_chunk_at_a_time(self):
+        from datetime import timedelta
+        from unittest import mock
+        from django.utils import timezone
+        from matchup import archive
+        with mock.patch.object(archive, "CHUNK_SIZE", 2):
+            moved = archive.archive_votes(timezone.now() - timedelta(days=30))
+        self.assertEqual(sum(moved.values()), 5)
+        self.assertEqual(archive.verify(), [])
+        self.assertEqual(Vote.objects.count(), 2)
+
+    def test_archived_count_is_cached_until_the_manifest_changes(self):
+        import os
+        from datetime import timedelta
+        from unittest import mock
+        from django.utils import timezone
+        from matchup import archive
+        self.assertEqual(archive.archived_count(), 0)
+        archive.archive_votes(timezone.now() - timedelta(days=60))
+        with mock.patch.object(archive, "read_manifest", wraps=archive.read_manifest) as read:
+            self.assertEqual(archive.archived_count(), 2)
+            self.assertEqual(archive.archived_count(), 2)
+            self.assertEqual(read.call_count, 1)
+            manifest = self.directory / archive.MANIFEST
+            os.utime(manifest, ns=(0, manifest.stat().st_mtime_ns + 1))
+            archive.archived_count()
+            self.assertEqual(read.call_count, 2)
+
+    def test_late_merged_vote_does_not_pull_newer_votes_in(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        from matchup import archive
+        # Merged from a vote log: an old time, but the newest id.
+        v = Vote.objects.create(card_1_uuid=CARD_1_UUID, card_2_uuid=CARD_2_UUID,
+                                chosen_uuid=CARD_1_UUID, ip_address="127.0.0.1")
+        Vote.objects.filter(pk=v.pk).update(created_at=timezone.now() - timedelta(days=70))
+
+        cutoff = timezone.now() - timedelta(days=30)
+        self.assertEqual(sum(archive.archive_votes(cutoff).values()), 5)
+        self.assertEqual(Vote.objects.filter(created_at__lt=cutoff).get().pk, v.pk)
+        self.assertEqual(Vote.objects.count(), 3)
+
+    def test_verify_detects_tampering(self):
+        from io import StringIO
+        from django.core.management.base import CommandError
+        from matchup import archive
+        call_command("archive_votes", "--days", "30", stdout=StringIO())
+        out = StringIO()
+        call_command("archive_votes", "--verify", stdout=out)
+        self.assertIn("all OK", out.getvalue())
+
+        name = sorted(archive.read_manifest())[0]
+        with open(self.directory / name, "ab") as f:
+            f.write(b"\0")
+        self.assertEqual(archive.verify(), [f"{name}: checksum mismatch"])
+        with self.assertRaises(CommandError):
+            call_command("archive_votes", "--verify", stdout=StringIO())
+
+
+class VoteExportTest(TestCase):
+    databases = {"default", "mtgjson"}
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        _create_mtgjson_tables()
+
+    def setUp(self):
+        from io import StringIO
+        import tempfile
+        from datetime import timedelta
+        from pathlib import Path
+        from django.utils import timezone
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.directory = Path(tmp.name)
+        settings = override_settings(VOTE_ARCHIVE_DIR=self.directory / "archive")
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        _seed_card(CARD_1_UUID, "Lightning Bolt", "aaaaaaaa-1111-1111-1111-111111111111")
+        _seed_card(CARD_2_UUID, "Black Lotus", "bbbbbbbb-2222-2222-2222-222222222222")
+        now = timezone.now()
+        for days, chosen in [(60, CARD_1_UUID), (0, CARD_2_UUID), (0, "unknown-uuid")]:
+            v = Vote.objects.create(card_1_uuid=CARD_1_UUID, card_2_uuid=CARD_2_UUID,
+                                    chosen_uuid=chosen, ip_address="10.0.0.1")
+            Vote.objects.filter(pk=v.pk).update(created_at=now - timedelta(days=days))
+        # The first vote comes from the archive.
+        call_command("archive_votes", "--days", "30", stdout=StringIO())
+
+    def test_text_formats(self):
+        import csv
+        import gzip
+        import json
+        from io import StringIO
+        for fmt in ("csv", "jsonl"):
+            path = self.directory / f"votes.{fmt}.gz"
+            out = StringIO()
+            call_command("export_votes", str(path), "--format", fmt, stdout=out)
+            self.assertIn("Exported 3 votes", out.getvalue())
+            with gzip.open(path, "rt", newline="") as f:
+                if fmt == "csv":
+                    rows = list(csv.DictReader(f))
+                else:
+                    rows = [json.loads(line) for line in f]
+            self.assertEqual([str(r["winner"]) for r in rows], ["1", "2", "None" if fmt == "jsonl" else ""])
+            self.assertEqual(rows[0]["card_1_name"], "Lightning Bolt")
+            self.assertEqual(rows[0]["card_2_name"], "Black Lotus")
+            self.assertNotIn("10.0.0.1", path.read_bytes().decode("latin-1"))
+
+        last = Vote.objects.order_by("pk").last().pk
+        out = StringIO()
+        call_command("export_votes", str(path), "--format", "jsonl", "--since", str(last - 1), stdout=out)
+        self.assertIn("Exported 1 votes", out.getvalue())
+        self.assertIn(f"--since {last}", out.getvalue())
+
+    def test_live_votes_are_read_a_chunk_at_a_time(self):
+        from unittest import mock
+        from matchup import export
+        with mock.patch.object(export, "CHUNK_SIZE", 1):
+            rows = list(export.votes(0, Vote.objects.order_by("pk").last().pk))
+        self.assertEqual([r[3] for r in rows], [CARD_1_UUID, CARD_2_UUID, "unknown-uuid"])
+
+    def test_binary_records_and_stable_names(self):
+        import json
+        from io import StringIO
+        from matchup.export import read_binary
+        path = self.directory / "votes.bin"
+        names = self.directory / "names.json"
+        call_command("export_votes", str(path), "--format", "bin", "--names", str(names),
+                     stdout=StringIO())
+        self.assertEqual(path.stat().st_size, 3 * 17)
+        records = list(read_binary(path))
+        self.assertEqual([r[2] for r in records], [1, 0, -1])
+        exported = json.loads(names.read_text())
+        self.assertEqual(sorted(exported), ["Black Lotus", "Lightning Bolt"])
+        self.assertEqual([exported[i] for i in records[0][:2]], ["Lightning Bolt", "Black Lotus"])
+        self.assertLess(records[0][3], records[1][3])
+
+        # An incremental export over a sidecar that lists Lotus first keeps its id.
+        names.write_text(json.dumps(["Black Lotus", "Lightning Bolt"]))
+        call_command("export_votes", str(path), "--format", "bin", "--names", str(names),
+                     "--since", str(Vote.objects.order_by("pk").first().pk), stdout=StringIO())
+        self.assertEqual([r[:2] for r in read_binary(path)], [(1, 0)])
+        self.assertEqual(json.loads(names.read_text()), ["Black Lotus", "Lightning Bolt"])
+
+
+class VoteLogTest(TestCase):
+    databases = {"default", "mtgjson"}
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        _create_mtgjson_tables()
+
+    def setUp(self):
+        import tempfile
+        from pathlib import Path
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.directory = Path(tmp.name)
+        settings = override_settings(VOTE_LOG_DIR=self.directory, VOTE_LOG_NODE="central",
+                                     VOTE_ARCHIVE_DIR=self.directory / "archive")
+        settings.enable()
+        self.addCleanup(settings.disable)
+        _seed_card(CARD_1_UUID, "Lightning Bolt", "aaaaaaaa-1111-1111-1111-111111111111")
+        _seed_card(CARD_2_UUID, "Black Lotus", "bbbbbbbb-2222-2222-2222-222222222222")
+
+    def _record(self, token, created_at, chosen=CARD_1_UUID):
+        import json
+        return json.dumps({
+            "id": f"x:{token}", "token": token, "card_1_uuid": CARD_1_UUID,
+            "card_2_uuid": CARD_2_UUID, "chosen_uuid": chosen, "ip_address": "10.0.0.1",
+            "created_at": created_at,
+        }) + "\n"
+
+    @override_settings(VOTE_LOG=True)
+    def test_votes_are_logged(self):
+        import json
+        m = Matchup.objects.create(card_1_uuid=CARD_1_UUID, card_2_uuid=CARD_2_UUID)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post("/", {"matchup_token": str(m.token), "chosen_uuid": CARD_2_UUID})
+        vote = Vote.objects.get()
+        self.assertEqual(vote.matchup_token, m.token)
+
+        (line,) = (self.directory / "central.jsonl").read_text().splitlines()
+        record = json.loads(line)
+        self.assertEqual(record["id"], f"central:{vote.pk}")
+        self.assertEqual(record["token"], str(m.token))
+        self.assertEqual(record["chosen_uuid"], CARD_2_UUID)
+
+    def test_merge_dedupes_and_orders_by_time(self):
+        from io import StringIO
+        from datetime import datetime, timezone
+        from matchup.models import CardHourlyStat
+        a, b, c, d = (str(uuid.uuid4()) for _ in range(4))
+        (self.directory / "iad.jsonl").write_text(
+            self._record(a, "2026-01-01T10:15:00+00:00")
+            + self._record(c, "2026-01-01T12:00:00+00:00")
+        )
+        (self.directory / "ams.jsonl").write_text(
+            self._record(b, "2026-01-01T11:00:00+00:00", chosen=CARD_2_UUID)
+            + self._record(a, "2026-01-01T10:15:00+00:00")
+            + self._record(d, "2026-01-01T13:00:00+00:00").rstrip("\n")  # still being written
+        )
+        Vote.objects.create(card_1_uuid=CARD_1_UUID, card_2_uuid=CARD_2_UUID,
+                            chosen_uuid=CARD_1_UUID, ip_address="10.0.0.2", matchup_token=c)
+
+        out = StringIO()
+        call_command("merge_vote_logs", "--batch-size", "2", stdout=out)
+        self.assertIn("applied 2 votes, skipped 2", out.getvalue())
+        merged = list(Vote.objects.exclude(matchup_token=c).order_by("pk"))
+        self.assertEqual([str(v.matchup_token) for v in merged], [a, b])
+        self.assertEqual(merged[0].created_at, datetime(2026, 1, 1, 10, 15, tzinfo=timezone.utc))
+        bolt = CardRating.objects.get(name="Lightning Bolt")
+        self.assertEqual((bolt.wins, bolt.losses), (1, 1))
+        self.assertTrue(CardHourlyStat.objects.filter(
+            name="Lightning Bolt", hour=datetime(2026, 1, 1, 10, tzinfo=timezone.utc), wins=1,
+        ).exists())
+
+        # Only lines added since are read.
+        with open(self.directory / "ams.jsonl", "a") as f:
+            f.write("\n")
+        out = StringIO()
+        call_command("merge_vote_logs", stdout=out)
+        self.assertIn("applied 1 votes, skipped 0", out.getvalue())
+        self.assertEqual(Vote.objects.count(), 4)
+
+
+    def test_merge_survives_moves_lost_state_archives_and_torn_lines(self):
+        from io import StringIO
+        from datetime import datetime, timezone
+        from matchup.archive import archive_votes
+        a, b = (str(uuid.uuid4()) for _ in range(2))
+        logs = self.directory / "logs"
+        logs.mkdir()
+        (logs / "iad.jsonl").write_text(
+            self._record(a, "2026-01-01T10:00:00+00:00")
+            + '{"token": "\n'  # torn by a crash
+            + self._record(b, "2026-01-02T10:00:00+00:00")
+        )
+        with self.assertLogs("matchup.votelog", "WARNING"):
+            call_command("merge_vote_logs", str(logs), stdout=StringIO())
+        self.assertEqual(Vote.objects.count(), 2)
+
+        # Offsets are kept by file name, so moved logs aren't reread.
+        moved = self.directory / "moved"
+        logs.rename(moved)
+        out = StringIO()
+        call_command("merge_vote_logs", str(moved), stdout=out)
+        self.assertIn("applied 0 votes, skipped 0", out.getvalue())
+
+        # Votes already archived aren't applied again when the state is lost.
+        archive_votes(datetime(2026, 1, 3, tzinfo=timezone.utc))
+        self.assertEqual(Vote.objects.count(), 0)
+        (self.directory / "merged.json").unlink()
+        out = StringIO()
+        with self.assertLogs("matchup.votelog", "WARNING"):
+            call_command("merge_vote_logs", str(moved), stdout=out)
+        self.assertIn("applied 0 votes, skipped 2", out.getvalue())
+        self.assertEqual(Vote.objects.count(), 0)
+
+@override_settings(
+    STORAGES={
+        "staticfiles": {
+            "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage",
+        },
+    }
+)
+class BootstrapTest(TestCase):
+    databases = {"default", "mtgjson"}
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        _create_mtgjson_tables()
+
+    def _pairs(self):
+        from matchup.models import PairStat
+        # Lightning Bolt beats Black Lotus, which beats Giant Growth.
+        PairStat.objects.create(name_a="Black Lotus", name_b="Lightning Bolt", wins_a=5, wins_b=25)
+        PairStat.objects.create(name_a="Black Lotus", name_b="Giant Growth", wins_a=20, wins_b=10)
+        PairStat.objects.create(name_a="Giant Growth", name_b="Lightning Bolt", wins_a=1, wins_b=9)
+
+    def test_fit_and_intervals(self):
+        import random
+        from matchup.bootstrap import bootstrap, fit, intervals, load_pairs, poisson, ranks
+        self._pairs()
+        pairs = load_pairs()
+        strengths = fit(pairs)
+        by_rank = sorted(pairs.names, key=dict(zip(pairs.names, ranks(strengths))).__getitem__)
+        self.assertEqual(by_rank, ["Lightning Bolt", "Black Lotus", "Giant Growth"])
+
+        rng = random.Random(1)
+        for lam in (0, 3, 50):
+            mean = sum(poisson(lam, rng) for _ in range(4000)) / 4000
+            self.assertAlmostEqual(mean, lam, delta=0.1 + 0.05 * lam)
+
+        full, replicates = bootstrap(pairs, 20, workers=1, seed=3)
+        self.assertEqual(list(full), list(strengths))
+        self.assertEqual(len(replicates), 20)
+        for rank, (low, high) in zip(ranks(full), intervals(replicates, 0.9)):
+            self.assertLessEqual(low, rank)
+            self.assertGreaterEqual(high, rank)
+            self.assertTrue(1 <= low <= high <= 3)
+
+    def test_command_stores_intervals_for_leaderboard(self):
+        from io import StringIO
+        from django.core.cache import cache
+        from django.core.management.base import CommandError
+        from matchup.models import RatingInterval, RatingVersion
+        cache.clear()
+        self._pairs()
+        _seed_card(CARD_1_UUID, "Lightning Bolt", "aaaaaaaa-1111-1111-1111-111111111111")
+        CardRating.objects.create(name="Lightning Bolt", rating=1600, wins=34, losses=6)
+
+        out = StringIO()
+        call_command("bootstrap_ratings", "--samples", "10", "--workers", "1", stdout=out)
+        self.assertIn("rank intervals for 3 cards from 3 pairs and 10 resamples", out.getvalue())
+        bolt = RatingInterval.objects.get(name="Lightning Bolt")
+        self.assertEqual(bolt.rank, 1)
+        self.assertEqual(RatingInterval.objects.count(), 3)
+        self.assertEqual(RatingVersion.current().version, 1)
+
+        response = self.client.get("/leaderboard/")
+        self.assertContains(response, f"Rank 1, likely 1–{bolt.rank_high}")
+
+        # No resamples would leave nothing to store; keep the old intervals.
+        with self.assertRaises(CommandError):
+            call_command("bootstrap_ratings", "--samples", "0", stdout=StringIO())
+        self.assertEqual(RatingInterval.objects.count(), 3)
+
+
+class RatingSnapshotTest(TestCase):
+    def _ratings(self, ratings):
+        from matchup.models import RatingVersion
+        CardRating.objects.all().delete()
+        CardRating.objects.bulk_create(CardRating(name=n, rating=r) for n, r in ratings.items())
+        RatingVersion.bump()
+
+    def test_take_skips_unchanged_and_compare(self):
+        from matchup.snapshots import compare, load, take
+        self._ratings({"Lightning Bolt": 1600, "Black Lotus": 1550, "Giant Growth": 1500,
+                       "Shock": 1400})
+        old = take()
+        self.assertEqual(old.count, 4)
+        self.assertIsNone(take())
+        self.assertIsNotNone(take(force=True))
+        names, ratings = load(old)
+        self.assertEqual(names, ["Black Lotus", "Giant Growth", "Lightning Bolt", "Shock"])
+        self.assertEqual(list(ratings), [1550, 1500, 1600, 1400])
+
+        self._ratings({"Lightning Bolt": 1600, "Black Lotus": 1450, "Giant Growth": 1500,
+                       "Counterspell": 1580})
+        c = compare(old, take(), k=2)
+        self.assertEqual((c.common, c.added, c.removed), (3, 1, 1))
+        self.assertAlmostEqual(c.tau, 1 / 3)
+        self.assertEqual(c.overlap, 0.5)
+        self.assertEqual(c.movers, [])
+
+        c = compare(old, take(force=True), k=4)
+        self.assertEqual(c.movers, [("Black Lotus", 2, 4)])
+        self.assertAlmostEqual(c.top_tau, 1 / 3)
+
+    def test_command_and_prune(self):
+        from datetime import datetime, timedelta, timezone as dt_timezone
+        from io import StringIO
+        from matchup.models import RatingSnapshot
+        from matchup.snapshots import prune
+        self._ratings({"Lightning Bolt": 1600, "Black Lotus": 1550})
+        out = StringIO()
+        call_command("snapshot_ratings", stdout=out)
+        self.assertIn("2 cards at v1", out.getvalue())
+        out = StringIO()
+        call_command("snapshot_ratings", stdout=out)
+        self.assertIn("unchanged", out.getvalue())
+
+        self._ratings({"Lightning Bolt": 1500, "Black Lotus": 1550})
+        call_command("snapshot_ratings", stdout=StringIO())
+        out = StringIO()
+        call_command("compare_snapshots", stdout=out)
+        self.assertRegex(out.getvalue(), r"Top 500 overlap: +100\.0%")
+        self.assertIn("Lightning Bolt", out.getvalue())
+
+        now = datetime(2026, 3, 10, 15, 30, tzinfo=dt_timezone.utc)
+        old = RatingSnapshot.objects.get(version=1)
+        day = datetime(2026, 3, 1, tzinfo=dt_timezone.utc)
+        for h in (1, 2, 3):
+            RatingSnapshot.objects.create(taken_at=day + timedelta(hours=h), version=0, count=0,
+                                          names=old.names, ratings=old.ratings)
+        RatingSnapshot.objects.create(taken_at=day - timedelta(days=400), version=0, count=0,
+                                      names=b"", ratings=b"")
+        self.assertEqual(prune(now, hourly_days=7, retention_days=365), 3)
+        self.assertTrue(RatingSnapshot.objects.filter(taken_at=day + timedelta(hours=1)).exists())
@@ -0,0 +1,87 @@
+"""Time-windowed rankings from the `CardHourlyStat` buckets.
+
+The vote path adds each matchup to the current hour's buckets, so ranking
+the last week sums at most a few thousand small rows per card rather than
+scanning the vote log. Rankings are cached for `TRENDING_CACHE_SECONDS`.
+"""
+
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Q, Sum
+from django.utils import timezone
+
+from .models import CardHourlyStat
+
+
+def window_ranking(window: str, limit: int = 10) -> list[dict]:
+    """Most-picked cards over `window` (a key of `settings.TRENDING_WINDOWS`).
+
+    Each entry has name, wins, appearances and win_rate. Buckets are
+    counted whole, so the window starts at the beginning of the hour (or,
+    for daily buckets left by `compact`, the day) it reaches back into.
+    """
+    key = f"trending:{window}:{limit}"
+    ranking = cache.get(key)
+    if ranking is None:
+        since = timezone.now() - timedelta(hours=settings.TRENDING_WINDOWS[window])
+        since_hour = since.replace(minute=0, second=0, microsecond=0)
+        since_day = since_hour.replace(hour=0)
+        ranking = [
+            {**row, 'win_rate': row['wins'] / row['appearances']}
+            for row in CardHourlyStat.objects.filter(
+                Q(hour__gte=since_hour) | Q(hours=24, hour__gte=since_day)
+            )
+            .values('name')
+            .annotate(wins=Sum('wins'), appearances=Sum('appearances'))
+            .order_by('-wins', '-appearances', 'name')[:limit]
+        ]
+        cache.set(key, ranking, settings.TRENDING_CACHE_SECONDS)
+    return ranking
+
+
+def compact(now: datetime, hourly_days: int, retention_days: int) -> tuple[int, int, int]:
+    """Fold hourly buckets from before the last `hourly_days` whole days into
+    daily ones, and delete buckets older than `retention_days`.
+
+    Returns (hourly buckets folded, daily buckets written, buckets deleted).
+    """
+    midnight = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    cutoff = midnight - timedelta(days=hourly_days)
+    expired = midnight - timedelta(days=retention_days)
+
+    with transaction.atomic():
+        deleted, _ = CardHourlyStat.objects.filter(hour__lt=expired).delete()
+
+        old = CardHourlyStat.objects.filter(hours=1, hour__lt=cutoff)
+        days = defaultdict(lambda: [0, 0])
+        folded = 0
+        for name, hour, wins, appearances in old.values_list(
+            'name', 'hour', 'wins', 'appearances'
+        ).iterator():
+            day = days[name, hour.replace(hour=0)]
+            day[0] += wins
+            day[1] += appearances
+            folded += 1
+        old.delete()
+
+        # A day's midnight bucket was folded in above and deleted, so these
+        # only collide with daily buckets from an earlier run, never hours.
+        adapt = connection.ops.adapt_datetimefield_value
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                'INSERT INTO "matchup_cardhourlystat" ("name", "hour", "hours", "wins", "appearances") '
+                'VALUES (%s, %s, 24, %s, %s) '
+                'ON CONFLICT ("hour", "name") DO UPDATE SET '
+                '"wins" = "wins" + excluded."wins", '
+                '"appearances" = "appearances" + excluded."appearances"',
+                [
+                    (name, adapt(day), wins, appearances)
+                    for (name, day), (wins, appearances) in days.items()
+                ],
+            )
+
+    return folded, len(days), deleted
@@ -5,4 +5,7 @@ from . import views
 urlpatterns = [
     path('', views.matchup, name='matchup'),
     path('leaderboard/', views.leaderboard, name='leaderboard'),
+    path('trending/', views.trending, name='trending'),
+    path('leaderboard/export.<str:fmt>', views.leaderboard_export, name='leaderboard_export'),
+    path('images/<uuid:scryfall_id>.jpg', views.card_image, name='card_image'),
 ]
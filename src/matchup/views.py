@@ -1,10 +1,43 @@
+import csv
+import itertools
+import json
+import logging
+import random
+import urllib.error
+
+from django.conf import settings
 from django.core.exceptions import ValidationError
-from django.http import HttpResponseBadRequest, HttpResponseNotAllowed
+from django.db import transaction
+from django.http import (
+    FileResponse, Http404, HttpResponse, HttpResponseBadRequest, HttpResponseNotAllowed,
+    StreamingHttpResponse,
+)
 from django.shortcuts import redirect, render
+from django.urls import reverse
 from django.utils import timezone
-
-from .elo import update_ratings
-from .models import Card, CardIdentifiers, CardRating, Matchup, Vote
+from django.views.decorators.http import condition, require_GET, require_safe
+
+from .archive import archived_count
+from .cardpool import FILTERS, get_card_pool
+from .image_cache import get_image_cache
+from . import mtgjson, votelog
+from .models import (
+    CanonicalPrinting, CardHourlyStat, CardRating, Matchup, PairStat, RatingInterval,
+    RatingVersion, Vote, card_image_url,
+)
+from .ratelimit import client_ip
+from .recent import (
+    COOKIE as RECENT_COOKIE, card_digest, decode_recent_cards, encode_recent_cards,
+    get_recent_pairs, pair_key,
+)
+from .rating_engines import get_engine
+from .selection import get_rating_index
+from .trending import window_ranking
+
+logger = logging.getLogger(__name__)
+
+# Draws of a pool matchup before giving up on finding two different names.
+SAME_NAME_ATTEMPTS = 10
 
 
 def _is_basic_land(card):
@@ -12,27 +45,85 @@ def _is_basic_land(card):
     return card.supertypes and 'Basic' in card.supertypes
 
 
+def _card_info(card):
+    """Build the template dict for a card, or None if it has no scryfall image."""
+    scryfall_id = mtgjson.scryfall_id(card.uuid)
+    if not scryfall_id:
+        return None
+    return {
+        'uuid': card.uuid,
+        'name': card.name,
+        'image_url': card_image_url(scryfall_id),
+    }
+
+
 def _get_random_matchup():
+    """Pick two distinct cards to show, using the configured strategy.
+
+    With `MATCHUP_STRATEGY = 'active'`, most matchups pair cards with close
+    ratings chosen by `selection.RatingIndex`; `MATCHUP_EXPLORATION` of them
+    (and any the index can't fill) are still drawn uniformly.
+    """
+    if (
+        settings.MATCHUP_STRATEGY == 'active'
+        and random.random() >= settings.MATCHUP_EXPLORATION
+    ):
+        card1, card2 = _get_active_matchup()
+        if card1 and card2:
+            return card1, card2
+    return _get_uniform_matchup()
+
+
+def _get_active_matchup():
+    """Pick an informative pair of rated cards and a printing of each."""
+    pair = get_rating_index().sample_pair(settings.MATCHUP_RATING_DELTA, random.Random())
+    if not pair:
+        return None, None
+
+    canonical = CanonicalPrinting.objects.in_bulk(pair)
+    results = []
+    for name in pair:
+        if name in canonical:
+            printing = canonical[name]
+            results.append({
+                'uuid': printing.uuid,
+                'name': name,
+                'image_url': printing.image_url(),
+            })
+            continue
+        # Not in the index yet: any eligible printing with a scryfall image
+        for card in mtgjson.random_printings_of(name, 3):
+            info = _card_info(card)
+            if info:
+                results.append(info)
+                break
+        else:
+            return None, None
+    return results[0], results[1]
+
+
+def _get_uniform_matchup():
     """Pick two random distinct cards that have scryfall images.
 
-    We join cards and cardIdentifiers, filter to "real" paper cards,
-    and pick three at random using SQLite's RANDOM(). If exactly one
-    is a basic land, we return the other two. Otherwise, we return
-    the first two. This reduces basic land frequency while still
-    allowing them to appear occasionally.
+    When the card pool is loaded (`settings.CARD_POOL`), the pair comes
+    from its alias sampler without touching the database: by card name
+    or by printing (`settings.MATCHUP_SAMPLE_BY`), weighted by card
+    category (`settings.MATCHUP_CATEGORY_WEIGHTS`), which is also what
+    keeps basic lands rare. See `_get_pool_matchup`.
+
+    Otherwise, or until the pool is ready, we join cards and
+    cardIdentifiers, filter to "real" paper cards, and pick three at
+    random using SQLite's RANDOM(). If exactly one is a basic land, we
+    return the other two. Otherwise, we return the first two. This
+    reduces basic land frequency while still allowing them to appear
+    occasionally.
     """
-    qs = (
-        Card.objects.using('mtgjson')
-        .exclude(isFunny=True)
-        .exclude(isOnlineOnly=True)
-        .exclude(isOversized=True)
-        .exclude(side='b')
-        .filter(availability__contains='paper')
-        .filter(language__in=['English', 'Phyrexian'])
-    )
+    pool = get_card_pool()
+    if pool is not None:
+        return _get_pool_matchup(pool)
 
     # Get three random cards via ORDER BY RANDOM() on uuid
-    random_cards = list(qs.order_by('?')[:3])
+    random_cards = mtgjson.random_printings(3)
     if len(random_cards) < 3:
         return None, None
 
@@ -45,31 +136,107 @@ def _get_random_matchup():
         # Otherwise, just use the first two
         random_cards = random_cards[:2]
 
-    results = []
-    for card in random_cards:
-        ident = (
-            CardIdentifiers.objects.using('mtgjson')
-            .filter(uuid=card.uuid)
-            .exclude(scryfallId__isnull=True)
-            .exclude(scryfallId='')
-            .first()
-        )
-        if ident:
-            results.append({
-                'uuid': card.uuid,
-                'name': card.name,
-                'image_url': ident.scryfall_image_url(),
-            })
+    results = [info for info in map(_card_info, random_cards) if info]
 
     if len(results) < 2:
-        return _get_random_matchup()  # retry
+        return _get_uniform_matchup()  # retry
 
     return results[0], results[1]
 
 
+def _get_pool_matchup(pool, selection=None):
+    """`_get_uniform_matchup` over the card pool, whose cards all have images.
+
+    Without a `selection`, the pair is two draws from the pool's alias
+    sampler, whose weights already make basic lands rare.
+
+    Draws from `selection` (see `CardPool.select`) if given, three at a
+    time, dropping a lone basic land as `_get_uniform_matchup` does; a
+    selection of just two cards always returns those two.
+
+    Printings are drawn, not names, when sampling by printing or from a
+    selection, so a pair of two printings of one card is drawn again, up
+    to `SAME_NAME_ATTEMPTS` times.
+    """
+    if selection is None:
+        sampler = pool.sampler(
+            settings.MATCHUP_SAMPLE_BY,
+            settings.MATCHUP_NAME_WEIGHT_EXPONENT,
+            settings.MATCHUP_CATEGORY_WEIGHTS,
+        )
+        if len(sampler) < 2:
+            return None, None
+
+        def draw():
+            return sampler.sample(2)
+    else:
+        if len(selection) < 2:
+            return None, None
+
+        def draw():
+            picks = selection.sample(min(3, len(selection)))
+            basic_lands = [i for i in picks if pool.is_basic_land(i)]
+            if len(basic_lands) == 1 and len(picks) == 3:
+                picks.remove(basic_lands[0])
+            return picks[:2]
+
+    for _ in range(SAME_NAME_ATTEMPTS):
+        first, second = draw()
+        if pool.name(first) != pool.name(second):
+            return pool.card_info(first), pool.card_info(second)
+    return None, None
+
+
+def _theme(request):
+    """Card filters from the query string, e.g. `?rarity=mythic&set=LEA,LEB`."""
+    theme = {}
+    for param in FILTERS:
+        values = [v for raw in request.GET.getlist(param) for v in raw.split(',') if v]
+        if values:
+            theme[param] = values
+    return theme
+
+
+def _get_themed_matchup(theme):
+    """Two random cards matching `theme`, from the card pool."""
+    pool = get_card_pool()
+    if pool is None:
+        return None, None
+    return _get_pool_matchup(pool, pool.select(theme))
+
+
+def _avoid_repeats(draw, recent_cards):
+    """Call `draw` for a pair that wasn't issued recently and shows none of
+    the visitor's `recent_cards` digests.
+
+    Gives up after `MATCHUP_REPEAT_ATTEMPTS` draws and takes the last one,
+    so a small theme still gets matchups. Both checks are in memory.
+    """
+    pairs = get_recent_pairs()
+    for _ in range(max(1, settings.MATCHUP_REPEAT_ATTEMPTS)):
+        card1, card2 = draw()
+        if not card1 or not card2:
+            return card1, card2
+        key = pair_key(card1['name'], card2['name'])
+        if (
+            key not in pairs
+            and card_digest(card1['name']) not in recent_cards
+            and card_digest(card2['name']) not in recent_cards
+        ):
+            break
+    pairs.add(key)
+    return card1, card2
+
+
 def matchup(request):
+    theme = _theme(request)
     if request.method == 'GET':
-        card1, card2 = _get_random_matchup()
+        keep = settings.MATCHUP_RECENT_CARDS
+        recent_cards = decode_recent_cards(request.COOKIES.get(RECENT_COOKIE)) if keep else []
+        if theme:
+            card1, card2 = _avoid_repeats(lambda: _get_themed_matchup(theme), recent_cards)
+        else:
+            card1, card2 = _avoid_repeats(_get_random_matchup, recent_cards)
         if not card1 or not card2:
             return render(request, 'matchup/error.html', {'message': 'Could not find cards.'})
 
@@ -78,11 +245,21 @@ def matchup(request):
             card_2_uuid=card2['uuid'],
         )
 
-        return render(request, 'matchup/matchup.html', {
+        response = render(request, 'matchup/matchup.html', {
             'card1': card1,
             'card2': card2,
             'matchup_token': m.token,
         })
+        if keep:
+            recent_cards += [card_digest(card1['name']), card_digest(card2['name'])]
+            response.set_cookie(
+                RECENT_COOKIE,
+                encode_recent_cards(recent_cards, keep),
+                max_age=24 * 60 * 60,
+                httponly=True,
+                samesite='Lax',
+            )
+        return response
 
     elif request.method == 'POST':
         matchup_token = request.POST.get('matchup_token', '')
@@ -111,59 +288,96 @@ def matchup(request):
         # if len(existing) != 2:
         #     return HttpResponseBadRequest('Card not found')
 
-        # Get client IP, respecting X-Forwarded-For
-        xff = request.META.get('HTTP_X_FORWARDED_FOR')
-        ip = xff.split(',')[0].strip() if xff else request.META.get('REMOTE_ADDR')
-
-        Vote.objects.create(
-            card_1_uuid=m.card_1_uuid,
-            card_2_uuid=m.card_2_uuid,
-            chosen_uuid=chosen_uuid,
-            ip_address=ip,
-        )
-
-        # Update Elo ratings
-        _update_elo(m.card_1_uuid, m.card_2_uuid, chosen_uuid)
+        # One IMMEDIATE transaction, so concurrent votes (and rating
+        # rebuilds) can't interleave with this read-modify-write.
+        with transaction.atomic():
+            # Claim the matchup first: a concurrent submit of the same token
+            # finds it already voted instead of recording a second vote.
+            updated = Matchup.objects.filter(
+                token=m.token, voted__isnull=True
+            ).update(voted=timezone.now())
+            if not updated:
+                return HttpResponseBadRequest('Invalid or already-used matchup')
+
+            vote = Vote.objects.create(
+                card_1_uuid=m.card_1_uuid,
+                card_2_uuid=m.card_2_uuid,
+                chosen_uuid=chosen_uuid,
+                ip_address=client_ip(request),
+                matchup_token=m.token,
+            )
+            if settings.VOTE_LOG:
+                transaction.on_commit(lambda: votelog.append(vote))
 
-        m.voted = timezone.now()
-        m.save(update_fields=['voted'])
+            # Update ratings
+            _update_elo(m.card_1_uuid, m.card_2_uuid, chosen_uuid)
+            RatingVersion.bump()
 
+        # Keep the voter on the same theme
+        if theme:
+            return redirect(f"{reverse('matchup')}?{request.GET.urlencode()}")
         return redirect('matchup')
 
     return HttpResponseNotAllowed(['GET', 'POST'])
 
 
+def _image_urls(names):
+    """Map card names to the image of their canonical printing.
+
+    Names missing from the canonical printing index (say, before
+    `build_canonical_printings` has run) fall back to any printing with a
+    scryfall image, or None.
+    """
+    urls = {
+        name: printing.image_url()
+        for name, printing in CanonicalPrinting.objects.in_bulk(names).items()
+    }
+    for name in names:
+        if name in urls:
+            continue
+        urls[name] = card_image_url(mtgjson.any_scryfall_id(name))
+    return urls
+
+
+def _rating_version(request):
+    """The current RatingVersion, looked up once per request."""
+    if not hasattr(request, '_rating_version'):
+        request._rating_version = RatingVersion.current()
+    return request._rating_version
+
+
+def _rating_etag(request, *args, **kwargs):
+    # Image links change with the proxy setting, so it is part of the tag.
+    proxy = '-proxy' if settings.CARD_IMAGE_PROXY else ''
+    return f'v{_rating_version(request).version}{proxy}'
+
+
+def _rating_last_modified(request, *args, **kwargs):
+    return _rating_version(request).updated
+
+
+rating_condition = condition(etag_func=_rating_etag, last_modified_func=_rating_last_modified)
+
+
+@rating_condition
 def leaderboard(request):
-    top_cards = CardRating.objects.order_by('-rating')[:10]
-    total_votes = Vote.objects.count()
-
-    # Resolve card names to image URLs via mtgjson
-    cards = []
-    for cr in top_cards:
-        # Find any printing of this card with a scryfall image
-        card = (
-            Card.objects.using('mtgjson')
-            .filter(name=cr.name)
-            .first()
-        )
-        image_url = None
-        if card:
-            ident = (
-                CardIdentifiers.objects.using('mtgjson')
-                .filter(uuid=card.uuid)
-                .exclude(scryfallId__isnull=True)
-                .exclude(scryfallId='')
-                .first()
-            )
-            if ident:
-                image_url = ident.scryfall_image_url()
-        cards.append({
+    top_cards = list(CardRating.objects.order_by('-rating')[:10])
+    total_votes = Vote.objects.count() + archived_count()
+
+    names = [cr.name for cr in top_cards]
+    image_urls = _image_urls(names)
+    intervals = RatingInterval.objects.in_bulk(names, field_name='name')
+    cards = [
+        {
             'name': cr.name,
             'rating': cr.rating,
             'wins': cr.wins,
             'losses': cr.losses,
-            'image_url': image_url,
-        })
+            'image_url': image_urls[cr.name],
+            'interval': intervals.get(cr.name),
+        }
+        for cr in top_cards
+    ]
 
     return render(request, 'matchup/leaderboard.html', {
         'cards': cards,
@@ -171,26 +385,130 @@ def leaderboard(request):
     })
 
 
-def _update_elo(card_1_uuid: str, card_2_uuid: str, chosen_uuid: str) -> None:
-    """Resolve card UUIDs to names and update Elo ratings."""
-    names = dict(
-        Card.objects.using('mtgjson')
-        .filter(uuid__in=[card_1_uuid, card_2_uuid])
-        .values_list('uuid', 'name')
+TRENDING_LABELS = {'24h': '24 hours', '7d': '7 days', '30d': '30 days'}
+
+
+@require_GET
+def trending(request):
+    """Most-picked cards over a recent window (`?window=24h|7d|30d`)."""
+    window = request.GET.get('window', '7d')
+    if window not in settings.TRENDING_WINDOWS:
+        return HttpResponseBadRequest('Unknown window')
+
+    cards = window_ranking(window)
+    image_urls = _image_urls([card['name'] for card in cards])
+    return render(request, 'matchup/trending.html', {
+        'cards': [{**card, 'image_url': image_urls[card['name']]} for card in cards],
+        'window': window,
+        'window_label': TRENDING_LABELS.get(window, window),
+        'windows': [(key, TRENDING_LABELS.get(key, key)) for key in settings.TRENDING_WINDOWS],
+    })
+
+
+class _Echo:
+    """File-like object whose write returns the value, for streaming csv."""
+
+    def write(self, value):
+        return value
+
+
+EXPORT_FIELDS = ['rank', 'name', 'rating', 'deviation', 'wins', 'losses']
+
+
+@require_GET
+@rating_condition
+def leaderboard_export(request, fmt):
+    """The full ranking as JSON or CSV."""
+    if fmt not in ('json', 'csv'):
+        raise Http404
+    ratings = (
+        CardRating.objects.order_by('-rating', 'name')
+        .values_list(*EXPORT_FIELDS[1:])
+        .iterator()
+    )
+    rows = ((rank, *row) for rank, row in enumerate(ratings, 1))
+
+    if fmt == 'csv':
+        writer = csv.writer(_Echo())
+        return StreamingHttpResponse(
+            map(writer.writerow, itertools.chain([EXPORT_FIELDS], rows)),
+            content_type='text/csv',
+            headers={'Content-Disposition': 'attachment; filename="ratings.csv"'},
+        )
+
+    version = _rating_version(request)
+    return HttpResponse(
+        json.dumps({
+            'version': version.version,
+            'updated': version.updated.isoformat() if version.updated else None,
+            'cards': [dict(zip(EXPORT_FIELDS, row)) for row in rows],
+        }),
+        content_type='application/json',
     )
+
+
+@require_safe
+def card_image(request, scryfall_id):
+    """Serve a card image from the on-disk cache (see `image_cache`)."""
+    # Checked before the conditional view, which would otherwise answer
+    # revalidations with 304 while the proxy is off.
+    if not settings.CARD_IMAGE_PROXY:
+        raise Http404
+    return _cached_card_image(request, scryfall_id)
+
+
+# A scryfall id always names the same image, so the id is its own ETag.
+@condition(etag_func=lambda request, scryfall_id: str(scryfall_id))
+def _cached_card_image(request, scryfall_id):
+    try:
+        image = open(get_image_cache().get(str(scryfall_id)), 'rb')
+    except urllib.error.HTTPError as e:
+        if e.code == 404:
+            raise Http404
+        logger.warning("Image upstream returned %s for %s", e.code, scryfall_id)
+        return HttpResponse(status=502)
+    except (urllib.error.URLError, OSError) as e:
+        logger.warning("Image upstream failed for %s: %s", scryfall_id, e)
+        return HttpResponse(status=502)
+
+    response = FileResponse(image, content_type='image/jpeg')
+    response['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
+
+
+def _update_elo(card_1_uuid: str, card_2_uuid: str, chosen_uuid: str, at=None) -> None:
+    """Resolve card UUIDs to names and update their ratings, head-to-head
+    record and trending buckets (for the hour of `at`, default now).
+
+    Uses the engine named by `settings.RATING_ENGINE`.
+    """
+    names = {}
+    pool = get_card_pool()
+    if pool is not None:
+        for uuid in (card_1_uuid, card_2_uuid):
+            i = pool.find(uuid)
+            if i is not None:
+                names[uuid] = pool.name(i)
+    if len(names) < 2:
+        names = mtgjson.names_of_pair(card_1_uuid, card_2_uuid)
     name_1 = names.get(card_1_uuid)
     name_2 = names.get(card_2_uuid)
-    if not name_1 or not name_2:
+    # Two printings of one card say nothing about its rating, and would
+    # record a win and a loss against itself.
+    if not name_1 or not name_2 or name_1 == name_2:
         return
 
     rating_1, _ = CardRating.objects.get_or_create(name=name_1)
     rating_2, _ = CardRating.objects.get_or_create(name=name_2)
 
     a_won = chosen_uuid == card_1_uuid
-    new_r1, new_r2 = update_ratings(rating_1.rating, rating_2.rating, a_won)
+    new_s1, new_s2 = get_engine().update(rating_1.state, rating_2.state, a_won)
+    winner, loser = (name_1, name_2) if a_won else (name_2, name_1)
+    PairStat.record(winner, loser)
+    CardHourlyStat.record(winner, loser, at)
 
-    rating_1.rating = new_r1
-    rating_2.rating = new_r2
+    rating_1.set_state(new_s1)
+    rating_2.set_state(new_s2)
     if a_won:
         rating_1.wins += 1
         rating_2.losses += 1
@@ -0,0 +1,182 @@
+"""Per-node vote logs, for running the site on more than one machine.
+
+Every write goes to one SQLite file on one volume, which pins the site to
+a single machine. With `settings.VOTE_LOG` on, each node also appends
+every vote it records to its own log, `VOTE_LOG_DIR/<node>.jsonl`, one
+JSON object per line. A vote's id there is "<node>:<local pk>", which is
+unique across nodes, and its matchup token identifies it wherever it ends
+up.
+
+Shipping the logs to the node that keeps the central ratings is left to
+the deployment, e.g. a periodic `fly sftp get`. There `merge_vote_logs`
+reads them with `merge`: the logs are merged by timestamp, votes already
+recorded (by token) are skipped, and the rest are inserted and rated in
+batches. How far each log has been read is kept in `MERGE_STATE`, by
+file name, so reruns only read new lines even if the logs move. Should
+that state be lost, rereading is still safe: tokens are checked against
+the archives (see `archive`) as well as the live table.
+"""
+
+import heapq
+import itertools
+import json
+import logging
+import os
+import socket
+import uuid
+from collections.abc import Iterable, Iterator
+from datetime import datetime
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from . import archive
+from .models import RatingVersion, Vote
+
+logger = logging.getLogger(__name__)
+
+MERGE_STATE = "merged.json"
+FIELDS = ("token", "card_1_uuid", "card_2_uuid", "chosen_uuid", "ip_address", "created_at")
+
+
+def node_id() -> str:
+    return settings.VOTE_LOG_NODE or socket.gethostname()
+
+
+def log_path(node: str | None = None) -> Path:
+    return Path(settings.VOTE_LOG_DIR) / f"{node or node_id()}.jsonl"
+
+
+def append(vote: Vote) -> None:
+    """Append `vote` to this node's log.
+
+    One `write` on a file opened with O_APPEND, so lines from concurrent
+    workers never interleave.
+    """
+    node = node_id()
+    record = {
+        "id": f"{node}:{vote.pk}",
+        "token": str(vote.matchup_token),
+        "card_1_uuid": vote.card_1_uuid,
+        "card_2_uuid": vote.card_2_uuid,
+        "chosen_uuid": vote.chosen_uuid,
+        "ip_address": vote.ip_address,
+        "created_at": vote.created_at.isoformat(),
+    }
+    path = log_path(node)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(fd, (json.dumps(record) + "\n").encode())
+    finally:
+        os.close(fd)
+
+
+def _read_log(path: Path, offset: int) -> Iterator[tuple[datetime, str, int, dict]]:
+    """Yield (created_at, log name, offset after the line, record) from
+    `offset` on.
+
+    A last line without a newline may still be being written, so it is
+    left for the next merge. Complete lines that don't hold a vote, e.g.
+    torn by a crash mid-write, are logged and skipped.
+    """
+    with open(path, "rb") as f:
+        f.seek(offset)
+        for line in f:
+            if not line.endswith(b"\n"):
+                return
+            start = offset
+            offset += len(line)
+            try:
+                record = json.loads(line)
+                missing = [field for field in FIELDS if field not in record]
+                if missing:
+                    raise ValueError(f"missing {', '.join(missing)}")
+                created_at = datetime.fromisoformat(record["created_at"])
+                record["token"] = str(uuid.UUID(record["token"]))
+            except (ValueError, TypeError, AttributeError) as e:
+                logger.warning("Skipping unreadable line at byte %d of %s: %s", start, path, e)
+                continue
+            yield created_at, path.name, offset, record
+
+
+def _read_state(directory: Path) -> dict[str, int]:
+    try:
+        return json.loads((directory / MERGE_STATE).read_text())
+    except FileNotFoundError:
+        return {}
+
+
+def _write_state(directory: Path, state: dict[str, int]) -> None:
+    tmp = directory / f"{MERGE_STATE}.tmp"
+    tmp.write_text(json.dumps(state, indent=2, sort_keys=True))
+    os.replace(tmp, directory / MERGE_STATE)
+
+
+def _insert(batch: list[dict]) -> None:
+    """Insert votes with their original timestamps, which `auto_now_add`
+    would overwrite."""
+    token_field = Vote._meta.get_field("matchup_token")
+    adapt = connection.ops.adapt_datetimefield_value
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            'INSERT INTO "matchup_vote" '
+            '("card_1_uuid", "card_2_uuid", "chosen_uuid", "ip_address", "created_at", "matchup_token") '
+            'VALUES (%s, %s, %s, %s, %s, %s)',
+            [
+                (
+                    r["card_1_uuid"], r["card_2_uuid"], r["chosen_uuid"], r["ip_address"],
+                    adapt(datetime.fromisoformat(r["created_at"])),
+                    token_field.get_db_prep_value(r["token"], connection),
+                )
+                for r in batch
+            ],
+        )
+
+
+def merge(paths: Iterable[Path], batch_size: int = 1000) -> tuple[int, int]:
+    """Apply the unread votes in the logs at `paths` to this database.
+
+    Returns (votes applied, duplicates skipped).
+    """
+    from .views import _update_elo
+
+    directory = Path(settings.VOTE_LOG_DIR)
+    directory.mkdir(parents=True, exist_ok=True)
+    state = _read_state(directory)
+    paths = [Path(p) for p in paths]
+    entries = heapq.merge(
+        *(_read_log(p, state.get(p.name, 0)) for p in paths), key=lambda e: e[0]
+    )
+    manifest = archive.read_manifest()
+
+    applied = skipped = 0
+    for batch in itertools.batched(entries, batch_size):
+        tokens = {record["token"] for _, _, _, record in batch}
+        seen = {str(t) for t in Vote.objects.filter(matchup_token__in=tokens)
+                .values_list("matchup_token", flat=True)}
+        seen |= archive.archived_tokens(tokens - seen, manifest)
+        new = []
+        for _, name, offset, record in batch:
+            state[name] = offset
+            if record["token"] in seen:
+                skipped += 1
+                continue
+            seen.add(record["token"])
+            new.append(record)
+
+        if new:
+            with transaction.atomic():
+                _insert(new)
+                for r in new:
+                    _update_elo(
+                        r["card_1_uuid"], r["card_2_uuid"], r["chosen_uuid"],
+                        datetime.fromisoformat(r["created_at"]),
+                    )
+                RatingVersion.bump()
+            applied += len(new)
+        # After the commit: a crash in between only means rereading a
+        # batch, whose votes are then skipped as duplicates.
+        _write_state(directory, state)
+    return applied, skipped
@@ -0,0 +1,53 @@
+"""Warm a freshly started process before it serves traffic.
+
+Fly stops idle machines, so the first visitor after a scale-up would
+otherwise pay for opening both databases, loading the card pool and
+compiling templates. Gunicorn calls `warm_up` from its worker init hook
+(see gunicorn.conf.py) before the worker accepts connections. The
+`startup_report` command times the same phases in a fresh interpreter.
+"""
+
+import logging
+import time
+
+from django.conf import settings
+from django.db import connections
+from django.template.loader import get_template
+
+logger = logging.getLogger(__name__)
+
+
+def warm_up() -> dict[str, float]:
+    """Open connections and fill caches; return seconds spent per phase."""
+    timings = {}
+
+    start = time.perf_counter()
+    for alias in ('default', 'mtgjson'):
+        connections[alias].ensure_connection()
+    with connections['mtgjson'].cursor() as cursor:
+        cursor.execute('SELECT 1 FROM "cards" LIMIT 1')
+    timings['db_open'] = time.perf_counter() - start
+
+    from .cardpool import get_card_pool
+    start = time.perf_counter()
+    pool = get_card_pool()
+    if pool is not None:
+        pool.prepare()
+    timings['card_pool'] = time.perf_counter() - start
+
+    from .selection import get_rating_index
+    from .views import _get_random_matchup
+    start = time.perf_counter()
+    for name in ('matchup/matchup.html', 'matchup/leaderboard.html'):
+        get_template(name)
+    if settings.MATCHUP_STRATEGY == 'active':
+        get_rating_index()
+    _get_random_matchup()
+    timings['first_matchup'] = time.perf_counter() - start
+
+    logger.info(
+        "Warmed up in %.0f ms (%s)",
+        1000 * sum(timings.values()),
+        ", ".join(f"{phase} {1000 * t:.0f} ms" for phase, t in timings.items()),
+    )
+    return timings